@@ -0,0 +1,314 @@
+# benchmarks/pipeline.py
+"""
+Load benchmark for the batch pipeline against the local stand-in services.
+
+Drives the pipeline two ways, each scenario in a fresh process:
+  plugin        QueuePlugin.process_items_queue called directly (as the agent does)
+  invoke-batch  POST /invoke-batch on the app (job store + background workers)
+
+and reports, per scenario, throughput, p50/p95/p99 per-item latency
+(submission -> item finished) and service time (first stage -> finished),
+peak RSS, final statuses and the requests each downstream endpoint received.
+
+    python benchmarks/pipeline.py --items 2000 --batches 4 \\
+        --latency 0.05 --distribution lognormal --stddev 0.03 \\
+        --error-rate 0.01 --rate-limit-rate 0.01 --output bench.json
+
+    # Compare with an earlier report; exits 1 on a regression beyond --tolerance
+    python benchmarks/pipeline.py --items 2000 --baseline bench.json
+
+Settings for the app under test can be overridden with --env, e.g.
+--env ASSESSMENT_BULK_ENABLED=true --env ADAPTIVE_CONCURRENCY_ENABLED=false.
+The stand-in is started on a free port unless --stand-in-url is given.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+MODES = ["plugin", "invoke-batch"]
+
+
+# -----------------------------
+# Child process: one scenario
+# -----------------------------
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    if len(values) == 1:
+        return {"p50": values[0], "p95": values[0], "p99": values[0], "max": values[0]}
+    q = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": q[49], "p95": q[94], "p99": q[98], "max": max(values)}
+
+
+async def _collect(queue: asyncio.Queue, submitted_at: float, out: Dict[str, Any]) -> None:
+    """Consume one run's tracker events until the end-of-stream marker."""
+    first_stage: Dict[int, float] = {}
+    while True:
+        event = await queue.get()
+        if event is None:
+            return
+        index = event.get("index")
+        if event["event"] == "stage" and index not in first_stage:
+            first_stage[index] = event["ts"]
+        elif event["event"] == "item_finished":
+            out["latency"].append(event["ts"] - submitted_at)
+            out["service_time"].append(event["ts"] - first_stage.get(index, submitted_at))
+            out["statuses"][event["final_status"]] = out["statuses"].get(event["final_status"], 0) + 1
+
+
+async def _run_child(mode: str, items: int, batches: int) -> Dict[str, Any]:
+    from services.run_tracker import run_tracker
+
+    pairs = [(str(uuid.uuid4()), str(uuid.uuid4())) for _ in range(items)]
+    chunk = -(-items // max(batches, 1))
+    groups = [pairs[i : i + chunk] for i in range(0, items, chunk)]
+    out: Dict[str, Any] = {"latency": [], "service_time": [], "statuses": {}}
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    if mode == "plugin":
+        from plugins.queue_handler import QueuePlugin
+        from services.http_client import close_client, start_client
+        from services.monitor_reporter import monitor_reporter
+
+        await start_client()
+        plugin = QueuePlugin()
+
+        async def one(group) -> None:
+            run_id = str(uuid.uuid4())
+            run_tracker.register(run_id, "bench@local")
+            queue = run_tracker.subscribe(run_id)
+            collector = asyncio.create_task(_collect(queue, time.time(), out))
+            await plugin.process_items_queue(
+                [p for p, _ in group], [w for _, w in group], run_id=run_id, email="bench@local"
+            )
+            await collector
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(group) for group in groups))
+        duration = time.perf_counter() - started
+        await monitor_reporter.stop()
+        await close_client()
+    else:
+        import main
+
+        await main.startup_event()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+            async def one(group) -> None:
+                submitted_at = time.time()
+                response = await client.post(
+                    "/invoke-batch",
+                    json={"items": [{"project_id": p, "workbook_id": w} for p, w in group], "email": "bench@local"},
+                )
+                response.raise_for_status()
+                queue = run_tracker.subscribe(response.json()["run_id"])
+                await _collect(queue, submitted_at, out)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one(group) for group in groups))
+            duration = time.perf_counter() - started
+        await main.shutdown_event()
+
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    done = len(out["latency"])
+    return {
+        "mode": mode,
+        "items": items,
+        "batches": len(groups),
+        "completed_items": done,
+        "duration_seconds": round(duration, 3),
+        "throughput_items_per_second": round(done / duration, 2) if duration else None,
+        "latency_seconds": _percentiles(out["latency"]),
+        "service_time_seconds": _percentiles(out["service_time"]),
+        "peak_rss_mb": round(rss_after / scale, 1),
+        "rss_growth_mb": round((rss_after - rss_before) / scale, 1),
+        "final_statuses": out["statuses"],
+    }
+
+
+# -----------------------------
+# Parent process: orchestration
+# -----------------------------
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_stand_in() -> (subprocess.Popen, str):
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "services.external.stand_in:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            httpx.get(url + "/stats", timeout=0.5)
+            return proc, url
+        except httpx.HTTPError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError("stand-in did not start")
+
+
+def _child_env(stand_in_url: str, overrides: List[str], workdir: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    for name in ("ASSESSMENT_API_URL", "PARSING_API_URL", "MAPPING_API_URL", "COSMOSDB_API_URL", "MONITORING_AGENT_URL"):
+        env[name] = stand_in_url
+    env.setdefault("REQUEST_TIMEOUT", "30")
+    env["APP_MODE"] = "batch-only"
+    env["HTTP_WARMUP_ON_STARTUP"] = "false"
+    env["JOB_STORE_PATH"] = os.path.join(workdir, "jobs.db")
+    env["MONITOR_SPILL_PATH"] = os.path.join(workdir, "monitor_spill.jsonl")
+    # Every scenario must really call the services
+    env["STAGE_CACHE_BACKEND"] = "none"
+    # The benchmark reads every tracker event; never drop any
+    env["RUN_EVENTS_QUEUE_SIZE"] = "0"
+    env["RUN_TRACKER_MAX_RUNS"] = "100000"
+    for item in overrides:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+def _run_scenario(args, mode: str, stand_in_url: str) -> Dict[str, Any]:
+    httpx.post(stand_in_url + "/stats/reset")
+    with tempfile.TemporaryDirectory() as workdir:
+        proc = subprocess.run(
+            [
+                sys.executable, str(Path(__file__).resolve()), "--child", "--mode", mode,
+                "--items", str(args.items), "--batches", str(args.batches),
+            ],
+            cwd=ROOT,
+            env=_child_env(stand_in_url, args.env, workdir),
+            capture_output=True,
+            text=True,
+        )
+    if proc.returncode != 0:
+        raise RuntimeError(f"scenario {mode} failed:\n{proc.stderr[-4000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    stats = httpx.get(stand_in_url + "/stats").json()
+    result["name"] = f"{mode}-{args.items}x{args.batches}"
+    result["downstream"] = stats
+    return result
+
+
+def _compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    previous = {s["name"]: s for s in baseline.get("scenarios", [])}
+    problems: List[str] = []
+    for scenario in report["scenarios"]:
+        base = previous.get(scenario["name"])
+        if base is None:
+            continue
+        tput, base_tput = scenario["throughput_items_per_second"], base["throughput_items_per_second"]
+        if tput and base_tput and tput < base_tput * (1 - tolerance):
+            problems.append(f"{scenario['name']}: throughput {tput} < baseline {base_tput}")
+        p95, base_p95 = scenario["latency_seconds"]["p95"], base["latency_seconds"]["p95"]
+        if p95 and base_p95 and p95 > base_p95 * (1 + tolerance):
+            problems.append(f"{scenario['name']}: p95 latency {p95:.3f}s > baseline {base_p95:.3f}s")
+        scenario["vs_baseline"] = {
+            "throughput_ratio": round(tput / base_tput, 3) if tput and base_tput else None,
+            "p95_ratio": round(p95 / base_p95, 3) if p95 and base_p95 else None,
+        }
+    return problems
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--batches", type=int, default=1, help="split items into this many concurrent runs")
+    parser.add_argument("--stand-in-url", help="use an already running stand-in")
+    parser.add_argument("--distribution", default="lognormal")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean downstream latency (s)")
+    parser.add_argument("--stddev", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--max-concurrency", type=int, default=0, help="per endpoint, 429 above it (0 = unlimited)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, str(ROOT))
+        print(json.dumps(asyncio.run(_run_child(args.mode, args.items, args.batches))))
+        return 0
+
+    stand_in = None
+    stand_in_url = args.stand_in_url
+    if stand_in_url is None:
+        stand_in, stand_in_url = _start_stand_in()
+    try:
+        stand_in_config = {
+            "reset": True,
+            "default": {
+                "distribution": args.distribution,
+                "latency_mean": args.latency,
+                "latency_stddev": args.stddev,
+                "error_rate": args.error_rate,
+                "rate_limit_rate": args.rate_limit_rate,
+                "max_concurrency": args.max_concurrency,
+            },
+        }
+        httpx.post(stand_in_url + "/config", json=stand_in_config).raise_for_status()
+        scenarios = [_run_scenario(args, mode, stand_in_url) for mode in args.modes]
+    finally:
+        if stand_in is not None:
+            stand_in.terminate()
+            stand_in.wait(timeout=10)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "git_commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "stand_in": stand_in_config["default"],
+            "env_overrides": args.env,
+        },
+        "scenarios": scenarios,
+    }
+    problems: List[str] = []
+    if args.baseline:
+        problems = _compare(report, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.tolerance)
+        report["regressions"] = problems
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+# benchmarks/startup.py
+"""
+Import-time and startup-time benchmark for main.py, per APP_MODE.
+
+For every mode it measures, in fresh processes:
+  - import_seconds: wall time of `import main` (median of --repeat runs)
+  - max_rss_mb:     peak RSS after the import
+  - semantic_kernel_loaded: whether the import pulled in semantic_kernel
+  - ready_seconds:  uvicorn spawn -> first 200 from /health
+
+Run from the project root with the usual environment (.env or exported vars):
+
+    python benchmarks/startup.py --modes full batch-only --output startup.json
+
+Exits with status 1 when a threshold is exceeded, so it can guard CI against
+regressions (e.g. a new top-level import of semantic_kernel).
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+_IMPORT_PROBE = """
+import json, resource, sys, time
+t0 = time.perf_counter()
+import main
+elapsed = time.perf_counter() - t0
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    "import_seconds": elapsed,
+    "max_rss_mb": rss / 1024 if sys.platform != "darwin" else rss / 1024 / 1024,
+    "semantic_kernel_loaded": "semantic_kernel" in sys.modules,
+}))
+"""
+
+
+def _env(mode: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env["APP_MODE"] = mode
+    # Readiness must not depend on reaching the downstream services
+    env.setdefault("HTTP_WARMUP_ON_STARTUP", "false")
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def measure_import(mode: str) -> Dict[str, Any]:
+    out = subprocess.run(
+        [sys.executable, "-c", _IMPORT_PROBE],
+        cwd=ROOT,
+        env=_env(mode),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_ready(mode: str, timeout: float) -> Optional[float]:
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=ROOT,
+        env=_env(mode),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                return None
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health", timeout=0.5).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.02)
+        return None
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def run(modes: List[str], repeat: int, timeout: float) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for mode in modes:
+        imports = [measure_import(mode) for _ in range(repeat)]
+        readies = [measure_ready(mode, timeout) for _ in range(repeat)]
+        ok_readies = [r for r in readies if r is not None]
+        results[mode] = {
+            "import_seconds": statistics.median(r["import_seconds"] for r in imports),
+            "max_rss_mb": round(statistics.median(r["max_rss_mb"] for r in imports), 1),
+            "semantic_kernel_loaded": any(r["semantic_kernel_loaded"] for r in imports),
+            "ready_seconds": statistics.median(ok_readies) if ok_readies else None,
+            "ready_failures": len(readies) - len(ok_readies),
+        }
+    return results
+
+
+def check(results: Dict[str, Any], max_import: Optional[float], max_ready: Optional[float]) -> List[str]:
+    problems: List[str] = []
+    for mode, r in results.items():
+        if r["semantic_kernel_loaded"]:
+            problems.append(f"{mode}: importing main loaded semantic_kernel (it must stay lazy)")
+        if r["ready_seconds"] is None:
+            problems.append(f"{mode}: server never became ready")
+        elif max_ready is not None and r["ready_seconds"] > max_ready:
+            problems.append(f"{mode}: ready in {r['ready_seconds']:.2f}s > {max_ready}s")
+        if max_import is not None and r["import_seconds"] > max_import:
+            problems.append(f"{mode}: import took {r['import_seconds']:.2f}s > {max_import}s")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["full", "batch-only"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for readiness")
+    parser.add_argument("--max-import-seconds", type=float, default=None)
+    parser.add_argument("--max-ready-seconds", type=float, default=None)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    results = run(args.modes, args.repeat, args.timeout)
+    problems = check(results, args.max_import_seconds, args.max_ready_seconds)
+    report = {"python": sys.version.split()[0], "results": results, "problems": problems}
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
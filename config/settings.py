@@ -1,18 +1,68 @@
 # config/settings.py
 
 from pathlib import Path
+from typing import List, Literal, Optional
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+class AzureOpenAIDeployment(BaseModel):
+    """One chat backend of AZURE_OPENAI_DEPLOYMENTS."""
+
+    # Label in logs, metrics and /health (defaults to the deployment name)
+    name: Optional[str] = None
+    endpoint: str
+    deployment_name: str
+    # Fall back to AZURE_OPENAI_API_KEY / AZURE_OPENAI_API_VERSION
+    api_key: Optional[str] = None
+    api_version: Optional[str] = None
+
+
 class Settings(BaseSettings):
+    # -----------------------------
+    # App Mode
+    # -----------------------------
+    # "full": chat + batch. "batch-only": /invoke-batch and run endpoints only;
+    # semantic_kernel is never imported and the Azure OpenAI settings are not needed
+    APP_MODE: str = "full"
+
+    # Build the kernel in the background right after startup instead of on the
+    # first /chat (readiness is never blocked on it either way)
+    KERNEL_PREWARM: bool = False
+
     # -----------------------------
     # Azure OpenAI Configuration
     # -----------------------------
-    AZURE_OPENAI_API_KEY: str
-    AZURE_OPENAI_ENDPOINT: str
-    AZURE_OPENAI_DEPLOYMENT_NAME: str
+    # Required for chat (full mode)
+    AZURE_OPENAI_API_KEY: Optional[str] = None
+    AZURE_OPENAI_ENDPOINT: Optional[str] = None
+    AZURE_OPENAI_DEPLOYMENT_NAME: Optional[str] = None
     AZURE_OPENAI_API_VERSION: str = "2024-02-15-preview"
 
+    # Several deployments (regions / resources) behind the one "azure-chat"
+    # service, as a JSON list:
+    #   [{"name": "east", "endpoint": "https://east.openai.azure.com", "deployment_name": "gpt-4o"},
+    #    {"name": "west", "endpoint": "https://west.openai.azure.com", "deployment_name": "gpt-4o",
+    #     "api_key": "..."}]
+    # Empty: the single deployment configured above
+    AZURE_OPENAI_DEPLOYMENTS: List[AzureOpenAIDeployment] = []
+
+    # Chat router (kernel/routing_chat.py): each call goes to the fastest
+    # healthy deployment and fails over to the next one on 429 / 5xx /
+    # connection errors. A 429 benches a deployment for its Retry-After
+    # (this long when the header is missing), 5xx / connection errors for
+    # CHAT_ROUTER_ERROR_COOLDOWN_SECONDS.
+    CHAT_ROUTER_COOLDOWN_SECONDS: float = 10.0
+    CHAT_ROUTER_ERROR_COOLDOWN_SECONDS: float = 5.0
+    # Weight of the newest response in the per-deployment latency average
+    CHAT_ROUTER_LATENCY_EWMA_ALPHA: float = 0.3
+    # Deployments reporting fewer remaining requests / tokens than this
+    # (x-ratelimit-remaining-*) are only used when no other one is healthy
+    CHAT_ROUTER_MIN_REMAINING_REQUESTS: int = 1
+    CHAT_ROUTER_MIN_REMAINING_TOKENS: int = 1000
+    # Per attempt; a slow deployment costs at most this before failing over
+    CHAT_ROUTER_TIMEOUT_SECONDS: float = 120.0
+
     # -----------------------------
     # Service Endpoints
     # -----------------------------
@@ -28,6 +78,49 @@ class Settings(BaseSettings):
     REQUEST_TIMEOUT: float
     CORS_ORIGINS: str = "*"
 
+    # Bearer token for downstream calls no caller's token covers: queued runs
+    # (messages carry no credentials) and re-sends of spilled monitor events and
+    # run log chunks (stored without the caller's token).
+    # Unset: spilled run log chunks stay in the spill file
+    SERVICE_AUTH_TOKEN: Optional[str] = None
+
+    # -----------------------------
+    # Observability
+    # -----------------------------
+    # Structured logs go to stderr from a background thread: "json" or "text"
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"
+
+    # Prometheus-format metrics at GET /metrics
+    METRICS_ENABLED: bool = True
+
+    # -----------------------------
+    # Chat Sessions
+    # -----------------------------
+    # Sessions kept in memory (least recently used evicted first) and idle expiry
+    CHAT_MAX_SESSIONS: int = 500
+    CHAT_SESSION_TTL_SECONDS: float = 3600.0
+
+    # History sent to the model is trimmed to this many (estimated) tokens;
+    # the system prompt and the latest turn are always kept
+    CHAT_HISTORY_TOKEN_BUDGET: int = 6000
+
+    # Keep a short extractive summary of trimmed turns in the system context
+    CHAT_SUMMARIZE_TRIMMED: bool = True
+    CHAT_SUMMARY_MAX_TOKENS: int = 500
+
+    # Messages that are plainly "process these project/workbook ids" skip the
+    # LLM and run the pipeline directly (templated answer)
+    CHAT_FAST_PATH_ENABLED: bool = True
+    # Email recorded for fast-path runs when neither the request nor the message has one
+    CHAT_DEFAULT_EMAIL: str = "chat@semantic-agent"
+    # Scheduler priority of runs started from chat (someone is waiting for the answer)
+    CHAT_RUN_PRIORITY: Literal["high", "normal", "low"] = "high"
+
+    # Also give the agent the individual assessment / parsing / mapping /
+    # monitoring tools (single items normally use run_workbook_pipeline)
+    CHAT_STEP_TOOLS_ENABLED: bool = False
+
     # -----------------------------
     # Batch / Parallel Processing
     # -----------------------------
@@ -38,6 +131,270 @@ class Settings(BaseSettings):
     # Prevents all bots from firing at the exact same time
     START_JITTER_SECONDS: float = 0.25
 
+    # Stage-pipelined execution: each stage has its own worker pool.
+    # Unset values fall back to ADAPTIVE_MAX_CONCURRENCY when adaptive
+    # concurrency is enabled, else to MAX_CONCURRENT_WORKBOOKS.
+    ASSESSMENT_CONCURRENCY: Optional[int] = None
+    PARSING_CONCURRENCY: Optional[int] = None
+    MAPPING_CONCURRENCY: Optional[int] = None
+
+    # Bounded hand-off queue in front of every stage (backpressure)
+    PIPELINE_QUEUE_SIZE: int = 100
+
+    # Deadlines (seconds; None/0 = none). An item must finish every stage within
+    # ITEM_DEADLINE_SECONDS of entering the pipeline, and every item of a run
+    # within RUN_DEADLINE_SECONDS of the run start (restarts when a job resumes).
+    # Downstream timeouts and retries are cut to the time left; late items end
+    # as TIMED_OUT. Batch requests can override both.
+    ITEM_DEADLINE_SECONDS: Optional[float] = 300.0
+    RUN_DEADLINE_SECONDS: Optional[float] = None
+
+    # -----------------------------
+    # Bulk Mode (per service)
+    # -----------------------------
+    # When enabled, items are micro-batched and POSTed to <endpoint>{BULK_PATH_SUFFIX}
+    # as {"items": [...]}; the service answers {"results": [{"status_code": ...}, ...]}
+    ASSESSMENT_BULK_ENABLED: bool = False
+    PARSING_BULK_ENABLED: bool = False
+    MAPPING_BULK_ENABLED: bool = False
+    MONITORING_BULK_ENABLED: bool = False
+
+    BULK_PATH_SUFFIX: str = "/batch"
+    BULK_MAX_BATCH_SIZE: int = 50
+    # A partial batch is sent after waiting this long for more items
+    BULK_MAX_WAIT_SECONDS: float = 0.05
+    # Bulk calls per stage of a run that may be in flight at the same time
+    # (further full batches wait for a slot)
+    BULK_MAX_CONCURRENT_BATCHES: int = 2
+
+    # -----------------------------
+    # Retries / Circuit Breaker (services/resilience.py)
+    # -----------------------------
+    # Retries after the first attempt; only 408/425/429/5xx and network errors are retried
+    RETRY_MAX_ATTEMPTS: int = 3
+    # Decorrelated jitter between RETRY_BASE_DELAY and RETRY_MAX_DELAY (Retry-After wins if larger)
+    RETRY_BASE_DELAY: float = 1.0
+    RETRY_MAX_DELAY: float = 30.0
+
+    # Per run: at most RETRY_BUDGET_MIN + RETRY_BUDGET_RATIO * requests retries
+    RETRY_BUDGET_RATIO: float = 0.2
+    RETRY_BUDGET_MIN: int = 10
+
+    # Per downstream endpoint: open after N consecutive failures (429 / Retry-After
+    # throttling not counted), probe again after reset
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_RESET_SECONDS: float = 30.0
+
+    # -----------------------------
+    # Hedged Requests (services/resilience.py)
+    # -----------------------------
+    # Opt-in per stage: a call still unanswered after the endpoint's observed
+    # HEDGE_PERCENTILE latency gets a second copy and the first success wins.
+    # Only enable for services where a duplicate call is harmless (idempotent).
+    ASSESSMENT_HEDGE_ENABLED: bool = False
+    PARSING_HEDGE_ENABLED: bool = False
+    MAPPING_HEDGE_ENABLED: bool = False
+    MONITORING_HEDGE_ENABLED: bool = False
+
+    HEDGE_PERCENTILE: float = 0.95
+    # Lower bound on the hedge delay, and calls observed before hedging starts
+    HEDGE_MIN_DELAY_SECONDS: float = 0.05
+    HEDGE_MIN_SAMPLES: int = 20
+
+    # Per endpoint: each call earns HEDGE_BUDGET_RATIO hedges, banked up to HEDGE_BUDGET_BURST
+    HEDGE_BUDGET_RATIO: float = 0.05
+    HEDGE_BUDGET_BURST: float = 10.0
+
+    # -----------------------------
+    # Adaptive Concurrency (AIMD, per downstream endpoint)
+    # -----------------------------
+    ADAPTIVE_CONCURRENCY_ENABLED: bool = True
+    ADAPTIVE_MIN_CONCURRENCY: int = 1
+    ADAPTIVE_MAX_CONCURRENCY: int = 50
+    # Starting limit; unset falls back to MAX_CONCURRENT_WORKBOOKS.
+    # With adaptive concurrency disabled this is the fixed per-endpoint limit.
+    ADAPTIVE_INITIAL_CONCURRENCY: Optional[int] = None
+
+    # Limit only grows while recent p95 latency and error rate stay under these
+    ADAPTIVE_LATENCY_TARGET_SECONDS: float = 5.0
+    ADAPTIVE_ERROR_RATE_THRESHOLD: float = 0.05
+
+    # On 429/503/timeout: limit *= factor, at most once per cooldown
+    ADAPTIVE_DECREASE_FACTOR: float = 0.5
+    ADAPTIVE_COOLDOWN_SECONDS: float = 2.0
+
+    # Number of recent calls used for p95 / error rate
+    ADAPTIVE_WINDOW_SIZE: int = 100
+
+    # -----------------------------
+    # Fair Scheduler (services/fair_scheduler.py)
+    # -----------------------------
+    # When an endpoint's slots are all busy, waiting requests are served by
+    # weighted fair queuing across requester emails, then across their runs.
+    # A run's share is proportional to the weight of its priority class.
+    SCHEDULER_WEIGHT_HIGH: float = 4.0
+    SCHEDULER_WEIGHT_NORMAL: float = 2.0
+    SCHEDULER_WEIGHT_LOW: float = 1.0
+
+    # -----------------------------
+    # HTTP Connection Pool
+    # -----------------------------
+    # One shared httpx client is created at startup and reused by every call
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+
+    # Requires the optional 'h2' package; silently falls back to HTTP/1.1
+    HTTP2_ENABLED: bool = False
+
+    # Open connections to all service URLs during startup
+    HTTP_WARMUP_ON_STARTUP: bool = True
+    HTTP_WARMUP_TIMEOUT: float = 5.0
+
+    # -----------------------------
+    # Durable Batch Job Queue
+    # -----------------------------
+    # SQLite file (relative paths resolve from the project root)
+    JOB_STORE_PATH: str = "data/jobs.db"
+
+    # Number of background workers claiming batch jobs. Downstream load is
+    # bounded by the per-endpoint limits, not by this: more workers just let
+    # more runs share those slots fairly.
+    JOB_WORKERS: int = 8
+
+    # Idle workers re-check the store this often (seconds)
+    JOB_POLL_INTERVAL: float = 2.0
+
+    # A RUNNING job without a heartbeat for this long is resumed by another worker
+    JOB_LEASE_SECONDS: float = 120.0
+
+    # A job claimed this many times without finishing (its worker keeps crashing)
+    # is marked FAILED instead of being leased again; 0 = no limit. Jobs handed
+    # back on graceful shutdown don't use up an attempt
+    JOB_MAX_ATTEMPTS: int = 5
+
+    # Finished jobs and their items are deleted this long after they finished
+    # (0 = keep forever); checked every JOB_PURGE_INTERVAL_SECONDS
+    JOB_RETENTION_SECONDS: float = 604800.0
+    JOB_PURGE_INTERVAL_SECONDS: float = 3600.0
+
+    # Admission control: items queued or running (all jobs + synchronous chat
+    # runs) may not exceed this; new work gets 429 with Retry-After
+    ADMISSION_MAX_PENDING_ITEMS: int = 50000
+    ADMISSION_RETRY_AFTER_SECONDS: int = 30
+
+    # On shutdown, in-flight items get this long to finish before their jobs
+    # are handed back to the queue
+    SHUTDOWN_DRAIN_TIMEOUT_SECONDS: float = 30.0
+
+    # -----------------------------
+    # Azure Storage Queue Ingestion (services/azure_queue.py)
+    # -----------------------------
+    # Consume /invoke-batch payloads from a storage queue in this process
+    # (standalone replicas: python -m services.azure_queue)
+    AZURE_QUEUE_ENABLED: bool = False
+    # "azure" (Azure Storage or Azurite) or "memory" (in-process, for local runs / tests)
+    AZURE_QUEUE_BACKEND: str = "azure"
+    AZURE_STORAGE_CONNECTION_STRING: Optional[str] = None
+    AZURE_QUEUE_NAME: str = "workbook-batches"
+    AZURE_QUEUE_DEAD_LETTER_NAME: str = "workbook-batches-poison"
+
+    # Messages per receive (Azure allows up to 32); the next batch is prefetched
+    AZURE_QUEUE_BATCH_SIZE: int = 16
+    # Held messages are kept invisible this long, renewed every third of it
+    AZURE_QUEUE_VISIBILITY_TIMEOUT_SECONDS: int = 60
+    # Wait before receiving again when the queue was empty
+    AZURE_QUEUE_POLL_INTERVAL: float = 2.0
+    # A message whose run failed is visible again after this long
+    AZURE_QUEUE_RETRY_DELAY_SECONDS: int = 30
+    # Delivered more often than this: moved to the dead-letter queue
+    AZURE_QUEUE_MAX_DEQUEUE_COUNT: int = 5
+    # Messages carry no credentials: queued runs call downstream with SERVICE_AUTH_TOKEN
+
+    # -----------------------------
+    # Streamed Uploads (POST /ingest)
+    # -----------------------------
+    # Longer NDJSON / CSV lines are rejected (bounds the read buffer)
+    INGEST_MAX_LINE_BYTES: int = 65536
+    # Invalid lines listed in the response (all are counted)
+    INGEST_MAX_REPORTED_ERRORS: int = 20
+    # Repeated pairs are collapsed within a window of this many recent distinct
+    # pairs (bounded memory); 0 turns de-duplication off
+    INGEST_DEDUPE_WINDOW: int = 100000
+
+    # -----------------------------
+    # Stage Completion Cache
+    # -----------------------------
+    # Opt-in: completed (project_id, workbook_id, stage) are skipped when the
+    # item is resubmitted or retried. Backend: "none" (off), "memory" or "sqlite".
+    # Requests with force=true always call every stage
+    STAGE_CACHE_BACKEND: str = "none"
+    STAGE_CACHE_PATH: str = "data/stage_cache.db"
+    STAGE_CACHE_TTL_SECONDS: float = 86400.0
+    # Part of every cache key: bump it when the downstream services change
+    # what a stage produces, so earlier completions are not reused
+    STAGE_CACHE_VERSION: str = "1"
+    # Memory backend only (least recently used evicted first)
+    STAGE_CACHE_MAX_ENTRIES: int = 100000
+
+    # A workbook stage already in flight (duplicate item, overlapping batch) is
+    # not called again: later runs of the same caller (email + token) share the
+    # first call's outcome
+    SINGLE_FLIGHT_ENABLED: bool = True
+
+    # -----------------------------
+    # CosmosDB Run Logging (chunked)
+    # -----------------------------
+    # A log chunk is written when any of these is reached
+    LOG_CHUNK_MAX_RECORDS: int = 200
+    LOG_CHUNK_MAX_BYTES: int = 256_000
+    LOG_FLUSH_INTERVAL_SECONDS: float = 10.0
+
+    # Sealed chunks waiting to be sent; beyond this the pipeline waits (bounded memory)
+    LOG_MAX_PENDING_CHUNKS: int = 4
+
+    # Chunks whose write failed (service down, circuit open) are kept and sent
+    # again once the circuit lets calls through. Beyond this many, or still
+    # unsent LOG_RETRY_DRAIN_SECONDS after the run ends, they go to the spill
+    # file (no Authorization stored) and are re-sent after a later run's writes
+    LOG_MAX_HELD_CHUNKS: int = 16
+    LOG_RETRY_DRAIN_SECONDS: float = 30.0
+    LOG_SPILL_PATH: Optional[str] = "data/run_log_spill.jsonl"
+    LOG_SPILL_MAX_BYTES: int = 200_000_000
+
+    # -----------------------------
+    # Monitoring Reporter (background, coalescing)
+    # -----------------------------
+    # Unsent events kept in memory (one per run/project/workbook, latest status wins)
+    MONITOR_QUEUE_MAX_EVENTS: int = 10000
+    MONITOR_BATCH_SIZE: int = 100
+    MONITOR_FLUSH_INTERVAL_SECONDS: float = 0.5
+
+    # Overflow goes to this JSONL file (empty = drop); capped in size. Stored without
+    # the Authorization header, re-sent with SERVICE_AUTH_TOKEN
+    MONITOR_SPILL_PATH: Optional[str] = "data/monitor_spill.jsonl"
+    MONITOR_SPILL_MAX_BYTES: int = 50_000_000
+
+    # How long shutdown waits for queued reports before spilling them
+    MONITOR_DRAIN_TIMEOUT_SECONDS: float = 10.0
+
+    # -----------------------------
+    # Run Status / Progress Streaming
+    # -----------------------------
+    # Recent runs kept in memory for GET /runs/{run_id} (older ones come from the job store)
+    RUN_TRACKER_MAX_RUNS: int = 200
+
+    # Streamed runs (/ingest) keep only in-progress items plus this many of the
+    # most recent successful and of the other (failed, timed out) items (all are still counted)
+    RUN_TRACKER_STREAMED_RECENT_ITEMS: int = 100
+    RUN_TRACKER_STREAMED_FAILED_ITEMS: int = 1000
+
+    # Per-subscriber event buffer; a slow SSE client drops events beyond this
+    RUN_EVENTS_QUEUE_SIZE: int = 1000
+
+    # SSE keep-alive comment interval (seconds)
+    RUN_EVENTS_HEARTBEAT_SECONDS: float = 15.0
+
     # -----------------------------
     # Pydantic Settings Config
     # -----------------------------
@@ -2,65 +2,73 @@
  
 from semantic_kernel import Kernel
 
-from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion # Import change
-
 from config.settings import settings
+
+from kernel.routing_chat import create_routing_chat
  
 async def create_kernel() -> Kernel:
 
+    # Key is needed unless every deployment of the pool brings its own
+    required = ["AZURE_OPENAI_API_KEY"]
+    if settings.AZURE_OPENAI_DEPLOYMENTS:
+        if all(d.api_key for d in settings.AZURE_OPENAI_DEPLOYMENTS):
+            required = []
+    else:
+        required += ["AZURE_OPENAI_ENDPOINT", "AZURE_OPENAI_DEPLOYMENT_NAME"]
+    missing = [name for name in required if not getattr(settings, name)]
+    if missing:
+        raise ValueError(f"Chat needs {', '.join(missing)} (or run with APP_MODE=batch-only)")
+
     kernel = Kernel()
  
     # Azure OpenAI Service Configuration
 
-    # Ab AsyncOpenAI client ki zarurat nahi hai, Semantic Kernel ise khud handle karta hai
+    # Saare deployments ek hi "azure-chat" service ke peeche: sabse fast healthy
+    # deployment ko call jaati hai, 429/5xx par turant agle par (kernel/routing_chat.py)
+    chat_service = create_routing_chat(service_id="azure-chat")
 
-    # kernel.add_service(
+    kernel.add_service(chat_service)
 
-    #     AzureChatCompletion(
 
-    #         service_id="azure-chat",
+    # --- Import and Add Plugins ---
 
-    #         deployment_name=settings.AZURE_OPENAI_DEPLOYMENT_NAME,
+    from plugins.queue_handler import QueuePlugin 
 
-    #         endpoint=settings.AZURE_OPENAI_ENDPOINT,
+    from plugins.workbook_pipeline import WorkbookPipelinePlugin
 
-    #         api_key=settings.AZURE_OPENAI_API_KEY,
+    queue_plugin = QueuePlugin()
 
-    #     )
+    # Single item: the whole chain in one tool call. Lists: the queue.
+    kernel.add_plugin(WorkbookPipelinePlugin(queue_plugin), "WorkflowTools")
 
-    # )
-    chat_service = AzureChatCompletion(
-        service_id="azure-chat",
-        deployment_name=settings.AZURE_OPENAI_DEPLOYMENT_NAME,
-        endpoint=settings.AZURE_OPENAI_ENDPOINT,
-        api_key=settings.AZURE_OPENAI_API_KEY,
-        api_version=settings.AZURE_OPENAI_API_VERSION,
-    )
+    kernel.add_plugin(queue_plugin, "QueueTools")
 
-    kernel.add_service(chat_service)
+    # Individual step tools cost a completion round-trip each (and schema tokens
+    # on every request); only exposed when explicitly enabled
+    if settings.CHAT_STEP_TOOLS_ENABLED:
 
+        from plugins.assessment import AssessmentPlugin
 
-    # --- Import and Add Plugins ---
+        from plugins.parsing import ParsingPlugin
 
-    from plugins.assessment import AssessmentPlugin
+        from plugins.mapping import MappingPlugin
 
-    from plugins.parsing import ParsingPlugin
+        from plugins.monitoring import MonitoringAgentPlugin
 
-    from plugins.queue_handler import QueuePlugin 
+        kernel.add_plugin(MonitoringAgentPlugin(), "MonitoringAgentTools")
 
-    from plugins.mapping import MappingPlugin
+        kernel.add_plugin(AssessmentPlugin(), "AssessmentTools")
 
-    from plugins.monitoring import MonitoringAgentPlugin
- 
-    kernel.add_plugin(MonitoringAgentPlugin(), "MonitoringAgentTools")
+        kernel.add_plugin(ParsingPlugin(), "ParsingTools")
 
-    kernel.add_plugin(AssessmentPlugin(), "AssessmentTools")
+        kernel.add_plugin(MappingPlugin(), "MappingTools")
 
-    kernel.add_plugin(ParsingPlugin(), "ParsingTools")
+    # Tool-call start/finish events for /chat/stream
+    from semantic_kernel.filters import FilterTypes
 
-    kernel.add_plugin(QueuePlugin(), "QueueTools")
+    from services.chat_events import tool_event_filter
 
-    kernel.add_plugin(MappingPlugin(), "MappingTools")
+    kernel.add_filter(FilterTypes.AUTO_FUNCTION_INVOCATION, tool_event_filter)
  
     return kernel
  
\ No newline at end of file
@@ -0,0 +1,329 @@
+# kernel/routing_chat.py
+"""
+Chat completion service spread over several Azure OpenAI deployments.
+
+Registered as the one "azure-chat" service, so /chat and /chat/stream don't
+know how many deployments there are. Every deployment gets its own
+AzureChatCompletion on its own httpx client (no SDK retries); event hooks on
+that client record, per response:
+
+    latency      time to the response headers, as a moving average (2xx only)
+    quota        x-ratelimit-remaining-requests / -tokens
+    429          benched for Retry-After (retry-after-ms / Retry-After)
+    5xx          benched for CHAT_ROUTER_ERROR_COOLDOWN_SECONDS
+
+Each model call goes to the healthy deployment with the lowest
+latency x (1 + calls in flight); deployments that were never used are tried
+first so they get a latency reading. A 429, 5xx or connection error moves the
+call to the next deployment right away (a stream only before its first
+chunk); any other error is the caller's. The automatic tool-call loop of
+ChatCompletionClientBase runs here, so each round of it is routed on its own.
+"""
+import time
+from typing import Any, AsyncGenerator, ClassVar, Dict, List, Optional
+
+import httpx
+import openai
+from openai import AsyncAzureOpenAI
+from pydantic import PrivateAttr
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
+
+from config.settings import AzureOpenAIDeployment, settings
+from services.log import get_logger
+from services.metrics import LLM_BACKEND_LATENCY, LLM_BACKEND_REQUESTS, LLM_FAILOVERS
+
+log = get_logger("routing_chat")
+
+# Azure OpenAI quotas are per minute; older x-ratelimit-remaining-* readings are ignored
+_QUOTA_WINDOW_SECONDS = 60.0
+
+_STARTED = "routing_chat_started"
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """Seconds from retry-after-ms / Retry-After (numeric form only)."""
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = response.headers.get(header)
+        if value is None:
+            continue
+        try:
+            return max(float(value) * scale, 0.0)
+        except ValueError:
+            continue
+    return None
+
+
+def _int_header(response: httpx.Response, name: str) -> Optional[int]:
+    value = response.headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def failover_reason(exc: BaseException) -> Optional[str]:
+    """Why a failed call may go to another deployment (None: it may not)."""
+    seen = set()
+    error: Optional[BaseException] = exc
+    # SK wraps the SDK error (ServiceResponseException from APIStatusError)
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, openai.APIStatusError):
+            if error.status_code == 429:
+                return "rate_limited"
+            if error.status_code >= 500:
+                return "server_error"
+            return None
+        if isinstance(error, (openai.APIConnectionError, httpx.TransportError)):
+            return "connection_error"
+        error = error.__cause__ or error.__context__
+    return None
+
+
+class ChatBackend:
+    """One deployment: its chat service plus what its responses told us."""
+
+    def __init__(self, deployment: AzureOpenAIDeployment):
+        self.name = deployment.name or deployment.deployment_name
+        self.deployment_name = deployment.deployment_name
+        self.endpoint = deployment.endpoint
+        self.latency: Optional[float] = None
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.remaining_requests: Optional[int] = None
+        self.remaining_tokens: Optional[int] = None
+        self.quota_seen_at = 0.0
+        self.last_status: Optional[int] = None
+
+        self.http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.CHAT_ROUTER_TIMEOUT_SECONDS, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+            ),
+            event_hooks={"request": [self._on_request], "response": [self._on_response]},
+        )
+        api_key = deployment.api_key or settings.AZURE_OPENAI_API_KEY
+        api_version = deployment.api_version or settings.AZURE_OPENAI_API_VERSION
+        # Retries are the router's job: a 429 goes to another deployment instead
+        client = AsyncAzureOpenAI(
+            azure_endpoint=deployment.endpoint,
+            azure_deployment=deployment.deployment_name,
+            api_key=api_key,
+            api_version=api_version,
+            max_retries=0,
+            timeout=settings.CHAT_ROUTER_TIMEOUT_SECONDS,
+            http_client=self.http_client,
+        )
+        # Endpoint comes with the client (SK would insist on https, the local stand-in is http)
+        self.service = AzureChatCompletion(
+            service_id=f"azure-chat-{self.name}",
+            deployment_name=deployment.deployment_name,
+            api_key=api_key,
+            api_version=api_version,
+            async_client=client,
+        )
+
+    # -----------------------------
+    # httpx event hooks
+    # -----------------------------
+    async def _on_request(self, request: httpx.Request) -> None:
+        request.extensions[_STARTED] = time.monotonic()
+
+    async def _on_response(self, response: httpx.Response) -> None:
+        now = time.monotonic()
+        self.last_status = response.status_code
+
+        remaining_requests = _int_header(response, "x-ratelimit-remaining-requests")
+        remaining_tokens = _int_header(response, "x-ratelimit-remaining-tokens")
+        if remaining_requests is not None or remaining_tokens is not None:
+            self.remaining_requests = remaining_requests
+            self.remaining_tokens = remaining_tokens
+            self.quota_seen_at = now
+
+        if response.status_code == 429:
+            wait = _retry_after(response)
+            self.bench(settings.CHAT_ROUTER_COOLDOWN_SECONDS if wait is None else wait)
+        elif response.status_code >= 500:
+            self.bench(settings.CHAT_ROUTER_ERROR_COOLDOWN_SECONDS)
+        elif response.status_code < 300:
+            started = response.request.extensions.get(_STARTED)
+            if started is not None:
+                elapsed = now - started
+                alpha = settings.CHAT_ROUTER_LATENCY_EWMA_ALPHA
+                self.latency = elapsed if self.latency is None else alpha * elapsed + (1 - alpha) * self.latency
+                LLM_BACKEND_LATENCY.observe(elapsed, self.name)
+
+    # -----------------------------
+    # Health
+    # -----------------------------
+    def bench(self, seconds: float) -> None:
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+
+    def cooling_down(self, now: float) -> bool:
+        return now < self.cooldown_until
+
+    def low_quota(self, now: float) -> bool:
+        if now - self.quota_seen_at > _QUOTA_WINDOW_SECONDS:
+            return False
+        return (
+            self.remaining_requests is not None
+            and self.remaining_requests < settings.CHAT_ROUTER_MIN_REMAINING_REQUESTS
+        ) or (
+            self.remaining_tokens is not None and self.remaining_tokens < settings.CHAT_ROUTER_MIN_REMAINING_TOKENS
+        )
+
+    def score(self) -> float:
+        # Never used: 0, so it gets a latency reading
+        return (self.latency or 0.0) * (1 + self.in_flight)
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "deployment": self.deployment_name,
+            "endpoint": self.endpoint,
+            "healthy": not self.cooling_down(now),
+            "cooldown_remaining_seconds": round(max(self.cooldown_until - now, 0.0), 3),
+            "latency_seconds": round(self.latency, 4) if self.latency is not None else None,
+            "in_flight": self.in_flight,
+            "remaining_requests": self.remaining_requests,
+            "remaining_tokens": self.remaining_tokens,
+            "last_status": self.last_status,
+        }
+
+
+class RoutingChatCompletion(ChatCompletionClientBase):
+    """Chat completion over a pool of ChatBackends (see module docstring)."""
+
+    SUPPORTS_FUNCTION_CALLING: ClassVar[bool] = True
+
+    _backends: List[ChatBackend] = PrivateAttr(default_factory=list)
+
+    def __init__(self, backends: List[ChatBackend], service_id: str = "azure-chat"):
+        if not backends:
+            raise ValueError("RoutingChatCompletion needs at least one backend")
+        super().__init__(service_id=service_id, ai_model_id=backends[0].deployment_name)
+        self._backends = backends
+
+    @property
+    def backends(self) -> List[ChatBackend]:
+        return self._backends
+
+    # Settings handling is the same for every backend (all AzureChatCompletion)
+    def get_prompt_execution_settings_class(self):
+        return self._backends[0].service.get_prompt_execution_settings_class()
+
+    def _verify_function_choice_settings(self, settings) -> None:
+        self._backends[0].service._verify_function_choice_settings(settings)
+
+    def _update_function_choice_settings_callback(self):
+        return self._backends[0].service._update_function_choice_settings_callback()
+
+    def _reset_function_choice_settings(self, settings) -> None:
+        self._backends[0].service._reset_function_choice_settings(settings)
+
+    # -----------------------------
+    # Routing
+    # -----------------------------
+    def candidates(self) -> List[ChatBackend]:
+        """Healthy backends, best first; when all are benched, the one free soonest."""
+        now = time.monotonic()
+        healthy = [b for b in self._backends if not b.cooling_down(now)]
+        if not healthy:
+            return [min(self._backends, key=lambda b: b.cooldown_until)]
+        return sorted(healthy, key=lambda b: (b.low_quota(now), b.score(), b.in_flight))
+
+    def _attempt_settings(self, backend: ChatBackend, settings):
+        # Per-attempt copy: the backend writes messages / model into it
+        return settings.model_copy(update={"ai_model_id": backend.deployment_name})
+
+    def _failed(self, backend: ChatBackend, exc: Exception, reason: Optional[str], attempt: int) -> None:
+        LLM_BACKEND_REQUESTS.inc(backend.name, reason or "error")
+        if reason is None:
+            return
+        if reason == "connection_error":
+            # Nothing came back, so the response hook didn't bench it
+            backend.bench(settings.CHAT_ROUTER_ERROR_COOLDOWN_SECONDS)
+        LLM_FAILOVERS.inc(backend.name, reason)
+        log.warning("Chat deployment failed, trying the next one", backend=backend.name, reason=reason, attempt=attempt, error=str(exc))
+
+    async def _inner_get_chat_message_contents(self, chat_history, settings) -> list:
+        last_error: Optional[Exception] = None
+        for attempt, backend in enumerate(self.candidates(), start=1):
+            backend.in_flight += 1
+            try:
+                result = await backend.service._inner_get_chat_message_contents(
+                    chat_history, self._attempt_settings(backend, settings)
+                )
+            except Exception as e:
+                reason = failover_reason(e)
+                self._failed(backend, e, reason, attempt)
+                if reason is None:
+                    raise
+                last_error = e
+                continue
+            finally:
+                backend.in_flight -= 1
+            LLM_BACKEND_REQUESTS.inc(backend.name, "success")
+            return result
+        raise last_error
+
+    async def _inner_get_streaming_chat_message_contents(
+        self, chat_history, settings, function_invoke_attempt: int = 0
+    ) -> AsyncGenerator[list, Any]:
+        last_error: Optional[Exception] = None
+        for attempt, backend in enumerate(self.candidates(), start=1):
+            streamed = False
+            backend.in_flight += 1
+            try:
+                async for messages in backend.service._inner_get_streaming_chat_message_contents(
+                    chat_history, self._attempt_settings(backend, settings), function_invoke_attempt
+                ):
+                    streamed = True
+                    yield messages
+            except Exception as e:
+                # Chunks already sent to the client can't be taken back
+                reason = None if streamed else failover_reason(e)
+                self._failed(backend, e, reason, attempt)
+                if reason is None:
+                    raise
+                last_error = e
+                continue
+            finally:
+                backend.in_flight -= 1
+            LLM_BACKEND_REQUESTS.inc(backend.name, "success")
+            return
+        raise last_error
+
+    # -----------------------------
+    # Lifecycle
+    # -----------------------------
+    def snapshot(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [backend.snapshot(now) for backend in self._backends]
+
+    async def close(self) -> None:
+        for backend in self._backends:
+            await backend.http_client.aclose()
+
+
+def configured_deployments() -> List[AzureOpenAIDeployment]:
+    """AZURE_OPENAI_DEPLOYMENTS, or the single legacy AZURE_OPENAI_* deployment."""
+    if settings.AZURE_OPENAI_DEPLOYMENTS:
+        return list(settings.AZURE_OPENAI_DEPLOYMENTS)
+    return [
+        AzureOpenAIDeployment(
+            endpoint=settings.AZURE_OPENAI_ENDPOINT,
+            deployment_name=settings.AZURE_OPENAI_DEPLOYMENT_NAME,
+        )
+    ]
+
+
+def create_routing_chat(service_id: str = "azure-chat") -> RoutingChatCompletion:
+    deployments = configured_deployments()
+    names = [d.name or d.deployment_name for d in deployments]
+    if len(set(names)) != len(names):
+        raise ValueError(f"AZURE_OPENAI_DEPLOYMENTS needs unique names, got {names}")
+    return RoutingChatCompletion([ChatBackend(d) for d in deployments], service_id=service_id)
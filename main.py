@@ -2,27 +2,44 @@
 import traceback
 import uuid
 import asyncio  # Background tasks ke liye zaroori hai
-from typing import List, Optional
+from typing import List, Literal, Optional, Set
 from datetime import datetime
-from fastapi import FastAPI, HTTPException, Header
+import json
+import time
+from fastapi import FastAPI, HTTPException, Header, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from semantic_kernel import Kernel
-from semantic_kernel.contents import ChatHistory
-from semantic_kernel.functions import KernelArguments
+from starlette.requests import ClientDisconnect
 
-# AI Service Imports
-from semantic_kernel.connectors.ai.open_ai import OpenAIPromptExecutionSettings
-from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
+# semantic_kernel (aur AI service imports) yahan top par nahi: pehli /chat par
+# hi load hote hain, taaki batch-only pods jaldi ready hon aur kam memory lein
 
 # Local Imports
 from config.settings import settings 
-from config.prompts import SYSTEM_PROMPT 
-from kernel.kernel_setup import create_kernel
 from models.schemas import ChatRequest, ChatResponse, QueueRequest 
-from plugins.queue_handler import QueuePlugin 
-from services.http_client import get_client
+from services.adaptive_limiter import limiter_snapshot
+from services.admission import AdmissionRejected, admission
+from services.azure_queue import start_consumer, stop_consumer
+from services.batch_runner import BatchRunner
+from services.chat_events import bind_event_queue
+from services.chat_router import format_answer, route_message
+from services.chat_sessions import chat_sessions
+from services.fair_scheduler import PRIORITY_NORMAL
+from services.http_client import close_client, start_client
+from services.ingest import IngestError, IngestStats, detect_format, parse_items
+from services.resilience import breaker_snapshot
+from services.job_store import job_store
+from services.job_worker import JobWorkerPool
+from services.log import get_logger
+from services.metrics import CHAT_REQUESTS, LLM_LATENCY, record_llm_usage, render_metrics
+from services.monitor_reporter import monitor_reporter
+from services.run_logger import stop_resend
+from services.run_tracker import RUN_COMPLETED, RUN_FAILED, RUN_QUEUED, job_snapshot, run_tracker
+from services.single_flight import dedupe_pairs, stage_flights
+from services.stage_cache import stage_cache
 
 app = FastAPI(title="Semantic Agent - Assessment First")
+log = get_logger("main")
 
 # --- CORS Configuration ---
 origins = ["*"]
@@ -34,110 +51,607 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-kernel: Kernel = None
-chat_history: ChatHistory = ChatHistory()
-queue_plugin = QueuePlugin()
+APP_MODE_FULL = "full"
+APP_MODE_BATCH_ONLY = "batch-only"
+
+kernel = None  # semantic_kernel.Kernel, pehli /chat par banta hai (get_kernel)
+_kernel_lock = asyncio.Lock()
+batch_runner = BatchRunner()
+job_workers = JobWorkerPool(job_store, batch_runner)
+# Streamed uploads ki runs (job store mein nahi hoti); shutdown par drain hoti hain
+_ingest_tasks: Set[asyncio.Task] = set()
+# AZURE_QUEUE_ENABLED par storage queue se batches lene wala consumer
+queue_consumer = None
+# KERNEL_PREWARM wala background task (reference na rakho to GC ho sakta hai)
+_prewarm_task: Optional[asyncio.Task] = None
+
+def chat_enabled() -> bool:
+    return settings.APP_MODE != APP_MODE_BATCH_ONLY
+
+async def get_kernel():
+    """Kernel lazily banta hai; concurrent pehli requests ek hi baar banati hain."""
+    global kernel
+    if kernel is None:
+        async with _kernel_lock:
+            if kernel is None:
+                from kernel.kernel_setup import create_kernel
+
+                try:
+                    kernel = await create_kernel()
+                except Exception as e:
+                    log.error("Kernel initialization failed", error=str(e))
+                    raise HTTPException(status_code=503, detail=f"Kernel initialization failed: {str(e)}")
+                log.info("Kernel initialized")
+    return kernel
+
+def _prewarm_done(task: asyncio.Task) -> None:
+    """Prewarm fail ho to log karo; pehli chat request dobara try karegi."""
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        detail = error.detail if isinstance(error, HTTPException) else str(error)
+        log.warning("Kernel prewarm failed, will retry on first chat request", error=detail)
 
 @app.on_event("startup")
 async def startup_event():
-    global kernel
-    try:
-        kernel = await create_kernel()
-        chat_history.add_system_message(SYSTEM_PROMPT)
-        print("Application startup complete.")
-    except Exception as e:
-        print(f"Kernel initialization failed: {str(e)}")
-        raise
+    if settings.APP_MODE not in (APP_MODE_FULL, APP_MODE_BATCH_ONLY):
+        raise ValueError(f"Unknown APP_MODE: {settings.APP_MODE}")
+    # Open the shared HTTP connection pool (and warm it up) before taking traffic
+    await start_client()
+    # Durable batch queue: workers also resume jobs orphaned by a previous process
+    await job_store.init()
+    job_workers.start()
+    monitor_reporter.start()
+    if settings.AZURE_QUEUE_ENABLED:
+        global queue_consumer
+        queue_consumer = await start_consumer(batch_runner)
+    if chat_enabled() and settings.KERNEL_PREWARM:
+        # Readiness ko block kiye bina background mein kernel bana lo
+        global _prewarm_task
+        _prewarm_task = asyncio.create_task(get_kernel())
+        _prewarm_task.add_done_callback(_prewarm_done)
+    log.info("Application startup complete", mode=settings.APP_MODE)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Pehle intake band, phir in-flight items ko drain / checkpoint hone do
+    admission.stop_intake()
+    if _prewarm_task is not None and not _prewarm_task.done():
+        _prewarm_task.cancel()
+        await asyncio.gather(_prewarm_task, return_exceptions=True)
+    drains = [
+        job_workers.stop(drain_timeout=settings.SHUTDOWN_DRAIN_TIMEOUT_SECONDS),
+        _drain_ingest_runs(settings.SHUTDOWN_DRAIN_TIMEOUT_SECONDS),
+    ]
+    if queue_consumer is not None:
+        # Adhoore messages queue mein wapas visible ho jaate hain
+        drains.append(stop_consumer(queue_consumer, settings.SHUTDOWN_DRAIN_TIMEOUT_SECONDS))
+    await asyncio.gather(*drains)
+    await job_store.close()
+    await monitor_reporter.stop()
+    # Jo spilled log records abhi nahi gaye woh file mein hi rehte hain
+    await stop_resend()
+    await stage_cache.close()
+    await close_client()
+    if kernel is not None:
+        # Har Azure OpenAI deployment ka apna connection pool hai
+        await kernel.get_service("azure-chat").close()
 
 @app.post("/invoke-batch")
 async def invoke_batch(request: QueueRequest, authorization: Optional[str] = Header(None)):
     """
-    Turant response deta hai aur processing background mein chalti hai.
+    Turant response deta hai. Batch durable job store mein save hota hai
+    aur background workers use process karte hain (restart ke baad resume bhi).
     """
     run_id = str(uuid.uuid4())
     user_email = request.email
     token = authorization.replace("Bearer ", "") if authorization else None
     
-    print(f"Invoking Batch | Run ID: {run_id} | User: {user_email}")
+    log.info("Invoking batch", run_id=run_id, user=user_email, items=len(request.items))
 
-    project_ids = [item.project_id for item in request.items]
-    workbook_ids = [item.workbook_id for item in request.items]
+    pairs = [(item.project_id, item.workbook_id) for item in request.items]
 
-    if not project_ids:
+    if not pairs:
         return {"success": False, "message": "No items provided", "run_id": run_id}
 
+    # Same pair do baar aaya to ek hi baar chalega
+    pairs, duplicates = dedupe_pairs(pairs)
+
     try:
-        # Background task create kiya gaya hai taaki Postman ko turant reply mile
-        asyncio.create_task(
-            queue_plugin.process_items_queue(
-                project_ids=project_ids, 
-                workbook_ids=workbook_ids,
-                run_id=run_id,
-                email=user_email,
-                token=token 
+        # Global cap: zyada kaam pending ho to 429 + Retry-After (memory / latency predictable)
+        async with admission.admit(len(pairs)):
+            # Job persist hota hai, phir koi bhi free worker use claim karta hai
+            await job_store.enqueue(
+                run_id=run_id, email=user_email, pairs=pairs, token=token, priority=request.priority,
+                item_deadline_seconds=request.item_deadline_seconds,
+                run_deadline_seconds=request.run_deadline_seconds, force=request.force,
             )
-        )
+        run_tracker.register(run_id, user_email)
+        job_workers.notify()
 
         # Postman ko milne wala instant response
         return {
             "success": True,
-            "message": "Batch processing started in background",
+            "message": "Batch queued for background processing",
             "run_id": run_id,
-            "processed_count": len(project_ids),
+            "processed_count": len(pairs),
+            "duplicates_removed": duplicates,
             "user_logged": user_email
         }
 
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers())
     except Exception as e:
         return {"success": False, "run_id": run_id, "error": str(e)}
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest, authorization: Optional[str] = Header(None)):
-    if kernel is None:
-        raise HTTPException(status_code=503, detail="Kernel not initialized yet")
+async def _drain_ingest_runs(timeout: float) -> None:
+    if not _ingest_tasks:
+        return
+    _, pending = await asyncio.wait(set(_ingest_tasks), timeout=timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        log.warning("Drain timeout, cancelling streamed runs", runs=len(pending))
+        await asyncio.gather(*pending, return_exceptions=True)
+
+@app.post("/ingest")
+async def ingest_stream(
+    request: Request,
+    email: str,
+    format: Optional[str] = None,
+    priority: Literal["high", "normal", "low"] = PRIORITY_NORMAL,
+    item_deadline_seconds: Optional[float] = Query(None, ge=0),
+    run_deadline_seconds: Optional[float] = Query(None, ge=0),
+    force: bool = False,
+    authorization: Optional[str] = Header(None),
+):
+    """
+    Bade batches ke liye streamed upload: NDJSON (application/x-ndjson) ya CSV
+    (text/csv) body line-by-line parse hoti hai aur items upload chalte-chalte
+    pipeline mein jaate hain. Upload poora hote hi response aata hai; processing
+    background mein chalti rehti hai (GET /runs/{run_id} aur /events se dekho).
+    Ye runs job store mein persist nahi hoti: restart-safe batches ke liye /invoke-batch.
+    """
+    try:
+        fmt = detect_format(request.headers.get("content-type"), format)
+    except IngestError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+
+    try:
+        ticket = await admission.open_stream()
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers())
 
     run_id = str(uuid.uuid4())
     token = authorization.replace("Bearer ", "") if authorization else None
+    stats = IngestStats()
+    disconnected = {"value": False}
+    failure = {}
+    log.info("Ingesting stream", run_id=run_id, user=email, format=fmt)
+
+    async def body_chunks():
+        try:
+            async for chunk in request.stream():
+                yield chunk
+        except ClientDisconnect:
+            # Jitne items aa chuke hain wo poore honge
+            disconnected["value"] = True
+
+    async def admitted_items():
+        items = parse_items(body_chunks(), fmt, stats)
+        try:
+            async for item in items:
+                try:
+                    await ticket.started()
+                except AdmissionRejected as e:
+                    # Cap bhar gaya: baaki upload nahi padhte, jo items chal rahe hain woh poore honge
+                    failure["rejected"] = e
+                    stats.accepted -= 1
+                    stats.finished.set()
+                    return
+                yield item
+        finally:
+            await items.aclose()
+
+    async def item_done(index: int, result) -> None:
+        ticket.finished()
+
+    async def run() -> None:
+        try:
+            await batch_runner.run_batch(
+                admitted_items(), run_id=run_id, email=email, token=token,
+                on_item_done=item_done, collect_results=False, priority=priority,
+                item_deadline_seconds=item_deadline_seconds, run_deadline_seconds=run_deadline_seconds,
+                force=force,
+            )
+        except asyncio.CancelledError:
+            run_tracker.finish_run(run_id, status=RUN_FAILED)
+            raise
+        except Exception as e:
+            # Upload ke baad fail ho to response ja chuka hota hai; isliye log + run status
+            failure["error"] = e
+            run_tracker.finish_run(run_id, status=RUN_FAILED)
+            if not isinstance(e, IngestError):
+                log.exception("Streamed run failed", run_id=run_id)
+        finally:
+            ticket.close()
+            log.info("Streamed run finished", run_id=run_id, **{k: v for k, v in stats.summary().items() if k != "errors"})
+
+    run_tracker.register(run_id, email)
+    task = asyncio.create_task(run())
+    _ingest_tasks.add(task)
+    task.add_done_callback(_ingest_tasks.discard)
+
+    # Upload khatam hone tak (ya run ke fail hone tak) ruko; processing iske baad bhi chalti hai
+    upload_done = asyncio.create_task(stats.finished.wait())
+    await asyncio.wait({task, upload_done}, return_when=asyncio.FIRST_COMPLETED)
+    upload_done.cancel()
+
+    if "rejected" in failure:
+        e = failure["rejected"]
+        detail = f"{e.detail}; run {run_id} continues with the {stats.accepted} items accepted before the cap"
+        raise HTTPException(status_code=e.status_code, detail=detail, headers=e.headers())
+
+    if "error" in failure:
+        error = failure["error"]
+        if isinstance(error, IngestError):
+            raise HTTPException(status_code=400, detail=str(error))
+        return {"success": False, "run_id": run_id, "error": str(error), **stats.summary()}
+
+    return {
+        "success": True,
+        "message": "Upload received, processing continues in the background",
+        "run_id": run_id,
+        "client_disconnected": disconnected["value"],
+        **stats.summary(),
+    }
+
+@app.get("/runs/{run_id}")
+async def get_run(run_id: str, include_items: bool = True):
+    """
+    Run ka current status: per-item aur per-stage state.
+    Live runs memory se aate hain, baaki durable job store se.
+    """
+    snapshot = run_tracker.snapshot(run_id, include_items=include_items)
+    if snapshot is not None and snapshot["status"] != RUN_QUEUED:
+        return snapshot
+
+    job = await job_store.get_job(run_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Run {run_id} not found")
+    items = await job_store.get_items(run_id) if include_items else []
+    return job_snapshot(job, items, include_items=include_items)
+
+@app.post("/runs/{run_id}/retry")
+async def retry_run(run_id: str, authorization: Optional[str] = Header(None)):
+    """
+    Finished run ke sirf failed items (final_status SUCCESS nahi) naye run mein
+    dobara chalte hain. Har item ke jo stages pehle COMPLETED ho chuke the woh naye
+    job ke saath save hote hain aur skip hote hain, to sirf failed stages hi downstream jaate hain.
+    """
+    snapshot = run_tracker.snapshot(run_id)
+    job = await job_store.get_job(run_id)
+    if snapshot is None or snapshot["status"] == RUN_QUEUED:
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Run {run_id} not found")
+        snapshot = job_snapshot(job, await job_store.get_items(run_id))
+
+    if snapshot["status"] not in (RUN_COMPLETED, RUN_FAILED):
+        raise HTTPException(status_code=409, detail=f"Run {run_id} is still {snapshot['status']}")
+
+    failed = [item for item in snapshot.get("items", []) if item.get("final_status") != "SUCCESS"]
+    pairs = [(item["project_id"], item["workbook_id"]) for item in failed]
+    # Jo stages pichli run mein COMPLETED ho gaye the woh dobara nahi chalenge (cache on ho ya off)
+    completed_stages = [
+        [stage for stage, state in (item.get("steps") or {}).items() if state == "COMPLETED"]
+        for item in failed
+    ]
+    if not pairs:
+        return {"success": True, "message": "Nothing to retry, all items succeeded", "retry_of": run_id}
+
+    new_run_id = str(uuid.uuid4())
+    # Token job finish hone par store se hata diya jaata hai, isliye retry request ka token
+    token = authorization.replace("Bearer ", "") if authorization else None
+    log.info("Retrying run", run_id=run_id, new_run_id=new_run_id, items=len(pairs))
+
+    try:
+        async with admission.admit(len(pairs)):
+            # Retry original run ki priority aur deadlines par chalta hai
+            await job_store.enqueue(
+                run_id=new_run_id, email=snapshot["email"], pairs=pairs, token=token,
+                priority=job.priority if job else PRIORITY_NORMAL,
+                item_deadline_seconds=job.item_deadline_seconds if job else None,
+                run_deadline_seconds=job.run_deadline_seconds if job else None,
+                completed_stages=completed_stages,
+            )
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers())
+    run_tracker.register(new_run_id, snapshot["email"])
+    job_workers.notify()
+
+    return {
+        "success": True,
+        "message": "Failed items queued for retry",
+        "run_id": new_run_id,
+        "retry_of": run_id,
+        "processed_count": len(pairs),
+    }
+
+@app.get("/runs/{run_id}/events")
+async def stream_run_events(run_id: str):
+    """
+    Server-Sent Events: pehle ek 'snapshot' event, phir har stage transition
+    jaise hi hota hai. Run khatam hone par stream band ho jaata hai.
+    """
+    queue = run_tracker.subscribe(run_id)
+    if queue is None:
+        # Run is process ki memory mein nahi hai: job store ka snapshot bhej kar stream band
+        job = await job_store.get_job(run_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Run {run_id} not found")
+        snapshot = job_snapshot(job, await job_store.get_items(run_id))
+
+        async def stored_source():
+            yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+            yield "event: end\ndata: {}\n\n"
 
-    # Inject token into KernelArguments
-    args = KernelArguments(token=token)
+        return StreamingResponse(stored_source(), media_type="text/event-stream")
+
+    async def event_source():
+        try:
+            snapshot = run_tracker.snapshot(run_id)
+            yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=settings.RUN_EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    yield "event: end\ndata: {}\n\n"
+                    break
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            run_tracker.unsubscribe(run_id, queue)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _fast_path(request: ChatRequest, session, run_id: str, token: Optional[str]) -> Optional[str]:
+    """
+    Seedha pipeline: jab message mein project/workbook pairs saaf dikh rahe hon
+    to LLM skip. Baaki sab (None) LLM ke paas jaata hai. Session lock caller ke paas hai.
+    """
+    if not settings.CHAT_FAST_PATH_ENABLED:
+        return None
+    routed = route_message(request.message)
+    if routed is None:
+        return None
 
+    email = request.email or routed.email or settings.CHAT_DEFAULT_EMAIL
+    pairs, duplicates = dedupe_pairs(routed.pairs)
+    log.info("Chat fast path", run_id=run_id, items=len(pairs))
+    items = [(i, pid, wid) for i, (pid, wid) in enumerate(pairs)]
     try:
-        chat_history.add_user_message(request.message)
-        chat_service = kernel.get_service("azure-chat")
+        async with admission.direct(len(items)):
+            results = await batch_runner.run_batch(
+                items, run_id=run_id, email=email, token=token, priority=settings.CHAT_RUN_PRIORITY,
+            )
+    except AdmissionRejected as e:
+        return f"Cannot start run now: {e.detail}. Please retry in {e.retry_after or 'a few'} seconds."
+    answer = format_answer(run_id, results, duplicates=duplicates)
 
-        execution_settings = OpenAIPromptExecutionSettings(
-            service_id="azure-chat",
-            model_id=settings.AZURE_OPENAI_DEPLOYMENT_NAME,
-            temperature=0.0,
-            max_tokens=2000,
-            function_choice_behavior=FunctionChoiceBehavior.Auto()
-        )
+    # History mein bhi jaata hai taaki follow-up sawal LLM ko context mile
+    session.history.add_user_message(request.message)
+    session.history.add_assistant_message(answer)
+    return answer
 
-        result = await chat_service.get_chat_message_content(
-            chat_history=chat_history,
-            settings=execution_settings,
-            kernel=kernel,
-            arguments=args
-        )
+def _record_usage(messages) -> None:
+    """Token usage of every model response (tool-call rounds included) into the metrics."""
+    for message in messages:
+        if message is not None and message.metadata:
+            record_llm_usage(message.metadata.get("usage"))
 
-        final_answer = str(result).strip()
-        chat_history.add_assistant_message(final_answer)
+def _execution_settings():
+    from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
+    from semantic_kernel.connectors.ai.open_ai import OpenAIPromptExecutionSettings
 
-        return ChatResponse(response=final_answer, success=True, run_id=run_id)
+    return OpenAIPromptExecutionSettings(
+        service_id="azure-chat",
+        model_id=settings.AZURE_OPENAI_DEPLOYMENT_NAME,
+        temperature=0.0,
+        max_tokens=2000,
+        function_choice_behavior=FunctionChoiceBehavior.Auto()
+    )
 
-    except Exception as e:
-        return ChatResponse(response=f"Processing error: {str(e)}", success=False, run_id=run_id)
+@app.post("/chat", response_model=ChatResponse)
+async def chat_endpoint(
+    request: ChatRequest,
+    authorization: Optional[str] = Header(None),
+    x_session_id: Optional[str] = Header(None),
+):
+    if not chat_enabled():
+        raise HTTPException(status_code=503, detail="Chat is disabled (APP_MODE=batch-only)")
+
+    run_id = str(uuid.uuid4())
+    token = authorization.replace("Bearer ", "") if authorization else None
+
+    # Har caller ki apni history; body ka session_id header se pehle
+    session = chat_sessions.get_or_create(request.session_id or x_session_id)
+
+    from semantic_kernel.functions import KernelArguments
+
+    # Inject token into KernelArguments (only when sent, SK would turn None into "None")
+    args = KernelArguments(token=token) if token else KernelArguments()
+
+    async with session.lock:
+        try:
+            fast_answer = await _fast_path(request, session, run_id, token)
+            if fast_answer is not None:
+                CHAT_REQUESTS.inc("chat", "fast_path")
+                return ChatResponse(response=fast_answer, success=True, run_id=run_id, session_id=session.session_id)
+
+            CHAT_REQUESTS.inc("chat", "llm")
+            session.history.add_user_message(request.message)
+            kernel = await get_kernel()
+            chat_service = kernel.get_service("azure-chat")
+
+            # Tool-call rounds bhi history mein add hote hain; unka usage bhi count hota hai
+            history_len = len(session.history.messages)
+            started = time.monotonic()
+            outcome = "error"
+            try:
+                result = await chat_service.get_chat_message_content(
+                    chat_history=session.history,
+                    settings=_execution_settings(),
+                    kernel=kernel,
+                    arguments=args
+                )
+                outcome = "success"
+            finally:
+                LLM_LATENCY.observe(time.monotonic() - started, "chat", outcome)
+            _record_usage(session.history.messages[history_len:] + [result])
+
+            final_answer = str(result).strip()
+            session.history.add_assistant_message(final_answer)
+
+            return ChatResponse(response=final_answer, success=True, run_id=run_id, session_id=session.session_id)
+
+        except Exception as e:
+            return ChatResponse(
+                response=f"Processing error: {str(e)}", success=False, run_id=run_id, session_id=session.session_id
+            )
+        finally:
+            # Prompt size per session stays bounded instead of growing with uptime
+            session.trim(settings.CHAT_HISTORY_TOKEN_BUDGET)
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(
+    request: ChatRequest,
+    authorization: Optional[str] = Header(None),
+    x_session_id: Optional[str] = Header(None),
+):
+    """
+    /chat ka streaming version (Server-Sent Events). Events:
+    'session' (ids), 'token' (model text jaise hi aata hai),
+    'tool_call_start' / 'tool_call_end' (har tool call), 'done' ya 'error'.
+    """
+    if not chat_enabled():
+        raise HTTPException(status_code=503, detail="Chat is disabled (APP_MODE=batch-only)")
+
+    run_id = str(uuid.uuid4())
+    token = authorization.replace("Bearer ", "") if authorization else None
+    session = chat_sessions.get_or_create(request.session_id or x_session_id)
+
+    from semantic_kernel.contents.utils.author_role import AuthorRole
+    from semantic_kernel.functions import KernelArguments
+
+    args = KernelArguments(token=token) if token else KernelArguments()
+
+    # Model tokens aur tool events dono isi queue mein aate hain; None = stream khatam
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        async with session.lock:
+            bind_event_queue(events)
+            parts: List[str] = []
+            try:
+                fast_answer = await _fast_path(request, session, run_id, token)
+                if fast_answer is not None:
+                    CHAT_REQUESTS.inc("chat_stream", "fast_path")
+                    events.put_nowait({"event": "done", "success": True, "response": fast_answer})
+                    return
+
+                CHAT_REQUESTS.inc("chat_stream", "llm")
+                session.history.add_user_message(request.message)
+                kernel = await get_kernel()
+                chat_service = kernel.get_service("azure-chat")
+
+                started = time.monotonic()
+                outcome = "error"
+                try:
+                    async for messages in chat_service.get_streaming_chat_message_contents(
+                        chat_history=session.history,
+                        settings=_execution_settings(),
+                        kernel=kernel,
+                        arguments=args
+                    ):
+                        # Usage wale chunks mein content khaali hota hai, isliye filter se pehle
+                        _record_usage(messages)
+                        for message in messages:
+                            # Tool results 'tool_call_end' event se jaate hain, yahan sirf model text
+                            if message is None or message.role != AuthorRole.ASSISTANT or not message.content:
+                                continue
+                            parts.append(message.content)
+                            events.put_nowait({"event": "token", "content": message.content})
+                    outcome = "success"
+                finally:
+                    LLM_LATENCY.observe(time.monotonic() - started, "chat_stream", outcome)
+
+                final_answer = "".join(parts).strip()
+                session.history.add_assistant_message(final_answer)
+                events.put_nowait({"event": "done", "success": True, "response": final_answer})
+            except Exception as e:
+                events.put_nowait({"event": "error", "success": False, "response": f"Processing error: {str(e)}"})
+            finally:
+                session.trim(settings.CHAT_HISTORY_TOKEN_BUDGET)
+                events.put_nowait(None)
+
+    async def event_source():
+        producer = asyncio.create_task(produce())
+        try:
+            yield f"event: session\ndata: {json.dumps({'run_id': run_id, 'session_id': session.session_id})}\n\n"
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield f"event: {event['event']}\ndata: {json.dumps({**event, 'run_id': run_id})}\n\n"
+        finally:
+            # Client disconnect: model call aur tools cancel
+            if not producer.done():
+                producer.cancel()
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "kernel_initialized": kernel is not None}
+    return {
+        "status": "ok",
+        "mode": settings.APP_MODE,
+        "kernel_initialized": kernel is not None,
+        "chat_sessions": len(chat_sessions),
+        # Current AIMD concurrency limit per downstream endpoint
+        "adaptive_limits": limiter_snapshot(),
+        "circuit_breakers": breaker_snapshot(),
+        "monitor_reporter": monitor_reporter.snapshot(),
+        "stage_cache": stage_cache.snapshot(),
+        "single_flight": stage_flights.snapshot(),
+        "admission": admission.snapshot(),
+        "queue_consumer": queue_consumer.snapshot() if queue_consumer is not None else None,
+        # Latency, quota aur cooldown har Azure OpenAI deployment ke liye
+        "chat_backends": kernel.get_service("azure-chat").snapshot() if kernel is not None else None,
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint (text exposition format)."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 @app.post("/reset")
-async def reset_conversation():
-    global chat_history
-    chat_history = ChatHistory()
-    chat_history.add_system_message(SYSTEM_PROMPT)
-    return {"message": "Reset complete"}
+async def reset_conversation(session_id: Optional[str] = None, x_session_id: Optional[str] = Header(None)):
+    """Ek session reset karta hai; bina session id ke saare sessions."""
+    removed = chat_sessions.reset(session_id or x_session_id)
+    return {"message": "Reset complete", "sessions_removed": removed}
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,16 +1,21 @@
 # models/schemas.py
 
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 
 # --- Existing Chat Schemas (Optional, keep if you still want the chat feature) ---
 class ChatRequest(BaseModel):
     message: str
+    # Conversation to continue (falls back to the X-Session-Id header; new session if neither)
+    session_id: Optional[str] = None
+    # Recorded with runs started from chat
+    email: Optional[str] = None
 
 class ChatResponse(BaseModel):
     response: str
     success: bool = True
     run_id: str
+    session_id: Optional[str] = None
 
 # --- NEW Schemas for Queue Processing ---
 
@@ -22,4 +27,11 @@ class QueueRequest(BaseModel):
     # This accepts an array of items
     items: List[QueueItem]
     email: str
+    # Share of downstream capacity while runs compete: high=interactive, low=backfill
+    priority: Literal["high", "normal", "low"] = "normal"
+    # Seconds; unset uses ITEM_/RUN_DEADLINE_SECONDS, 0 means no deadline
+    item_deadline_seconds: Optional[float] = Field(None, ge=0)
+    run_deadline_seconds: Optional[float] = Field(None, ge=0)
+    # Call every stage even if the stage cache says it already completed
+    force: bool = False
     
\ No newline at end of file
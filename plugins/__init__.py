@@ -0,0 +1,6 @@
+# plugins/__init__.py
+from typing import Annotated
+
+# Caller's bearer token. Injected server-side through KernelArguments, so it is
+# kept out of the tool schema the model sees (and never required from it).
+ServerToken = Annotated[str, {"include_in_function_choices": False}]
@@ -1,7 +1,9 @@
 from semantic_kernel.functions import kernel_function
 import httpx
 from config.settings import settings
-from services.http_client import get_client
+from services.http_client import auth_headers, get_client
+from services.resilience import hedging_enabled, post_with_retry
+from plugins import ServerToken
 
 class AssessmentPlugin:
     
@@ -19,7 +21,7 @@ class AssessmentPlugin:
         project_id: str,
         workbook_id: str,
         run_id: str,  # <--- Added missing comma here
-        token: str = None
+        token: ServerToken = None
     ) -> str:
         """
         Required parameters:
@@ -38,19 +40,20 @@ class AssessmentPlugin:
         }
         
         try:
-            # Pass the token to the client for authentication
-            async with await get_client(token=token) as client:
-                response = await client.post(
-                    settings.ASSESSMENT_API_URL + "/api/assessment",
-                    json=payload,
-                    timeout=60.0,
-                    headers={"Content-Type": "application/json"}
-                )
-                
-                response.raise_for_status()
-                
-                # SUCCESS: Only show status, NO result body
-                return f"ASSESSMENT SUCCESS! Status: {response.status_code}"
+            # Shared pooled client; the token is injected per request
+            client = get_client()
+            # Shared resilience layer: retries, Retry-After, circuit breaker
+            response = await post_with_retry(
+                client,
+                settings.ASSESSMENT_API_URL + "/api/assessment",
+                payload,
+                headers={"Content-Type": "application/json", **auth_headers(token)},
+                timeout=60.0,
+                hedge=hedging_enabled("assessment"),
+            )
+            
+            # SUCCESS: Only show status, NO result body
+            return f"ASSESSMENT SUCCESS! Status: {response.status_code}"
                     
         except httpx.HTTPStatusError as e:
             # FAILED: Only show status, NO error body
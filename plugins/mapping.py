@@ -3,7 +3,9 @@
 from semantic_kernel.functions import kernel_function
 import httpx
 from config.settings import settings
-from services.http_client import get_client
+from services.http_client import auth_headers, get_client
+from services.resilience import hedging_enabled, post_with_retry
+from plugins import ServerToken
 
 class MappingPlugin:
     
@@ -19,7 +21,7 @@ class MappingPlugin:
         project_id: str,
         workbook_id: str,
         run_id: str,
-        token: str = None  # Added token parameter
+        token: ServerToken = None
     ) -> str:
         """
         Sends request to /mapping endpoint with Authorization.
@@ -31,16 +33,17 @@ class MappingPlugin:
         }
 
         try:
-            async with await get_client(token=token) as client:
-                response = await client.post(
-                    settings.MAPPING_API_URL + "/mapping",
-                    json=payload,
-                    timeout=60.0,
-                    headers={"Content-Type": "application/json"}
-                )
-                
-                response.raise_for_status()
-                return f"MAPPING SUCCESS! Status: {response.status_code}"
+            client = get_client()
+            # Shared resilience layer: retries, Retry-After, circuit breaker
+            response = await post_with_retry(
+                client,
+                settings.MAPPING_API_URL + "/mapping",
+                payload,
+                headers={"Content-Type": "application/json", **auth_headers(token)},
+                timeout=60.0,
+                hedge=hedging_enabled("mapping"),
+            )
+            return f"MAPPING SUCCESS! Status: {response.status_code}"
 
         except httpx.HTTPStatusError as e:
             return f"MAPPING FAILED: HTTP {e.response.status_code}"
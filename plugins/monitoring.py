@@ -1,6 +1,7 @@
 from semantic_kernel.functions import kernel_function
-from services.http_client import get_client
-from config.settings import settings
+from services.http_client import auth_headers
+from services.monitor_reporter import monitor_reporter
+from plugins import ServerToken
 
 class MonitoringAgentPlugin:
     
@@ -14,10 +15,8 @@ class MonitoringAgentPlugin:
         workbook_id: str,
         run_id: str,
         status: str = "PROCESSED",
-        token: str = None  # Added token parameter
+        token: ServerToken = None
     ) -> str:
-        url = settings.MONITORING_AGENT_URL + "/monitor/report"
-        
         payload = {
             "project_id": project_id,
             "workbook_id": workbook_id,
@@ -25,14 +24,7 @@ class MonitoringAgentPlugin:
             "status": status
         }
 
-        try:
-            async with await get_client(token=token) as client:
-                response = await client.post(
-                    url,
-                    json=payload,
-                    timeout=10.0
-                )
-                response.raise_for_status()
-                return f"Monitoring Agent notified for Run {run_id}"
-        except Exception as e:
-            return f"Monitoring Agent Error: {str(e)}"
\ No newline at end of file
+        # Handed to the background reporter (batched, coalesced); never blocks the workflow
+        if monitor_reporter.report(payload, headers=auth_headers(token)):
+            return f"Monitoring Agent notified for Run {run_id}"
+        return f"Monitoring Agent Error: report queue full, event for Run {run_id} dropped"
@@ -1,7 +1,9 @@
 from semantic_kernel.functions import kernel_function
 import httpx
 from config.settings import settings
-from services.http_client import get_client
+from services.http_client import auth_headers, get_client
+from services.resilience import hedging_enabled, post_with_retry
+from plugins import ServerToken
 
 class ParsingPlugin:
     
@@ -17,7 +19,7 @@ class ParsingPlugin:
         project_id: str,
         workbook_id: str,
         run_id: str,
-        token: str = None  # Added token parameter
+        token: ServerToken = None
     ) -> str:
         """
         Sends request to /parse-xml endpoint with Authorization.
@@ -29,17 +31,18 @@ class ParsingPlugin:
         }
 
         try:
-            # Pass the token to the shared http client
-            async with await get_client(token=token) as client:
-                response = await client.post(
-                    settings.PARSING_API_URL + "/parse-xml",
-                    json=payload,
-                    timeout=60.0,
-                    headers={"Content-Type": "application/json"}
-                )
-                
-                response.raise_for_status()
-                return f"PARSING SUCCESS! Status: {response.status_code}"
+            # Shared pooled client; the token is injected per request
+            client = get_client()
+            # Shared resilience layer: retries, Retry-After, circuit breaker
+            response = await post_with_retry(
+                client,
+                settings.PARSING_API_URL + "/parse-xml",
+                payload,
+                headers={"Content-Type": "application/json", **auth_headers(token)},
+                timeout=60.0,
+                hedge=hedging_enabled("parsing"),
+            )
+            return f"PARSING SUCCESS! Status: {response.status_code}"
 
         except httpx.HTTPStatusError as e:
             return f"PARSING FAILED: HTTP {e.response.status_code}"
@@ -0,0 +1,73 @@
+# plugins/workbook_pipeline.py
+import uuid
+from typing import Any, Dict, Optional
+
+from semantic_kernel.functions import kernel_function
+
+from config.settings import settings
+from plugins import ServerToken
+from plugins.queue_handler import QueuePlugin
+from services.admission import AdmissionRejected, admission
+
+
+class WorkbookPipelinePlugin:
+    def __init__(self, queue_plugin: Optional[QueuePlugin] = None):
+        # Same engine as process_items_queue: retries, breakers, logging, monitoring
+        self.queue_plugin = queue_plugin or QueuePlugin()
+
+    @kernel_function(
+        name="run_workbook_pipeline",
+        description=(
+            "Run the complete workflow for ONE project_id/workbook_id pair in a single call: "
+            "assessment -> parsing -> mapping, then CosmosDB logging and the monitoring report. "
+            "Returns the final status of every step."
+        ),
+    )
+    async def run_workbook_pipeline(
+        self,
+        project_id: str,
+        workbook_id: str,
+        run_id: Optional[str] = None,
+        email: Optional[str] = None,
+        token: ServerToken = None,
+    ) -> Dict[str, Any]:
+        if not project_id or not workbook_id:
+            return {"error": "Both project_id and workbook_id are required. Ask user to provide them."}
+
+        run_id = run_id or str(uuid.uuid4())
+        log_lines: Dict[int, str] = {}
+
+        async def keep_log_line(index: int, result: Dict[str, Any]) -> None:
+            log_lines[index] = result["log_line"]
+
+        try:
+            # Same global cap as process_items_queue
+            async with admission.direct(1):
+                results = await self.queue_plugin.run_batch(
+                    [(0, project_id, workbook_id)],
+                    run_id=run_id,
+                    email=email or settings.CHAT_DEFAULT_EMAIL,
+                    token=token,
+                    on_item_done=keep_log_line,
+                    priority=settings.CHAT_RUN_PRIORITY,
+                )
+        except AdmissionRejected as e:
+            return {
+                "run_id": run_id,
+                "project_id": project_id,
+                "workbook_id": workbook_id,
+                "error": f"{e.detail}. Retry after {e.retry_after} seconds.",
+            }
+        except Exception as e:
+            return {"run_id": run_id, "project_id": project_id, "workbook_id": workbook_id, "error": str(e)}
+
+        # Compact result: one tool message instead of four round-trips
+        status = results[0]
+        return {
+            "run_id": run_id,
+            "project_id": project_id,
+            "workbook_id": workbook_id,
+            "final_status": status["final_status"],
+            "steps": status["steps"],
+            "detail": log_lines.get(0, ""),
+        }
@@ -0,0 +1,246 @@
+# services/adaptive_limiter.py
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+import httpx
+from config.settings import settings
+from services.fair_scheduler import FairQueue, current_flow
+from services.log import get_logger
+from services.metrics import LIMITER_WAIT, GaugeCallback
+
+log = get_logger("adaptive_limiter")
+
+# Status codes that mean "you are sending too much", not "your request is bad"
+OVERLOAD_STATUS_CODES = {429, 503}
+
+OUTCOME_OK = "ok"
+OUTCOME_ERROR = "error"
+OUTCOME_OVERLOAD = "overload"
+
+
+class AdaptiveLimiter:
+    """
+    Process-wide concurrency limit for one downstream service, shared by every
+    run, chat and background task. Requests that find every slot busy wait in a
+    FairQueue, so a freed slot goes to the requester / run that has had the
+    least weighted service so far rather than to whoever queued first.
+
+    The limit itself is AIMD (fixed when `adaptive` is False):
+
+    - Additive increase: +1 slot per `limit` healthy responses (roughly one
+      step per round of full utilisation), only while p95 latency and the
+      error rate over the recent window are within target.
+    - Multiplicative decrease: limit *= ADAPTIVE_DECREASE_FACTOR on 429/503
+      or a timeout, at most once per cooldown so one burst of failures
+      doesn't collapse the limit to the floor.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        min_limit: int,
+        max_limit: int,
+        initial_limit: int,
+        latency_target: float,
+        error_rate_threshold: float,
+        decrease_factor: float,
+        window_size: int,
+        cooldown: float,
+        adaptive: bool = True,
+    ):
+        self.name = name
+        self.min_limit = max(min_limit, 1)
+        self.max_limit = max(max_limit, self.min_limit)
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.latency_target = latency_target
+        self.error_rate_threshold = error_rate_threshold
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.adaptive = adaptive
+
+        self.inflight = 0
+        self._waiters = FairQueue()
+        self._latencies: deque = deque(maxlen=window_size)
+        self._outcomes: deque = deque(maxlen=window_size)
+        self._last_decrease = 0.0
+
+    # -----------------------------
+    # Gate
+    # -----------------------------
+    async def _acquire(self) -> None:
+        flow = current_flow()
+        started = time.monotonic()
+        if self.inflight < int(self.limit) and not self._waiters.waiting:
+            self.inflight += 1
+        else:
+            # The slot is handed over by _dispatch (inflight already counted)
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.push(flow, waiter)
+            self._dispatch()
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Granted just as we were cancelled: pass the slot on
+                    self._release()
+                raise
+        LIMITER_WAIT.observe(time.monotonic() - started, self.name, flow.priority)
+
+    def _release(self) -> None:
+        self.inflight -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self.inflight < int(self.limit):
+            waiter = self._waiters.pop()
+            if waiter is None:
+                return
+            self.inflight += 1
+            waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one concurrency slot for a single HTTP attempt and learn from its outcome."""
+        await self._acquire()
+        start = time.monotonic()
+        outcome = OUTCOME_OK
+        try:
+            yield
+        except asyncio.CancelledError:
+            # Abandoned (hedge loser, caller gone): says nothing about the service
+            outcome = None
+            raise
+        except httpx.TimeoutException:
+            outcome = OUTCOME_OVERLOAD
+            raise
+        except httpx.HTTPStatusError as e:
+            status = e.response.status_code
+            if status in OVERLOAD_STATUS_CODES:
+                outcome = OUTCOME_OVERLOAD
+            elif status >= 500:
+                outcome = OUTCOME_ERROR
+            raise
+        except Exception:
+            outcome = OUTCOME_ERROR
+            raise
+        finally:
+            if outcome is not None:
+                latency = time.monotonic() - start
+                self._record(latency, outcome, utilised=self.inflight >= int(self.limit))
+            self._release()
+
+    # -----------------------------
+    # Control loop
+    # -----------------------------
+    def _record(self, latency: float, outcome: str, utilised: bool) -> None:
+        self._latencies.append(latency)
+        self._outcomes.append(outcome)
+        if not self.adaptive:
+            return
+
+        if outcome == OUTCOME_OVERLOAD:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self._last_decrease = now
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                log.warning("Adaptive limit decreased", endpoint=self.name, limit=int(self.limit))
+            return
+
+        # Only grow when the current limit is actually being used and healthy
+        if outcome == OUTCOME_OK and utilised and self.is_healthy():
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def p95_latency(self) -> Optional[float]:
+        return self.latency_percentile(0.95)
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    def samples(self) -> int:
+        return len(self._latencies)
+
+    def has_capacity(self) -> bool:
+        """A request sent now would get a slot without queueing."""
+        return self.inflight < int(self.limit) and not self._waiters.waiting
+
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        bad = sum(1 for o in self._outcomes if o != OUTCOME_OK)
+        return bad / len(self._outcomes)
+
+    def is_healthy(self) -> bool:
+        p95 = self.p95_latency()
+        if p95 is not None and p95 > self.latency_target:
+            return False
+        return self.error_rate() <= self.error_rate_threshold
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "inflight": self.inflight,
+            "p95_latency": self.p95_latency(),
+            "error_rate": round(self.error_rate(), 4),
+            **self._waiters.snapshot(),
+        }
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+
+
+def service_key(url: str) -> str:
+    """Limiter key: scheme + host + path, so each downstream endpoint adapts on its own."""
+    parsed = httpx.URL(url)
+    return f"{parsed.scheme}://{parsed.netloc.decode()}{parsed.path}"
+
+
+def get_limiter(url: str) -> AdaptiveLimiter:
+    key = service_key(url)
+    limiter = _limiters.get(key)
+    if limiter is None:
+        # Without AIMD the limit stays at its starting value
+        limiter = AdaptiveLimiter(
+            name=key,
+            min_limit=settings.ADAPTIVE_MIN_CONCURRENCY,
+            max_limit=settings.ADAPTIVE_MAX_CONCURRENCY,
+            initial_limit=settings.ADAPTIVE_INITIAL_CONCURRENCY or settings.MAX_CONCURRENT_WORKBOOKS,
+            latency_target=settings.ADAPTIVE_LATENCY_TARGET_SECONDS,
+            error_rate_threshold=settings.ADAPTIVE_ERROR_RATE_THRESHOLD,
+            decrease_factor=settings.ADAPTIVE_DECREASE_FACTOR,
+            window_size=settings.ADAPTIVE_WINDOW_SIZE,
+            cooldown=settings.ADAPTIVE_COOLDOWN_SECONDS,
+            adaptive=settings.ADAPTIVE_CONCURRENCY_ENABLED,
+        )
+        _limiters[key] = limiter
+    return limiter
+
+
+GaugeCallback(
+    "adaptive_concurrency_limit",
+    "Current AIMD concurrency limit per downstream endpoint",
+    ["endpoint"],
+    lambda: [((key,), int(limiter.limit)) for key, limiter in _limiters.items()],
+)
+GaugeCallback(
+    "downstream_in_flight",
+    "Requests holding a concurrency slot per downstream endpoint",
+    ["endpoint"],
+    lambda: [((key,), limiter.inflight) for key, limiter in _limiters.items()],
+)
+GaugeCallback(
+    "scheduler_waiting_requests",
+    "Requests queued for a concurrency slot per downstream endpoint",
+    ["endpoint"],
+    lambda: [((key,), limiter._waiters.waiting) for key, limiter in _limiters.items()],
+)
+
+
+def limiter_snapshot() -> Dict[str, Dict[str, Any]]:
+    """Current limits and scheduler queues per downstream endpoint (for /health and metrics)."""
+    return {key: limiter.snapshot() for key, limiter in _limiters.items()}
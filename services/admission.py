@@ -0,0 +1,153 @@
+# services/admission.py
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+from config.settings import settings
+from services.job_store import SQLiteJobStore, job_store
+from services.metrics import GaugeCallback
+
+
+class AdmissionRejected(Exception):
+    """Work refused at intake; `status_code` / `retry_after` map straight onto the HTTP response."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(self.retry_after)} if self.retry_after is not None else {}
+
+
+class AdmissionController:
+    """
+    Global cap on outstanding work: items waiting or running in the job store
+    plus items in flight in directly admitted runs (chat, queue consumer,
+    streamed uploads) in this process may not exceed
+    ADMISSION_MAX_PENDING_ITEMS. Over the cap new work gets 429 + Retry-After
+    instead of piling up; during shutdown everything gets 503.
+    """
+
+    def __init__(self, store: SQLiteJobStore):
+        self.store = store
+        self.accepting = True
+        self.direct_inflight = 0
+        # Check + enqueue are atomic within this process
+        self._lock = asyncio.Lock()
+        self.rejected = 0
+
+    async def _check(self, count: int) -> None:
+        if not self.accepting:
+            self.rejected += 1
+            raise AdmissionRejected(503, "Shutting down, not accepting new work", settings.ADMISSION_RETRY_AFTER_SECONDS)
+        cap = settings.ADMISSION_MAX_PENDING_ITEMS
+        if count > cap:
+            self.rejected += 1
+            raise AdmissionRejected(413, f"Batch of {count} items exceeds the limit of {cap}")
+        outstanding = await self.store.pending_item_count() + self.direct_inflight
+        if outstanding + count > cap:
+            self.rejected += 1
+            raise AdmissionRejected(
+                429,
+                f"Too much outstanding work ({outstanding} items pending, limit {cap})",
+                settings.ADMISSION_RETRY_AFTER_SECONDS,
+            )
+
+    @asynccontextmanager
+    async def admit(self, count: int) -> AsyncIterator[None]:
+        """Hold while enqueueing `count` items into the job store (raises AdmissionRejected)."""
+        async with self._lock:
+            await self._check(count)
+            yield
+
+    @asynccontextmanager
+    async def direct(self, count: int) -> AsyncIterator[None]:
+        """Hold for the whole duration of a synchronous run of `count` items."""
+        async with self._lock:
+            await self._check(count)
+            self.direct_inflight += count
+        try:
+            yield
+        finally:
+            self.direct_inflight -= count
+
+    async def open_stream(self) -> "StreamTicket":
+        """
+        Admit a streamed run whose size is only known as items arrive: intake
+        is checked now, then every item against the cap as it starts
+        (StreamTicket.started) and while it is in flight.
+        """
+        async with self._lock:
+            await self._check(0)
+        return StreamTicket(self)
+
+    def stop_intake(self) -> None:
+        self.accepting = False
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "accepting": self.accepting,
+            "direct_inflight": self.direct_inflight,
+            "rejected": self.rejected,
+            "max_pending_items": settings.ADMISSION_MAX_PENDING_ITEMS,
+        }
+
+
+class StreamTicket:
+    """In-flight item accounting of one admitted streamed run; close() when it ends."""
+
+    # The job store's pending count is re-read at most this often per stream
+    STORE_RECHECK_SECONDS = 1.0
+
+    def __init__(self, controller: AdmissionController):
+        self.controller = controller
+        self.in_flight = 0
+        self._store_pending = 0
+        self._store_checked_at = float("-inf")
+
+    async def started(self) -> None:
+        """Count one more item in flight; AdmissionRejected (429) when that would exceed the cap."""
+        controller = self.controller
+        now = time.monotonic()
+        if now - self._store_checked_at >= self.STORE_RECHECK_SECONDS:
+            self._store_pending = await controller.store.pending_item_count()
+            self._store_checked_at = now
+        cap = settings.ADMISSION_MAX_PENDING_ITEMS
+        outstanding = self._store_pending + controller.direct_inflight
+        if outstanding + 1 > cap:
+            controller.rejected += 1
+            raise AdmissionRejected(
+                429,
+                f"Too much outstanding work ({outstanding} items pending, limit {cap})",
+                settings.ADMISSION_RETRY_AFTER_SECONDS,
+            )
+        self.in_flight += 1
+        controller.direct_inflight += 1
+
+    def finished(self) -> None:
+        self.in_flight -= 1
+        self.controller.direct_inflight -= 1
+
+    def close(self) -> None:
+        self.controller.direct_inflight -= self.in_flight
+        self.in_flight = 0
+
+
+admission = AdmissionController(job_store)
+
+GaugeCallback(
+    "admission_direct_in_flight_items",
+    "Items in flight in directly admitted runs of this process (chat, plugins, queue consumer, "
+    "streamed uploads); counted against ADMISSION_MAX_PENDING_ITEMS, not a queue depth",
+    [],
+    lambda: [((), admission.direct_inflight)],
+)
+GaugeCallback(
+    "admission_rejected",
+    "Work refused at intake since startup (429 / 413 / 503)",
+    [],
+    lambda: [((), admission.rejected)],
+)
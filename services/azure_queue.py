@@ -0,0 +1,441 @@
+# services/azure_queue.py
+"""
+Queue-driven batch ingestion: consumers receive batch requests from an Azure
+Storage Queue and run them through the same pipeline as /invoke-batch and
+QueuePlugin.process_items_queue. Ingestion scales by adding consumer
+replicas (`python -m services.azure_queue`) instead of HTTP load on API pods.
+
+Message body: the /invoke-batch payload as JSON (plain or base64-encoded),
+    {"items": [{"project_id": ..., "workbook_id": ...}], "email": ..., "priority": ...}
+
+- Messages are received AZURE_QUEUE_BATCH_SIZE at a time and the next batch
+  is prefetched while the current one is processed.
+- Visibility of every held message is extended while it is being processed,
+  so long runs are not redelivered to another replica halfway through.
+- Processed messages are deleted together once their batch is done; a
+  message whose run failed becomes visible again after AZURE_QUEUE_RETRY_DELAY_SECONDS.
+- Unreadable messages, and messages delivered more than
+  AZURE_QUEUE_MAX_DEQUEUE_COUNT times, go to the dead-letter queue.
+
+AZURE_QUEUE_BACKEND=memory swaps Azure for an in-process queue with the same
+visibility semantics (local runs and tests); Azurite works with the azure
+backend and its connection string.
+"""
+import asyncio
+import base64
+import binascii
+import itertools
+import json
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from pydantic import ValidationError
+
+from config.settings import settings
+from models.schemas import QueueRequest
+from services.admission import AdmissionRejected, admission
+from services.log import get_logger
+from services.metrics import QUEUE_MESSAGES, GaugeCallback
+from services.run_tracker import run_tracker
+from services.single_flight import dedupe_pairs
+
+log = get_logger("azure_queue")
+
+
+@dataclass
+class QueueMessage:
+    id: str
+    pop_receipt: str
+    content: str
+    dequeue_count: int
+
+
+class PoisonMessage(Exception):
+    """The message can never be processed (not JSON, not a valid batch request)."""
+
+
+# -----------------------------
+# Queue backends
+# -----------------------------
+class MemoryQueue:
+    """
+    In-process stand-in for a storage queue: received messages stay invisible
+    for the visibility timeout, every receive or update issues a new pop
+    receipt and only the latest one can update or delete the message.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        # id -> [content, visible_at, pop_receipt, dequeue_count]
+        self._messages: Dict[str, List[Any]] = {}
+        self._ids = itertools.count(1)
+
+    async def send(self, content: str) -> None:
+        self._messages[str(next(self._ids))] = [content, 0.0, None, 0]
+
+    async def receive(self, max_messages: int, visibility_timeout: int) -> List[QueueMessage]:
+        now = time.monotonic()
+        received: List[QueueMessage] = []
+        for message_id, entry in self._messages.items():
+            if len(received) >= max_messages:
+                break
+            if entry[1] > now:
+                continue
+            entry[1] = now + visibility_timeout
+            entry[2] = uuid.uuid4().hex
+            entry[3] += 1
+            received.append(QueueMessage(message_id, entry[2], entry[0], entry[3]))
+        return received
+
+    def _entry(self, message: QueueMessage) -> List[Any]:
+        entry = self._messages.get(message.id)
+        if entry is None or entry[2] != message.pop_receipt:
+            raise LookupError(f"Message {message.id} not found or pop receipt is stale")
+        return entry
+
+    async def update_visibility(self, message: QueueMessage, visibility_timeout: int) -> QueueMessage:
+        entry = self._entry(message)
+        entry[1] = time.monotonic() + visibility_timeout
+        entry[2] = uuid.uuid4().hex
+        return QueueMessage(message.id, entry[2], message.content, message.dequeue_count)
+
+    async def delete(self, message: QueueMessage) -> None:
+        self._entry(message)
+        del self._messages[message.id]
+
+    async def close(self) -> None:
+        return None
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+
+class AzureStorageQueue:
+    """Azure Storage Queue (or Azurite) through the async SDK, imported only when used."""
+
+    def __init__(self, connection_string: str, name: str):
+        try:
+            from azure.storage.queue.aio import QueueClient
+        except ImportError as e:
+            raise RuntimeError("AZURE_QUEUE_BACKEND=azure needs the 'azure-storage-queue' package") from e
+        self.name = name
+        self._client = QueueClient.from_connection_string(connection_string, name)
+
+    async def ensure_exists(self) -> None:
+        from azure.core.exceptions import ResourceExistsError
+
+        try:
+            await self._client.create_queue()
+        except ResourceExistsError:
+            pass
+
+    async def send(self, content: str) -> None:
+        await self._client.send_message(content)
+
+    async def receive(self, max_messages: int, visibility_timeout: int) -> List[QueueMessage]:
+        received: List[QueueMessage] = []
+        pages = self._client.receive_messages(
+            messages_per_page=max_messages,
+            max_messages=max_messages,
+            visibility_timeout=visibility_timeout,
+        )
+        async for msg in pages:
+            received.append(QueueMessage(msg.id, msg.pop_receipt, msg.content, msg.dequeue_count))
+        return received
+
+    async def update_visibility(self, message: QueueMessage, visibility_timeout: int) -> QueueMessage:
+        updated = await self._client.update_message(
+            message.id, pop_receipt=message.pop_receipt, visibility_timeout=visibility_timeout
+        )
+        return QueueMessage(message.id, updated.pop_receipt, message.content, message.dequeue_count)
+
+    async def delete(self, message: QueueMessage) -> None:
+        await self._client.delete_message(message.id, message.pop_receipt)
+
+    async def close(self) -> None:
+        await self._client.close()
+
+
+def create_queues():
+    """(work queue, dead-letter queue) for the configured backend."""
+    backend = (settings.AZURE_QUEUE_BACKEND or "azure").lower()
+    if backend == "memory":
+        return MemoryQueue(settings.AZURE_QUEUE_NAME), MemoryQueue(settings.AZURE_QUEUE_DEAD_LETTER_NAME)
+    if backend != "azure":
+        raise ValueError(f"Unknown AZURE_QUEUE_BACKEND: {settings.AZURE_QUEUE_BACKEND}")
+    if not settings.AZURE_STORAGE_CONNECTION_STRING:
+        raise ValueError("AZURE_STORAGE_CONNECTION_STRING is required for AZURE_QUEUE_BACKEND=azure")
+    return (
+        AzureStorageQueue(settings.AZURE_STORAGE_CONNECTION_STRING, settings.AZURE_QUEUE_NAME),
+        AzureStorageQueue(settings.AZURE_STORAGE_CONNECTION_STRING, settings.AZURE_QUEUE_DEAD_LETTER_NAME),
+    )
+
+
+# -----------------------------
+# Consumer
+# -----------------------------
+def parse_message(content: str) -> QueueRequest:
+    """Batch request from a message body (plain JSON or base64-encoded JSON)."""
+    try:
+        data = json.loads(content)
+    except ValueError:
+        try:
+            data = json.loads(base64.b64decode(content, validate=True))
+        except (ValueError, binascii.Error):
+            raise PoisonMessage("Message body is neither JSON nor base64-encoded JSON")
+    try:
+        return QueueRequest.model_validate(data)
+    except ValidationError as e:
+        raise PoisonMessage(f"Invalid batch request: {e.errors()[0]['msg']}")
+
+
+@dataclass(eq=False)
+class _Held:
+    """A received message whose visibility this consumer keeps extending."""
+
+    message: QueueMessage
+    # Renewal and delete both need the latest pop receipt
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class QueueConsumer:
+    """
+    Receives batch requests in batches (prefetching the next batch while the
+    current one runs), keeps their messages invisible while they are being
+    processed and deletes or dead-letters them afterwards.
+    """
+
+    def __init__(self, queue, dead_letter, batch_runner):
+        self.queue = queue
+        self.dead_letter = dead_letter
+        self.batch_runner = batch_runner
+        self._held: Set[_Held] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._renewer: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.stats = {"completed": 0, "retried": 0, "dead_lettered": 0}
+
+    def start(self) -> None:
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+        self._renewer = asyncio.create_task(self._renew_loop())
+
+    async def stop(self, drain_timeout: float = 0) -> None:
+        """Stop receiving; the current batch gets `drain_timeout` seconds, the rest is redelivered later."""
+        self._stopping = True
+        if self._task is not None:
+            if drain_timeout > 0:
+                _, pending = await asyncio.wait([self._task], timeout=drain_timeout)
+                if pending:
+                    log.warning("Drain timeout, cancelling queue batch", held=len(self._held))
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._renewer is not None:
+            self._renewer.cancel()
+            await asyncio.gather(self._renewer, return_exceptions=True)
+        # Unfinished and prefetched messages: visible to other replicas right away
+        await asyncio.gather(*(self._release(held, 0, count=False) for held in list(self._held)))
+        await self.queue.close()
+        await self.dead_letter.close()
+
+    async def _receive(self) -> List[_Held]:
+        try:
+            messages = await self.queue.receive(
+                settings.AZURE_QUEUE_BATCH_SIZE, settings.AZURE_QUEUE_VISIBILITY_TIMEOUT_SECONDS
+            )
+        except Exception as e:
+            log.error("Queue receive failed", queue=self.queue.name, error=str(e))
+            return []
+        held = [_Held(message) for message in messages]
+        self._held.update(held)
+        return held
+
+    async def _run(self) -> None:
+        prefetch = asyncio.create_task(self._receive())
+        try:
+            while not self._stopping:
+                batch = await prefetch
+                if not batch:
+                    await asyncio.sleep(settings.AZURE_QUEUE_POLL_INTERVAL)
+                    prefetch = asyncio.create_task(self._receive())
+                    continue
+                # Next batch is fetched while this one runs
+                prefetch = asyncio.create_task(self._receive())
+                await self._process_batch(batch)
+        finally:
+            prefetch.cancel()
+
+    async def _process_batch(self, batch: List[_Held]) -> None:
+        outcomes = await asyncio.gather(*(self._process(held) for held in batch))
+        done = [held for held, ok in zip(batch, outcomes) if ok]
+        # Deleted together once the batch is finished
+        await asyncio.gather(*(self._delete(held) for held in done))
+        log.info("Queue batch finished", messages=len(batch), deleted=len(done))
+
+    async def _process(self, held: _Held) -> bool:
+        """True when the message is finished with (processed or dead-lettered) and can be deleted."""
+        message = held.message
+        if message.dequeue_count > settings.AZURE_QUEUE_MAX_DEQUEUE_COUNT:
+            return await self._dead_letter(held, f"Delivered {message.dequeue_count} times")
+        try:
+            request = parse_message(message.content)
+        except PoisonMessage as e:
+            return await self._dead_letter(held, str(e))
+
+        run_id = str(uuid.uuid4())
+        pairs, duplicates = dedupe_pairs([(item.project_id, item.workbook_id) for item in request.items])
+        items = [(i, pid, wid) for i, (pid, wid) in enumerate(pairs)]
+        log.info("Queue message received", message_id=message.id, run_id=run_id, user=request.email, items=len(items))
+        try:
+            async with admission.direct(len(items)):
+                run_tracker.register(run_id, request.email)
+                await self.batch_runner.run_batch(
+                    items,
+                    run_id=run_id,
+                    email=request.email,
+                    token=settings.SERVICE_AUTH_TOKEN,
+                    collect_results=False,
+                    priority=request.priority,
+                    item_deadline_seconds=request.item_deadline_seconds,
+                    run_deadline_seconds=request.run_deadline_seconds,
+                    force=request.force,
+                )
+        except AdmissionRejected as e:
+            if e.status_code == 413:
+                # Over the per-batch cap on every delivery: redelivering can't help
+                return await self._dead_letter(held, e.detail)
+            if e.status_code == 503:
+                # Shutting down: visible to other replicas right away, not a failed attempt
+                await self._release(held, 0, count=False)
+                return False
+            await self._release(held, e.retry_after or settings.AZURE_QUEUE_RETRY_DELAY_SECONDS)
+            return False
+        except ValidationError as e:
+            # Invalid request data fails the same way every time
+            return await self._dead_letter(held, f"Invalid batch request: {e.errors()[0]['msg']}")
+        except Exception:
+            log.exception("Queue run failed", message_id=message.id, run_id=run_id)
+            await self._release(held, settings.AZURE_QUEUE_RETRY_DELAY_SECONDS)
+            return False
+        self.stats["completed"] += 1
+        QUEUE_MESSAGES.inc("completed")
+        return True
+
+    async def _release(self, held: _Held, delay: int, count: bool = True) -> None:
+        """Hand the message back: visible again after `delay` seconds (counts as a delivery)."""
+        self._held.discard(held)
+        if count:
+            self.stats["retried"] += 1
+            QUEUE_MESSAGES.inc("retried")
+        async with held.lock:
+            try:
+                await self.queue.update_visibility(held.message, int(delay))
+            except Exception as e:
+                # Visible again after the current timeout anyway
+                log.warning("Queue release failed", message_id=held.message.id, error=str(e))
+
+    async def _dead_letter(self, held: _Held, reason: str) -> bool:
+        log.warning("Dead-lettering queue message", message_id=held.message.id, reason=reason)
+        try:
+            await self.dead_letter.send(held.message.content)
+        except Exception as e:
+            # Left on the work queue; tried again on its next delivery
+            log.error("Dead-letter send failed", message_id=held.message.id, error=str(e))
+            self._held.discard(held)
+            return False
+        self.stats["dead_lettered"] += 1
+        QUEUE_MESSAGES.inc("dead_lettered")
+        return True
+
+    async def _delete(self, held: _Held) -> None:
+        self._held.discard(held)
+        async with held.lock:
+            try:
+                await self.queue.delete(held.message)
+            except Exception as e:
+                # Redelivered later; stage cache skips the stages already done
+                log.warning("Queue delete failed", message_id=held.message.id, error=str(e))
+
+    async def _renew_loop(self) -> None:
+        interval = max(settings.AZURE_QUEUE_VISIBILITY_TIMEOUT_SECONDS / 3, 1.0)
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.gather(*(self._renew(held) for held in list(self._held)))
+
+    async def _renew(self, held: _Held) -> None:
+        async with held.lock:
+            if held not in self._held:
+                return
+            try:
+                held.message = await self.queue.update_visibility(
+                    held.message, settings.AZURE_QUEUE_VISIBILITY_TIMEOUT_SECONDS
+                )
+            except Exception as e:
+                log.warning("Queue visibility renewal failed", message_id=held.message.id, error=str(e))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"queue": self.queue.name, "held": len(self._held), **self.stats}
+
+
+def create_consumer(batch_runner) -> QueueConsumer:
+    queue, dead_letter = create_queues()
+    return QueueConsumer(queue, dead_letter, batch_runner)
+
+
+_consumers: List[QueueConsumer] = []
+
+GaugeCallback(
+    "queue_messages_held",
+    "Queue messages received and not yet deleted or released",
+    [],
+    lambda: [((), sum(len(c._held) for c in _consumers))],
+)
+
+
+async def start_consumer(batch_runner) -> QueueConsumer:
+    consumer = create_consumer(batch_runner)
+    for queue in (consumer.queue, consumer.dead_letter):
+        if hasattr(queue, "ensure_exists"):
+            await queue.ensure_exists()
+    consumer.start()
+    _consumers.append(consumer)
+    log.info("Queue consumer started", queue=consumer.queue.name, backend=settings.AZURE_QUEUE_BACKEND)
+    return consumer
+
+
+async def stop_consumer(consumer: QueueConsumer, drain_timeout: float = 0) -> None:
+    await consumer.stop(drain_timeout)
+    if consumer in _consumers:
+        _consumers.remove(consumer)
+
+
+async def _main() -> None:
+    """Standalone consumer replica: pipeline + queue consumer, no HTTP API."""
+    import signal
+
+    from services.batch_runner import BatchRunner
+    from services.http_client import close_client, start_client
+    from services.monitor_reporter import monitor_reporter
+    from services.stage_cache import stage_cache
+
+    await start_client()
+    monitor_reporter.start()
+    consumer = await start_consumer(BatchRunner())
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    admission.stop_intake()
+    await stop_consumer(consumer, settings.SHUTDOWN_DRAIN_TIMEOUT_SECONDS)
+    await monitor_reporter.stop()
+    await stage_cache.close()
+    await close_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
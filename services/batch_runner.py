@@ -0,0 +1,420 @@
+# services/batch_runner.py
+import asyncio
+import time
+from typing import Any, AsyncIterable, Awaitable, Callable, Collection, Dict, List, Optional, Tuple, Union
+
+import httpx
+
+from config.settings import settings
+from services.batcher import MicroBatcher, bulk_results
+from services.fair_scheduler import PRIORITY_NORMAL, bind_flow, unbind_flow
+from services.http_client import auth_headers, get_client
+from services.metrics import BATCH_SIZE, ITEMS_FINISHED, RUN_DURATION, RUNS_IN_FLIGHT, STAGE_LATENCY
+from services.monitor_reporter import monitor_reporter
+from services.pipeline import PipelineItem, Stage, StagedPipeline
+from services.resilience import DeadlineExceeded, RetryBudget, hedging_enabled, post_with_retry
+from services.run_logger import RunLogWriter
+from services.run_tracker import run_tracker
+from services.single_flight import caller_key, stage_flights
+from services.stage_cache import stage_cache, stage_key
+
+
+def _stage_concurrency(stage: str) -> int:
+    """
+    Per-stage worker count. With adaptive concurrency on, unset stages get
+    ADAPTIVE_MAX_CONCURRENCY workers and the per-endpoint AIMD limit decides
+    how many requests are really in flight; otherwise MAX_CONCURRENT_WORKBOOKS.
+    """
+    value = getattr(settings, f"{stage.upper()}_CONCURRENCY", None)
+    if not value:
+        if settings.ADAPTIVE_CONCURRENCY_ENABLED:
+            value = settings.ADAPTIVE_MAX_CONCURRENCY
+        else:
+            value = getattr(settings, "MAX_CONCURRENT_WORKBOOKS", 5)
+    if _bulk_enabled(stage):
+        # Workers only wait on their batch's result; enough of them to fill full batches
+        value = max(value, settings.BULK_MAX_BATCH_SIZE * settings.BULK_MAX_CONCURRENT_BATCHES)
+    return value
+
+
+def _bulk_enabled(stage: str) -> bool:
+    return bool(getattr(settings, f"{stage.upper()}_BULK_ENABLED", False))
+
+
+class RunInterrupted(Exception):
+    """Intake was stopped (graceful shutdown) before every item of the run was started."""
+
+    def __init__(self, run_id: str, remaining: int):
+        super().__init__(f"Run {run_id} interrupted with {remaining} items not started")
+        self.run_id = run_id
+        self.remaining = remaining
+
+
+class BatchRunner:
+    """
+    The workbook pipeline engine (assessment -> parsing -> mapping -> monitoring,
+    with CosmosDB run logging). Free of Semantic Kernel imports so batch-only
+    processes never load it; QueuePlugin exposes it to the agent.
+    """
+
+    async def _post_with_retry(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        json_data: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None,
+        budget: Optional[RetryBudget] = None,
+        hedge: bool = False,
+        deadline: Optional[float] = None,
+    ) -> httpx.Response:
+        """
+        POST through the shared resilience layer (circuit breaker, adaptive
+        limiter, classified retries with jitter / Retry-After, retry budget,
+        optional hedging, deadline-bounded timeouts and retries).
+        """
+        return await post_with_retry(
+            client, url, json_data, headers=headers, budget=budget, hedge=hedge, deadline=deadline
+        )
+
+    async def run_batch(
+        self,
+        items: Union[List[Tuple[int, str, str]], AsyncIterable[Tuple[int, str, str]]],
+        run_id: str,
+        email: str,
+        token: str = None,
+        on_item_done: Optional[Callable[[int, Dict[str, Any]], Awaitable[None]]] = None,
+        previous_results: Optional[Dict[int, Dict[str, Any]]] = None,
+        collect_results: bool = True,
+        stop: Optional[asyncio.Event] = None,
+        priority: str = PRIORITY_NORMAL,
+        item_deadline_seconds: Optional[float] = None,
+        run_deadline_seconds: Optional[float] = None,
+        force: bool = False,
+        completed_stages: Optional[Dict[int, Collection[str]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Run the pipeline for (index, project_id, workbook_id) items.
+        `on_item_done` is awaited after every item (used for checkpointing) and
+        `previous_results` holds items finished by an earlier attempt of the same
+        run, so a resumed batch still reports the complete result set.
+        With `collect_results=False` nothing is kept in memory per item and an
+        empty list is returned (background jobs read results from the job store).
+        Once `stop` is set no new item is started; items already in the pipeline
+        finish and RunInterrupted is raised (no final summary is written).
+        `items` may also be an async iterable (streamed uploads): it is consumed
+        only as fast as the first stage takes items, and `stop` is not applied.
+        Downstream calls of the run (and of the tasks it spawns) are queued
+        under (email, run_id) with `priority` by the process-wide fair scheduler.
+        Each item must finish within `item_deadline_seconds` of entering the
+        pipeline and every item within `run_deadline_seconds` of the run start
+        (None falls back to ITEM_DEADLINE_SECONDS / RUN_DEADLINE_SECONDS, 0
+        disables). The remaining time
+        bounds every downstream timeout and retry; an item out of time ends
+        as TIMED_OUT and its remaining stages are skipped.
+        With `force` every stage is called even if the stage cache holds it
+        (completions are still recorded). `completed_stages` maps an item index
+        to stages an earlier run already completed (retries): those are marked
+        COMPLETED without a call, whether or not the stage cache is enabled.
+        """
+        start_jitter = getattr(settings, "START_JITTER_SECONDS", 0.25)
+
+        item_budget = settings.ITEM_DEADLINE_SECONDS if item_deadline_seconds is None else item_deadline_seconds
+        run_budget = settings.RUN_DEADLINE_SECONDS if run_deadline_seconds is None else run_deadline_seconds
+        run_deadline = time.monotonic() + run_budget if run_budget else None
+
+        def item_deadline() -> Optional[float]:
+            deadlines = [d for d in (time.monotonic() + item_budget if item_budget else None, run_deadline) if d]
+            return min(deadlines) if deadlines else None
+
+        # Shared pooled client; the token travels as a per-request header
+        client = get_client()
+        headers = auth_headers(token)
+        # In-flight calls are only shared under the same credentials; cached
+        # completions per email, so they survive token refreshes
+        caller = caller_key(email, token)
+
+        # One retry budget per run: a failing service can't be hammered with 4x the load
+        budget = RetryBudget()
+
+        def new_status(pid: str, wid: str) -> Dict[str, Any]:
+            return {
+                "project_id": pid,
+                "workbook_id": wid,
+                "steps": {
+                    "assessment": "PENDING",
+                    "parsing": "SKIPPED",
+                    "mapping": "SKIPPED",
+                },
+                "final_status": "PENDING",
+            }
+
+        # Live per-item state for GET /runs/{run_id} and the SSE stream
+        # (streamed items show up as they are read)
+        streaming = hasattr(items, "__aiter__")
+        initial = {} if streaming else {i: new_status(pid, wid) for i, pid, wid in items}
+        for i, r in (previous_results or {}).items():
+            initial[i] = r["project_status"]
+        run_tracker.start_run(run_id, email, initial, streamed=streaming)
+
+        def set_step(item: PipelineItem, stage: str, state: str) -> None:
+            project_status = item.data["project_status"]
+            project_status["steps"][stage] = state
+            run_tracker.stage_changed(run_id, item.index, project_status, stage)
+
+        # Optional bulk mode (per service): items are micro-batched into one
+        # call to the service's batch endpoint and results fanned back out.
+        batchers: List[MicroBatcher] = []
+
+        def make_sender(stage: str, url: str) -> Callable[[Dict[str, Any], Optional[float]], Awaitable[Any]]:
+            hedge = hedging_enabled(stage)
+            if not _bulk_enabled(stage):
+
+                async def send_one(payload: Dict[str, Any], deadline: Optional[float]) -> Any:
+                    return await self._post_with_retry(
+                        client, url, payload, headers=headers, budget=budget, hedge=hedge, deadline=deadline
+                    )
+
+                return send_one
+
+            async def send_batch(payloads: List[Dict[str, Any]]) -> List[Any]:
+                response = await self._post_with_retry(
+                    client,
+                    url + settings.BULK_PATH_SUFFIX,
+                    {"items": payloads},
+                    headers=headers,
+                    budget=budget,
+                    hedge=hedge,
+                    # Items of a batch have their own deadlines (enforced by the caller); the run's bounds the call
+                    deadline=run_deadline,
+                )
+                return bulk_results(response, len(payloads))
+
+            batcher = MicroBatcher(
+                stage,
+                send_batch,
+                settings.BULK_MAX_BATCH_SIZE,
+                settings.BULK_MAX_WAIT_SECONDS,
+                max_concurrent=settings.BULK_MAX_CONCURRENT_BATCHES,
+            )
+            batchers.append(batcher)
+
+            async def submit(payload: Dict[str, Any], deadline: Optional[float]) -> Any:
+                return await batcher.submit(payload)
+
+            return submit
+
+        def timed_out(item: PipelineItem, stage: str, started: float) -> None:
+            set_step(item, stage, "TIMED_OUT")
+            item.data["project_status"]["final_status"] = "TIMED_OUT"
+            item.data["chain"].append(f"{stage} timed out")
+            item.failed = True
+            STAGE_LATENCY.observe(time.monotonic() - started, stage, "timed_out")
+
+        def make_step(stage: str, url: str, failure_status: str, last: bool = False):
+            """
+            One downstream step of the workbook pipeline
+            (Assessment -> Parsing -> Mapping). A failure skips the remaining steps.
+            """
+            send = make_sender(stage, url)
+
+            async def handler(item: PipelineItem) -> None:
+                project_status = item.data["project_status"]
+                pid, wid = project_status["project_id"], project_status["workbook_id"]
+                started = time.monotonic()
+
+                # Completed by the run this one retries
+                if stage in (completed_stages or {}).get(item.index, ()):
+                    set_step(item, stage, "COMPLETED")
+                    item.data["chain"].append(f"{stage} completed earlier")
+                    if last:
+                        project_status["final_status"] = "SUCCESS"
+                    STAGE_LATENCY.observe(time.monotonic() - started, stage, "reused")
+                    return
+
+                # Already done by an earlier run of the same requester (resubmission / retry):
+                # skip the call. The key carries the cache version and the stage URL, so a
+                # new deployment or a changed endpoint does not reuse old completions
+                cache_key = stage_key(pid, wid, stage, email or "", settings.STAGE_CACHE_VERSION, url)
+                cached_run = None if force else await stage_cache.get(cache_key)
+                if cached_run is not None:
+                    set_step(item, stage, "COMPLETED")
+                    item.data["chain"].append(f"{stage} cached ({cached_run})")
+                    if last:
+                        project_status["final_status"] = "SUCCESS"
+                    STAGE_LATENCY.observe(time.monotonic() - started, stage, "cached")
+                    return
+
+                deadline = item.data["deadline"]
+                if deadline is not None and deadline <= time.monotonic():
+                    timed_out(item, stage, started)
+                    return
+
+                set_step(item, stage, "RUNNING")
+
+                async def call() -> str:
+                    await send({"project_id": pid, "workbook_id": wid, "run_id": run_id}, deadline)
+                    await stage_cache.put(cache_key, run_id)
+                    return run_id
+
+                async def call_once() -> Tuple[str, bool]:
+                    if settings.SINGLE_FLIGHT_ENABLED:
+                        # Same workbook already in this stage for this caller (another run or
+                        # a duplicate): share its outcome
+                        return await stage_flights.do((pid, wid, stage, caller), call)
+                    return await call(), False
+
+                try:
+                    if deadline is None:
+                        leader_run, shared = await call_once()
+                    else:
+                        # Also bounds waiting on a shared call or a bulk batch
+                        leader_run, shared = await asyncio.wait_for(call_once(), deadline - time.monotonic())
+                except (DeadlineExceeded, asyncio.TimeoutError):
+                    timed_out(item, stage, started)
+                    return
+                except Exception as e:
+                    set_step(item, stage, "FAILED")
+                    project_status["final_status"] = failure_status
+                    item.data["chain"].append(f"{stage} error: {str(e)}")
+                    item.failed = True
+                    STAGE_LATENCY.observe(time.monotonic() - started, stage, "failed")
+                    return
+
+                set_step(item, stage, "COMPLETED")
+                item.data["chain"].append(f"{stage} shared ({leader_run})" if shared else f"{stage} pass")
+                if last:
+                    project_status["final_status"] = "SUCCESS"
+                STAGE_LATENCY.observe(time.monotonic() - started, stage, "shared" if shared else "completed")
+
+            return handler
+
+        async def report(item: PipelineItem) -> None:
+            """
+            Notify monitoring agent per workbook (runs for failed items too).
+            Only hands the event to the background reporter; never waits on the agent.
+            """
+            project_status = item.data["project_status"]
+            if item.error:
+                # Unhandled stage error
+                project_status["final_status"] = "FAILED"
+                item.data["chain"].append(f"unhandled error: {item.error}")
+
+            run_tracker.item_finished(run_id, item.index, project_status)
+            ITEMS_FINISHED.inc(project_status["final_status"])
+
+            monitor_reporter.report(
+                {
+                    "project_id": project_status["project_id"],
+                    "workbook_id": project_status["workbook_id"],
+                    "run_id": run_id,
+                    "status": project_status["final_status"],
+                },
+                headers=headers,
+            )
+
+        # Every stage has its own worker pool, so a slow mapping service no
+        # longer blocks new assessments from starting.
+        pipeline = StagedPipeline(
+            [
+                Stage(
+                    "assessment",
+                    make_step("assessment", f"{settings.ASSESSMENT_API_URL}/api/assessment", "FAILED"),
+                    concurrency=_stage_concurrency("assessment"),
+                ),
+                Stage(
+                    "parsing",
+                    make_step("parsing", f"{settings.PARSING_API_URL}/parse-xml", "FAILED"),
+                    concurrency=_stage_concurrency("parsing"),
+                ),
+                Stage(
+                    "mapping",
+                    # Mapping failed but previous steps succeeded
+                    make_step("mapping", f"{settings.MAPPING_API_URL}/mapping", "WARNING", last=True),
+                    concurrency=_stage_concurrency("mapping"),
+                ),
+                # Non-blocking hand-off to the monitor reporter, one worker is plenty
+                Stage("monitoring", report, concurrency=1, always=True),
+            ],
+            queue_size=settings.PIPELINE_QUEUE_SIZE,
+            start_jitter=start_jitter or 0.0,
+        )
+
+        # From here on every task the run creates inherits its scheduler flow
+        flow_token = bind_flow(email, run_id, priority)
+
+        # CosmosDB logging streams out in chunks while the run is in progress
+        run_log = RunLogWriter(client, run_id, email, headers=headers)
+        run_log.start()
+
+        collected: Dict[int, Dict[str, Any]] = dict(previous_results or {}) if collect_results else {}
+        for r in (previous_results or {}).values():
+            run_log.count(r["project_status"])
+
+        async def item_done(item: PipelineItem) -> None:
+            result = {
+                "project_status": item.data["project_status"],
+                "log_line": " -> ".join(item.data["chain"]),
+            }
+            if collect_results:
+                collected[item.index] = result
+            await run_log.add(result["project_status"], result["log_line"])
+            if on_item_done is not None:
+                await on_item_done(item.index, result)
+
+        started = {"count": 0}
+
+        def new_item(i: int, pid: str, wid: str) -> PipelineItem:
+            started["count"] += 1
+            return PipelineItem(
+                index=i,
+                data={
+                    "project_status": new_status(pid, wid),
+                    "chain": [f"file {i+1} ({pid})"],
+                    "deadline": item_deadline(),
+                },
+            )
+
+        def pipeline_items():
+            for i, pid, wid in items:
+                if stop is not None and stop.is_set():
+                    return
+                yield new_item(i, pid, wid)
+
+        async def streamed_items():
+            async for i, pid, wid in items:
+                yield new_item(i, pid, wid)
+
+        RUNS_IN_FLIGHT.inc()
+        run_started = time.monotonic()
+        outcome = "failed"
+        try:
+            try:
+                await pipeline.run(streamed_items() if streaming else pipeline_items(), on_item_done=item_done)
+            except BaseException:
+                run_log.abort()
+                raise
+            finally:
+                for batcher in batchers:
+                    await batcher.close()
+
+            remaining = 0 if streaming else len(items) - started["count"]
+            if remaining:
+                # Drained for shutdown: finished items are logged (and checkpointed),
+                # the summary is written by whoever resumes the run
+                await run_log.close(summary=False)
+                outcome = "interrupted"
+                raise RunInterrupted(run_id, remaining)
+
+            # Remaining chunk + final summary record
+            await run_log.close()
+            outcome = "completed"
+        finally:
+            BATCH_SIZE.observe(started["count"])
+            RUNS_IN_FLIGHT.dec()
+            RUN_DURATION.observe(time.monotonic() - run_started, outcome)
+            unbind_flow(flow_token)
+
+        run_tracker.finish_run(run_id)
+
+        # Items completed by a previous attempt are merged in original order
+        return [collected[i]["project_status"] for i in sorted(collected)]
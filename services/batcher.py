@@ -0,0 +1,117 @@
+# services/batcher.py
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+
+class BulkItemError(Exception):
+    """One item of a bulk request failed; the rest of the batch may have succeeded."""
+
+    def __init__(self, status_code: int, detail: Any = None):
+        super().__init__(f"HTTP {status_code} (bulk item){f': {detail}' if detail else ''}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+def bulk_results(response: httpx.Response, expected: int) -> List[Any]:
+    """
+    Fan a bulk response back out to its items.
+    Expected body: {"results": [{"status_code": 200, ...}, ...]} in request order.
+    Failed items become BulkItemError instances.
+    """
+    results = response.json().get("results")
+    if not isinstance(results, list) or len(results) != expected:
+        raise ValueError(f"Bulk response has {len(results or [])} results for {expected} items")
+    out: List[Any] = []
+    for r in results:
+        status = int(r.get("status_code", 200))
+        out.append(r if 200 <= status < 300 else BulkItemError(status, r.get("detail")))
+    return out
+
+
+class MicroBatcher:
+    """
+    Collects single-item submissions and sends them as one bulk call when
+    `max_batch_size` items are waiting or `max_wait` seconds have passed since
+    the first one, whichever comes first. Each submitter gets back only its own
+    result (or exception). At most `max_concurrent` batches are sent at the
+    same time (None: no limit); later batches wait for a free slot.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        send_batch: Callable[[List[Dict[str, Any]]], Awaitable[List[Any]]],
+        max_batch_size: int,
+        max_wait: float,
+        max_concurrent: Optional[int] = None,
+    ):
+        self.name = name
+        self.send_batch = send_batch
+        self.max_batch_size = max(max_batch_size, 1)
+        self.max_wait = max_wait
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(max(max_concurrent, 1)) if max_concurrent else None
+        self.batches_sent = 0
+
+    async def submit(self, payload: Dict[str, Any]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((payload, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+        return await future
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.max_wait)
+        self._timer = None
+        self._flush()
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[: self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size :]
+            task = asyncio.create_task(self._send(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        if self._slots is None:
+            return await self._send_now(batch)
+        async with self._slots:
+            await self._send_now(batch)
+
+    async def _send_now(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        # Items whose submitter gave up (deadline) while the batch waited are left out
+        live = [(payload, future) for payload, future in batch if not future.done()]
+        if not live:
+            return
+        self.batches_sent += 1
+        try:
+            results = await self.send_batch([payload for payload, _ in live])
+        except Exception as e:
+            # Whole request failed: every item in it fails the same way
+            for _, future in live:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(live, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def close(self) -> None:
+        """Send anything still waiting and wait for in-flight batches."""
+        self._flush()
+        if self._inflight:
+            await asyncio.gather(*list(self._inflight), return_exceptions=True)
@@ -0,0 +1,77 @@
+# services/chat_events.py
+import asyncio
+import contextvars
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from services.metrics import TOOL_LATENCY
+
+if TYPE_CHECKING:
+    from semantic_kernel.filters import AutoFunctionInvocationContext
+
+# Event queue of the streaming /chat request currently running in this task
+# (None for non-streaming requests: their tool calls are only timed)
+_event_queue: contextvars.ContextVar[Optional[asyncio.Queue]] = contextvars.ContextVar(
+    "chat_event_queue", default=None
+)
+
+# Never echo these back to the client
+_HIDDEN_ARGUMENTS = {"token"}
+
+
+def bind_event_queue(queue: asyncio.Queue) -> None:
+    """Route tool-call events of the current task (and tasks it spawns) to `queue`."""
+    _event_queue.set(queue)
+
+
+def _visible_arguments(context: "AutoFunctionInvocationContext") -> Dict[str, Any]:
+    arguments = context.arguments or {}
+    return {k: str(v) for k, v in arguments.items() if k not in _HIDDEN_ARGUMENTS}
+
+
+async def tool_event_filter(context: "AutoFunctionInvocationContext", next) -> None:
+    """
+    Auto function invocation filter: times every tool the model calls and,
+    for streaming requests, reports tool_call_start / tool_call_end while it
+    actually runs.
+    """
+    queue = _event_queue.get()
+    call_id = context.function_call_content.id if context.function_call_content else None
+    name = context.function.fully_qualified_name
+    if queue is not None:
+        queue.put_nowait(
+            {"event": "tool_call_start", "id": call_id, "name": name, "arguments": _visible_arguments(context)}
+        )
+    started = time.perf_counter()
+    try:
+        await next(context)
+    except Exception as e:
+        elapsed = time.perf_counter() - started
+        TOOL_LATENCY.observe(elapsed, name, "error")
+        if queue is not None:
+            queue.put_nowait(
+                {
+                    "event": "tool_call_end",
+                    "id": call_id,
+                    "name": name,
+                    "success": False,
+                    "error": str(e),
+                    "duration_ms": round(elapsed * 1000),
+                }
+            )
+        raise
+    elapsed = time.perf_counter() - started
+    TOOL_LATENCY.observe(elapsed, name, "success")
+    if queue is None:
+        return
+    result = context.function_result.value if context.function_result is not None else None
+    queue.put_nowait(
+        {
+            "event": "tool_call_end",
+            "id": call_id,
+            "name": name,
+            "success": True,
+            "result": str(result) if result is not None else None,
+            "duration_ms": round(elapsed * 1000),
+        }
+    )
@@ -0,0 +1,110 @@
+# services/chat_router.py
+"""
+Deterministic pre-router for /chat.
+
+Most chat traffic is "process project X workbook Y" or a pasted list of
+pairs. When the project/workbook pairing can be read off the message without
+doubt, the request goes straight to the workbook pipeline and gets a templated
+answer; anything else (questions, extra instructions, ambiguous ids) returns
+None and is left to the LLM.
+"""
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+UUID = r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"
+_UUID_RE = re.compile(UUID)
+# "project X", "project_id: X", "\"workbook_id\": \"X\"", "workbook=X", ...
+_LABELED_RE = re.compile(r"\b(project|workbook)(?:[\s_-]*ids?)?[\s\"'`:=]*(" + UUID + ")", re.IGNORECASE)
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_WORD_RE = re.compile(r"[a-z]+")
+
+# Words a plain "process these ids" request is made of. Anything else means the
+# user is asking for something the router doesn't understand.
+_ALLOWED_WORDS = {
+    "a", "all", "an", "and", "batch", "both", "can", "could", "email", "execute", "following",
+    "for", "hello", "hi", "id", "ids", "item", "items", "kindly", "list", "me", "of", "on",
+    "pair", "pairs", "pipeline", "please", "pls", "process", "project", "projects", "queue",
+    "run", "start", "thank", "thanks", "the", "them", "these", "this", "those", "to",
+    "trigger", "user", "with", "workbook", "workbooks", "workflow", "you",
+}
+
+
+@dataclass
+class RoutedRequest:
+    pairs: List[Tuple[str, str]]
+    email: Optional[str] = None
+
+
+def _pair_labeled(message: str) -> Optional[List[Tuple[str, str]]]:
+    labeled = _LABELED_RE.findall(message)
+    projects = [u for label, u in labeled if label.lower() == "project"]
+    workbooks = [u for label, u in labeled if label.lower() == "workbook"]
+    if not projects or len(projects) != len(workbooks):
+        return None
+    return list(zip(projects, workbooks))
+
+
+def _pair_unlabeled(message: str) -> Optional[List[Tuple[str, str]]]:
+    # One "project workbook" pair per line, e.g. a pasted two-column list
+    pairs: List[Tuple[str, str]] = []
+    for line in message.splitlines():
+        ids = _UUID_RE.findall(line)
+        if not ids:
+            continue
+        if len(ids) != 2:
+            return None
+        pairs.append((ids[0], ids[1]))
+    return pairs or None
+
+
+def route_message(message: str) -> Optional[RoutedRequest]:
+    """Return the pairs to run if the message is an unambiguous processing request, else None."""
+    ids = _UUID_RE.findall(message)
+    if not ids:
+        return None
+
+    labeled_ids = [u for _, u in _LABELED_RE.findall(message)]
+    if Counter(labeled_ids) == Counter(ids):
+        pairs = _pair_labeled(message)
+    elif not labeled_ids:
+        pairs = _pair_unlabeled(message)
+    else:
+        # Some ids labeled, some not: can't tell which is which
+        pairs = None
+    if not pairs:
+        return None
+
+    emails = _EMAIL_RE.findall(message)
+    if len(emails) > 1:
+        return None
+
+    rest = _EMAIL_RE.sub(" ", _UUID_RE.sub(" ", message)).lower()
+    if any(word not in _ALLOWED_WORDS for word in _WORD_RE.findall(rest)):
+        return None
+
+    return RoutedRequest(pairs=pairs, email=emails[0] if emails else None)
+
+
+def format_answer(run_id: str, results: List[Dict[str, Any]], duplicates: int = 0) -> str:
+    """Templated final answer, in the shape the agent's own answers take."""
+    duplicate_note = f" ({duplicates} duplicate pairs ignored)" if duplicates else ""
+    if len(results) == 1:
+        r = results[0]
+        steps = ", ".join(f"{stage}: {state}" for stage, state in r["steps"].items())
+        return (
+            f"Workflow finished for project {r['project_id']} / workbook {r['workbook_id']}{duplicate_note}.\n"
+            f"Final status: {r['final_status']} ({steps}).\n"
+            f"Run ID: {run_id}"
+        )
+
+    counts = Counter(r["final_status"] for r in results)
+    lines = [
+        f"Processed {len(results)} items in queue mode{duplicate_note} "
+        f"({', '.join(f'{status}: {n}' for status, n in sorted(counts.items()))})."
+    ]
+    for r in results:
+        lines.append(f"- project {r['project_id']} / workbook {r['workbook_id']}: {r['final_status']}")
+    lines.append(f"Run ID: {run_id}")
+    return "\n".join(lines)
@@ -0,0 +1,142 @@
+# services/chat_sessions.py
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Optional
+
+from config.prompts import SYSTEM_PROMPT
+from config.settings import settings
+
+# semantic_kernel is imported on first use only (batch-only processes never load it)
+if TYPE_CHECKING:
+    from semantic_kernel.contents import ChatMessageContent
+
+SUMMARY_PREFIX = "Summary of earlier conversation (older turns were trimmed):"
+
+
+def estimate_tokens(message: "ChatMessageContent") -> int:
+    """Cheap token estimate (~4 chars per token), counting tool calls and results too."""
+    try:
+        text = json.dumps(message.to_dict(), default=str)
+    except Exception:
+        text = str(message.content or "")
+    return len(text) // 4 + 4
+
+
+class ChatSession:
+    def __init__(self, session_id: str):
+        from semantic_kernel.contents import ChatHistory
+
+        self.session_id = session_id
+        self.history = ChatHistory()
+        self.history.add_system_message(SYSTEM_PROMPT)
+        self.last_used = time.monotonic()
+        # Requests of one session run one at a time; different sessions run in parallel
+        self.lock = asyncio.Lock()
+        self.summary: Optional[str] = None
+
+    def touch(self) -> None:
+        self.last_used = time.monotonic()
+
+    def trim(self, token_budget: int) -> int:
+        """
+        Drop the oldest whole turns (a user message plus the assistant / tool
+        messages that followed it) until the history fits the token budget.
+        The system prompt and the latest turn are always kept.
+        Returns the number of messages removed.
+        """
+        from semantic_kernel.contents import ChatMessageContent
+        from semantic_kernel.contents.utils.author_role import AuthorRole
+
+        messages = self.history.messages
+        system = [m for m in messages if m.role == AuthorRole.SYSTEM]
+        rest = [m for m in messages if m.role != AuthorRole.SYSTEM]
+
+        turns: List[List["ChatMessageContent"]] = []
+        for message in rest:
+            if message.role == AuthorRole.USER or not turns:
+                turns.append([message])
+            else:
+                turns[-1].append(message)
+
+        total = sum(estimate_tokens(m) for m in messages)
+        dropped: List["ChatMessageContent"] = []
+        while len(turns) > 1 and total > token_budget:
+            turn = turns.pop(0)
+            dropped.extend(turn)
+            total -= sum(estimate_tokens(m) for m in turn)
+
+        if not dropped:
+            return 0
+
+        if settings.CHAT_SUMMARIZE_TRIMMED:
+            self._update_summary(dropped)
+            system = [m for m in system if not str(m.content or "").startswith(SUMMARY_PREFIX)]
+            system.append(ChatMessageContent(role=AuthorRole.SYSTEM, content=f"{SUMMARY_PREFIX}\n{self.summary}"))
+
+        self.history.messages = system + [m for turn in turns for m in turn]
+        return len(dropped)
+
+    def _update_summary(self, dropped: List["ChatMessageContent"]) -> None:
+        # Extractive summary (no extra LLM call): the gist of each dropped
+        # user / assistant message, newest kept when over the size cap.
+        from semantic_kernel.contents.utils.author_role import AuthorRole
+
+        lines = [] if self.summary is None else self.summary.split("\n")
+        for message in dropped:
+            if message.role not in (AuthorRole.USER, AuthorRole.ASSISTANT) or not message.content:
+                continue
+            text = " ".join(str(message.content).split())
+            lines.append(f"- {message.role.value}: {text[:200]}")
+        max_chars = settings.CHAT_SUMMARY_MAX_TOKENS * 4
+        while lines and sum(len(line) + 1 for line in lines) > max_chars:
+            lines.pop(0)
+        self.summary = "\n".join(lines)
+
+
+class ChatSessionStore:
+    """
+    In-memory chat sessions keyed by session id, with LRU eviction
+    (CHAT_MAX_SESSIONS) and idle expiry (CHAT_SESSION_TTL_SECONDS).
+    """
+
+    def __init__(self):
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+
+    def get_or_create(self, session_id: Optional[str] = None) -> ChatSession:
+        self._expire()
+        if session_id and session_id in self._sessions:
+            session = self._sessions[session_id]
+            self._sessions.move_to_end(session_id)
+        else:
+            session = ChatSession(session_id or str(uuid.uuid4()))
+            self._sessions[session.session_id] = session
+            while len(self._sessions) > settings.CHAT_MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+        session.touch()
+        return session
+
+    def reset(self, session_id: Optional[str] = None) -> int:
+        """Forget one session, or all of them when no id is given."""
+        if session_id is None:
+            count = len(self._sessions)
+            self._sessions.clear()
+            return count
+        return 1 if self._sessions.pop(session_id, None) is not None else 0
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - settings.CHAT_SESSION_TTL_SECONDS
+        # Oldest-used sessions are at the front
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_used >= cutoff:
+                break
+            del self._sessions[session_id]
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+chat_sessions = ChatSessionStore()
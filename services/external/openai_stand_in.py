@@ -0,0 +1,223 @@
+# services/external/openai_stand_in.py
+"""
+Local stand-in for Azure OpenAI chat deployments, so the chat router
+(kernel/routing_chat.py) can be exercised without real quota.
+
+    uvicorn services.external.openai_stand_in:app --port 8802
+
+Every deployment name is accepted on the Azure route
+(/openai/deployments/{deployment}/chat/completions) and, for OpenAI-style
+clients, on /v1/chat/completions (deployment = "model" of the body). Point
+the entries of AZURE_OPENAI_DEPLOYMENTS at http://127.0.0.1:8802 with
+different deployment names to get several independent backends.
+
+Behaviour is configurable per deployment, at startup through OPENAI_STAND_IN_*
+env vars (defaults for every deployment) or at runtime with POST /config:
+
+    {"default": {"latency_mean": 0.2},
+     "gpt-east": {"rate_limit_rate": 1.0, "retry_after": 10}}
+
+    latency_mean     seconds before the response headers (OPENAI_STAND_IN_LATENCY_SECONDS)
+    chunk_delay      seconds between streamed chunks
+    error_rate       fraction answered with HTTP 500
+    rate_limit_rate  fraction answered with HTTP 429 + Retry-After
+    retry_after      Retry-After value in seconds
+    requests_per_minute  quota; x-ratelimit-remaining-requests counts it down, 429 when used up (0 = unlimited)
+
+The reply echoes the deployment name and the last user message; stream=true
+is answered with server-sent chunks like the real service.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="Azure OpenAI stand-in")
+
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "latency_mean": float(os.getenv("OPENAI_STAND_IN_LATENCY_SECONDS", "0")),
+    "chunk_delay": float(os.getenv("OPENAI_STAND_IN_CHUNK_DELAY_SECONDS", "0")),
+    "error_rate": float(os.getenv("OPENAI_STAND_IN_ERROR_RATE", "0")),
+    "rate_limit_rate": float(os.getenv("OPENAI_STAND_IN_429_RATE", "0")),
+    "retry_after": float(os.getenv("OPENAI_STAND_IN_RETRY_AFTER_SECONDS", "1")),
+    "requests_per_minute": int(os.getenv("OPENAI_STAND_IN_REQUESTS_PER_MINUTE", "0")),
+}
+
+# "default" applies to every deployment; per-deployment entries override single keys
+config: Dict[str, Dict[str, Any]] = {"default": dict(DEFAULT_CONFIG)}
+
+_rng = random.Random(int(os.environ["OPENAI_STAND_IN_SEED"]) if os.getenv("OPENAI_STAND_IN_SEED") else None)
+
+request_counts: Counter = Counter()
+status_counts: Counter = Counter()
+# Start times of accepted requests in the last minute, per deployment
+_window: Dict[str, Deque[float]] = {}
+
+
+def _config_for(deployment: str) -> Dict[str, Any]:
+    return {**config["default"], **config.get(deployment, {})}
+
+
+def _remaining_requests(deployment: str, cfg: Dict[str, Any]) -> Optional[int]:
+    limit = cfg["requests_per_minute"]
+    if not limit:
+        return None
+    window = _window.setdefault(deployment, deque())
+    cutoff = time.monotonic() - 60.0
+    while window and window[0] < cutoff:
+        window.popleft()
+    return max(limit - len(window), 0)
+
+
+def _error_response(status: int, cfg: Dict[str, Any], headers: Dict[str, str]) -> JSONResponse:
+    if status == 429:
+        headers = {**headers, "Retry-After": f"{cfg['retry_after']:g}", "retry-after-ms": str(int(cfg["retry_after"] * 1000))}
+        error = {"code": "429", "message": "Requests to the deployment have exceeded the rate limit (injected)."}
+    else:
+        error = {"code": "InternalServerError", "message": "The server had an error (injected)."}
+    return JSONResponse(status_code=status, content={"error": error}, headers=headers)
+
+
+def _reply_text(deployment: str, body: Dict[str, Any]) -> str:
+    messages: List[Dict[str, Any]] = body.get("messages") or []
+    last_user = next((m.get("content") for m in reversed(messages) if m.get("role") == "user"), "") or ""
+    if not isinstance(last_user, str):
+        last_user = json.dumps(last_user)
+    return f"[{deployment}] {last_user}".strip()
+
+
+def _usage(body: Dict[str, Any], text: str) -> Dict[str, int]:
+    prompt_tokens = sum(len(str(m.get("content") or "").split()) for m in body.get("messages") or [])
+    completion_tokens = len(text.split())
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _chunk(completion_id: str, deployment: str, delta: Dict[str, Any], finish: Optional[str] = None) -> str:
+    chunk = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": deployment,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+async def _complete(deployment: str, body: Dict[str, Any]):
+    cfg = _config_for(deployment)
+    request_counts[deployment] += 1
+
+    remaining = _remaining_requests(deployment, cfg)
+    headers: Dict[str, str] = {"x-ms-deployment-name": deployment}
+    if remaining is not None:
+        headers["x-ratelimit-remaining-requests"] = str(max(remaining - 1, 0))
+        if remaining == 0:
+            status_counts[f"{deployment} 429"] += 1
+            return _error_response(429, cfg, headers)
+        _window[deployment].append(time.monotonic())
+
+    if cfg["latency_mean"] > 0:
+        await asyncio.sleep(_rng.expovariate(1 / cfg["latency_mean"]))
+
+    roll = _rng.random()
+    if roll < cfg["rate_limit_rate"]:
+        status_counts[f"{deployment} 429"] += 1
+        return _error_response(429, cfg, headers)
+    if roll < cfg["rate_limit_rate"] + cfg["error_rate"]:
+        status_counts[f"{deployment} 500"] += 1
+        return _error_response(500, cfg, headers)
+    status_counts[f"{deployment} 200"] += 1
+
+    text = _reply_text(deployment, body)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+    if not body.get("stream"):
+        return JSONResponse(
+            content={
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": deployment,
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+                ],
+                "usage": _usage(body, text),
+            },
+            headers=headers,
+        )
+
+    include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+    async def events():
+        yield _chunk(completion_id, deployment, {"role": "assistant", "content": ""})
+        for i, word in enumerate(text.split(" ")):
+            if cfg["chunk_delay"] > 0:
+                await asyncio.sleep(cfg["chunk_delay"])
+            yield _chunk(completion_id, deployment, {"content": word if i == 0 else " " + word})
+        yield _chunk(completion_id, deployment, {}, "stop")
+        if include_usage:
+            usage_chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": deployment,
+                "choices": [],
+                "usage": _usage(body, text),
+            }
+            yield f"data: {json.dumps(usage_chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def azure_chat_completions(deployment: str, request: Request):
+    return await _complete(deployment, await request.json())
+
+
+@app.post("/v1/chat/completions")
+async def openai_chat_completions(request: Request):
+    body = await request.json()
+    return await _complete(body.get("model") or "default", body)
+
+
+@app.get("/config")
+async def get_config():
+    return config
+
+
+@app.post("/config")
+async def set_config(request: Request):
+    """Merge the given per-deployment settings; {"reset": true} restores the startup defaults first."""
+    body = await request.json()
+    if body.pop("reset", False):
+        config.clear()
+        config["default"] = dict(DEFAULT_CONFIG)
+    for deployment, values in body.items():
+        config.setdefault(deployment, {}).update(values)
+    return config
+
+
+@app.get("/stats")
+async def stats():
+    """Requests and response codes handled, per deployment."""
+    return {"requests": dict(request_counts), "status_codes": dict(status_counts)}
+
+
+@app.post("/stats/reset")
+async def reset_stats():
+    request_counts.clear()
+    status_counts.clear()
+    _window.clear()
+    return {"message": "Reset complete"}
@@ -0,0 +1,209 @@
+# services/external/stand_in.py
+"""
+Local stand-in for the downstream services (assessment, parse-xml, mapping,
+monitor, CosmosDB records), including the bulk "/batch" endpoints, so the
+pipeline can run end-to-end without the real services.
+
+    uvicorn services.external.stand_in:app --port 8801
+
+Point ASSESSMENT_API_URL, PARSING_API_URL, MAPPING_API_URL, COSMOSDB_API_URL and
+MONITORING_AGENT_URL at http://127.0.0.1:8801.
+
+Behaviour is configurable per endpoint, at startup through STAND_IN_* env vars
+(defaults for every endpoint) or at runtime with POST /config:
+
+    {"default": {"latency_mean": 0.05, "distribution": "lognormal", "error_rate": 0.01},
+     "/mapping": {"rate_limit_rate": 0.05, "max_concurrency": 20}}
+
+    distribution     fixed | uniform | normal | lognormal | exponential
+    latency_mean     mean latency in seconds (STAND_IN_LATENCY_SECONDS)
+    latency_stddev   spread for uniform / normal / lognormal
+    error_rate       fraction answered with HTTP 500
+    rate_limit_rate  fraction answered with HTTP 429 + Retry-After
+    retry_after      Retry-After value in seconds
+    max_concurrency  more requests in flight than this get 429 (0 = unlimited)
+"""
+import asyncio
+import math
+import os
+import random
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Downstream services stand-in")
+
+ITEM_ENDPOINTS = ["/api/assessment", "/parse-xml", "/mapping", "/monitor/report"]
+RECORDS_ENDPOINT = "/api/records/semantic-kernel"
+
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "distribution": os.getenv("STAND_IN_LATENCY_DISTRIBUTION", "fixed"),
+    "latency_mean": float(os.getenv("STAND_IN_LATENCY_SECONDS", "0")),
+    "latency_stddev": float(os.getenv("STAND_IN_LATENCY_STDDEV", "0")),
+    "error_rate": float(os.getenv("STAND_IN_ERROR_RATE", "0")),
+    "rate_limit_rate": float(os.getenv("STAND_IN_429_RATE", "0")),
+    "retry_after": float(os.getenv("STAND_IN_RETRY_AFTER_SECONDS", "1")),
+    "max_concurrency": int(os.getenv("STAND_IN_MAX_CONCURRENCY", "0")),
+}
+
+# "default" applies to every endpoint; per-path entries override single keys
+config: Dict[str, Dict[str, Any]] = {"default": dict(DEFAULT_CONFIG)}
+
+_rng = random.Random(int(os.environ["STAND_IN_SEED"]) if os.getenv("STAND_IN_SEED") else None)
+
+request_counts: Counter = Counter()
+item_counts: Counter = Counter()
+status_counts: Counter = Counter()
+in_flight: Counter = Counter()
+peak_in_flight: Counter = Counter()
+
+
+def _config_for(path: str) -> Dict[str, Any]:
+    return {**config["default"], **config.get(path, {})}
+
+
+def _sample_latency(cfg: Dict[str, Any]) -> float:
+    mean = cfg["latency_mean"]
+    stddev = cfg["latency_stddev"]
+    if mean <= 0:
+        return 0.0
+    distribution = cfg["distribution"]
+    if distribution == "uniform":
+        value = _rng.uniform(mean - stddev, mean + stddev)
+    elif distribution == "normal":
+        value = _rng.gauss(mean, stddev)
+    elif distribution == "lognormal":
+        # Parameters chosen so the samples have the requested mean / stddev
+        sigma2 = math.log(1 + (stddev / mean) ** 2) if stddev > 0 else 0.0
+        value = _rng.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+    elif distribution == "exponential":
+        value = _rng.expovariate(1 / mean)
+    else:
+        value = mean
+    return max(value, 0.0)
+
+
+def _failure(cfg: Dict[str, Any]) -> Optional[int]:
+    """Injected failure for one request / item: 429, 500 or None."""
+    roll = _rng.random()
+    if roll < cfg["rate_limit_rate"]:
+        return 429
+    if roll < cfg["rate_limit_rate"] + cfg["error_rate"]:
+        return 500
+    return None
+
+
+def _error_response(status: int, cfg: Dict[str, Any]) -> JSONResponse:
+    headers = {"Retry-After": f"{cfg['retry_after']:g}"} if status == 429 else None
+    detail = "Too Many Requests (injected)" if status == 429 else "Internal Server Error (injected)"
+    return JSONResponse(status_code=status, content={"detail": detail}, headers=headers)
+
+
+async def _serve(path: str, handle) -> Any:
+    """Common request accounting: concurrency cap, latency, whole-request failures."""
+    cfg = _config_for(path)
+    request_counts[path] += 1
+
+    limit = cfg["max_concurrency"]
+    if limit and in_flight[path] >= limit:
+        status_counts[f"{path} 429"] += 1
+        return _error_response(429, cfg)
+
+    in_flight[path] += 1
+    peak_in_flight[path] = max(peak_in_flight[path], in_flight[path])
+    try:
+        latency = _sample_latency(cfg)
+        if latency:
+            await asyncio.sleep(latency)
+        status = _failure(cfg)
+        if status is not None:
+            status_counts[f"{path} {status}"] += 1
+            return _error_response(status, cfg)
+        status_counts[f"{path} 200"] += 1
+        return await handle(cfg)
+    finally:
+        in_flight[path] -= 1
+
+
+def _item_result(path: str, payload: Dict[str, Any], status: int = 200) -> Dict[str, Any]:
+    item_counts[path] += 1
+    result = {"status_code": status, "project_id": payload.get("project_id"), "workbook_id": payload.get("workbook_id")}
+    if status != 200:
+        result["detail"] = "injected"
+    return result
+
+
+def _register(path: str) -> None:
+    async def single(request: Request):
+        payload = await request.json()
+
+        async def handle(cfg):
+            return _item_result(path, payload)
+
+        return await _serve(path, handle)
+
+    async def bulk(request: Request):
+        body = await request.json()
+        items: List[Dict[str, Any]] = body.get("items", [])
+
+        async def handle(cfg):
+            # Whole batch got through; single items can still fail
+            return {"results": [_item_result(path, item, _failure(cfg) or 200) for item in items]}
+
+        return await _serve(path + "/batch", handle)
+
+    app.add_api_route(path, single, methods=["POST"])
+    app.add_api_route(path + "/batch", bulk, methods=["POST"])
+
+
+for _path in ITEM_ENDPOINTS:
+    _register(_path)
+
+
+@app.post(RECORDS_ENDPOINT)
+async def cosmos_records(request: Request):
+    await request.body()
+
+    async def handle(cfg):
+        return {"success": True}
+
+    return await _serve(RECORDS_ENDPOINT, handle)
+
+
+@app.get("/config")
+async def get_config():
+    return config
+
+
+@app.post("/config")
+async def set_config(request: Request):
+    """Merge the given per-path settings; {"reset": true} restores the startup defaults first."""
+    body = await request.json()
+    if body.pop("reset", False):
+        config.clear()
+        config["default"] = dict(DEFAULT_CONFIG)
+    for path, values in body.items():
+        config.setdefault(path, {}).update(values)
+    return config
+
+
+@app.get("/stats")
+async def stats():
+    """HTTP requests, individual items and response codes handled, per endpoint."""
+    return {
+        "requests": dict(request_counts),
+        "items": dict(item_counts),
+        "status_codes": dict(status_counts),
+        "peak_in_flight": dict(peak_in_flight),
+    }
+
+
+@app.post("/stats/reset")
+async def reset_stats():
+    request_counts.clear()
+    item_counts.clear()
+    status_counts.clear()
+    peak_in_flight.clear()
+    return {"message": "Reset complete"}
@@ -0,0 +1,150 @@
+# services/fair_scheduler.py
+"""
+Weighted fair queuing of downstream request slots across runs and users.
+
+Every downstream endpoint has one process-wide concurrency limit (see
+services/adaptive_limiter.py). When all its slots are busy, waiting requests
+are queued per flow and a freed slot goes to the flow that has received the
+least weighted service so far (start-time fair queuing), two levels deep:
+first across requester emails, then across that requester's runs. A 3-item
+request therefore gets slots right away even while a 20k-item backfill keeps
+every slot busy, and one user's many runs don't crowd out everyone else.
+
+The flow of a request comes from a context variable set by BatchRunner.run_batch,
+so every task the run spawns (stage workers, batchers, log writer) inherits it.
+"""
+import asyncio
+import contextvars
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional
+
+from config.settings import settings
+
+PRIORITY_HIGH = "high"
+PRIORITY_NORMAL = "normal"
+PRIORITY_LOW = "low"
+PRIORITIES = (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)
+
+# Job store ordering: higher rank is claimed first
+PRIORITY_RANKS = {PRIORITY_HIGH: 2, PRIORITY_NORMAL: 1, PRIORITY_LOW: 0}
+
+
+@dataclass(frozen=True)
+class Flow:
+    email: str
+    run_id: str
+    priority: str = PRIORITY_NORMAL
+
+
+# Requests made outside a run (monitor reporter, warm-up) share one flow
+SYSTEM_FLOW = Flow(email="", run_id="")
+
+_current_flow: contextvars.ContextVar[Flow] = contextvars.ContextVar("scheduler_flow", default=SYSTEM_FLOW)
+
+
+def bind_flow(email: Optional[str], run_id: str, priority: Optional[str] = None) -> contextvars.Token:
+    """Attribute downstream requests of the current task (and tasks it spawns) to a run."""
+    return _current_flow.set(Flow(email=email or "", run_id=run_id, priority=priority or PRIORITY_NORMAL))
+
+
+def unbind_flow(token: contextvars.Token) -> None:
+    _current_flow.reset(token)
+
+
+def current_flow() -> Flow:
+    return _current_flow.get()
+
+
+def priority_weight(priority: str) -> float:
+    weights = {
+        PRIORITY_HIGH: settings.SCHEDULER_WEIGHT_HIGH,
+        PRIORITY_NORMAL: settings.SCHEDULER_WEIGHT_NORMAL,
+        PRIORITY_LOW: settings.SCHEDULER_WEIGHT_LOW,
+    }
+    return max(weights.get(priority, settings.SCHEDULER_WEIGHT_NORMAL), 0.001)
+
+
+class _Lane:
+    """Virtual time plus FIFO of waiters of one run."""
+
+    __slots__ = ("vtime", "waiters", "priority")
+
+    def __init__(self, vtime: float, priority: str):
+        self.vtime = vtime
+        self.priority = priority
+        self.waiters: Deque[asyncio.Future] = deque()
+
+
+class _Tenant:
+    """Virtual time of one requester email plus its runs."""
+
+    __slots__ = ("vtime", "clock", "lanes")
+
+    def __init__(self, vtime: float):
+        self.vtime = vtime
+        # Virtual time of the last lane served; new lanes start here
+        self.clock = 0.0
+        self.lanes: Dict[str, _Lane] = {}
+
+
+class FairQueue:
+    """
+    Waiters for one endpoint's slots. push() queues a future under the current
+    flow; pop() returns the next future to grant (None when nobody waits).
+    Idle flows don't bank credit: a flow that starts waiting again begins at
+    the current virtual clock, not at its old (smaller) virtual time. So a
+    run (or requester) is dropped as soon as nothing of it waits, and only
+    flows with waiters are kept and scanned.
+    """
+
+    def __init__(self):
+        self.clock = 0.0
+        # Only requesters with queued waiters; each holds only runs with waiters
+        self._tenants: Dict[str, _Tenant] = {}
+        self.waiting = 0
+
+    def push(self, flow: Flow, waiter: asyncio.Future) -> None:
+        tenant = self._tenants.get(flow.email)
+        if tenant is None:
+            tenant = self._tenants[flow.email] = _Tenant(self.clock)
+        lane = tenant.lanes.get(flow.run_id)
+        if lane is None:
+            lane = tenant.lanes[flow.run_id] = _Lane(tenant.clock, flow.priority)
+        lane.priority = flow.priority
+        lane.waiters.append(waiter)
+        self.waiting += 1
+
+    def pop(self) -> Optional[asyncio.Future]:
+        while self.waiting:
+            email, tenant = min(self._tenants.items(), key=lambda et: et[1].vtime)
+            run_id, lane = min(tenant.lanes.items(), key=lambda rl: rl[1].vtime)
+            waiter = lane.waiters.popleft()
+            self.waiting -= 1
+            if waiter.done():
+                # Cancelled while waiting
+                self._prune(email, tenant, run_id, lane)
+                continue
+
+            weight = priority_weight(lane.priority)
+            self.clock = max(self.clock, tenant.vtime)
+            tenant.clock = max(tenant.clock, lane.vtime)
+            tenant.vtime += 1.0 / weight
+            lane.vtime += 1.0 / weight
+            self._prune(email, tenant, run_id, lane)
+            return waiter
+        return None
+
+    def _prune(self, email: str, tenant: _Tenant, run_id: str, lane: _Lane) -> None:
+        # Nothing waiting: a later push starts again from the current clock
+        if not lane.waiters:
+            del tenant.lanes[run_id]
+            if not tenant.lanes:
+                del self._tenants[email]
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "waiting": self.waiting,
+            "requesters": len(self._tenants),
+            "runs": sum(len(t.lanes) for t in self._tenants.values()),
+        }
@@ -1,15 +1,101 @@
 # services/http_client.py
+import asyncio
+from typing import Dict, List, Optional
+
 import httpx
 from config.settings import settings
+from services.log import get_logger
 
-async def get_client(token: str = None) -> httpx.AsyncClient:
-    """Get shared async HTTP client with optional Bearer Token"""
-    headers = {}
-    if token:
-        headers["Authorization"] = f"Bearer {token}"
-    
+log = get_logger("http_client")
+
+# One process-wide client. httpx keeps a connection pool per host inside it,
+# so every plugin and batch run reuses the same keep-alive connections.
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _build_client() -> httpx.AsyncClient:
+    http2 = settings.HTTP2_ENABLED
+    if http2 and not _http2_available():
+        log.warning("HTTP/2 requested but 'h2' is not installed, falling back to HTTP/1.1")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
     return httpx.AsyncClient(
         timeout=settings.REQUEST_TIMEOUT,
         follow_redirects=True,
-        headers=headers
-    )
\ No newline at end of file
+        limits=limits,
+        http2=http2,
+    )
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Return the shared pooled client. Do NOT close it (no `async with`);
+    its lifetime is owned by the FastAPI startup/shutdown hooks.
+    Created lazily so plugins also work outside the app lifecycle.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+def auth_headers(token: Optional[str] = None) -> Dict[str, str]:
+    """Per-request Authorization header, so callers with different tokens share the pool."""
+    if token:
+        return {"Authorization": f"Bearer {token}"}
+    return {}
+
+
+def service_urls() -> List[str]:
+    """Base URLs of all configured downstream services."""
+    return [
+        settings.ASSESSMENT_API_URL,
+        settings.PARSING_API_URL,
+        settings.MAPPING_API_URL,
+        settings.COSMOSDB_API_URL,
+        settings.MONITORING_AGENT_URL,
+    ]
+
+
+async def warm_up() -> None:
+    """
+    Open connections to every configured service ahead of the first real call
+    (DNS lookup + TCP/TLS handshake). Any response, even 404, counts as warm.
+    """
+    client = get_client()
+    hosts = {str(httpx.URL(url).copy_with(path="/", query=None)) for url in service_urls() if url}
+
+    async def _touch(url: str) -> None:
+        try:
+            await client.head(url, timeout=settings.HTTP_WARMUP_TIMEOUT)
+        except httpx.HTTPError as e:
+            log.warning("Connection warm-up failed", url=url, error=str(e))
+
+    await asyncio.gather(*(_touch(url) for url in hosts))
+
+
+async def start_client() -> httpx.AsyncClient:
+    client = get_client()
+    if settings.HTTP_WARMUP_ON_STARTUP:
+        await warm_up()
+    return client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
@@ -0,0 +1,174 @@
+# services/ingest.py
+"""
+Incremental parsing of streamed batch uploads (NDJSON or CSV).
+
+The request body is read chunk by chunk and every valid line becomes one
+(index, project_id, workbook_id) item as soon as it is complete, so the
+pipeline starts before the upload has finished. Reading is driven by the
+consumer: while the first stage's bounded queue is full the body is not read
+any further and TCP flow control slows the client down, so memory stays flat
+whatever the size of the upload.
+
+    NDJSON: one {"project_id": "...", "workbook_id": "..."} object per line
+    CSV:    header row naming project_id and workbook_id (any order), then one row per pair
+"""
+import asyncio
+import csv
+import json
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple
+
+from config.settings import settings
+
+FORMAT_NDJSON = "ndjson"
+FORMAT_CSV = "csv"
+
+_CONTENT_TYPES = {
+    "application/x-ndjson": FORMAT_NDJSON,
+    "application/ndjson": FORMAT_NDJSON,
+    "application/jsonl": FORMAT_NDJSON,
+    "application/jsonlines": FORMAT_NDJSON,
+    "text/csv": FORMAT_CSV,
+    "application/csv": FORMAT_CSV,
+}
+
+
+class IngestError(Exception):
+    """The upload as a whole can't be read (unknown format, bad CSV header)."""
+
+
+def detect_format(content_type: Optional[str], requested: Optional[str] = None) -> str:
+    """Explicit ?format= wins over the Content-Type header."""
+    if requested:
+        fmt = requested.lower()
+        if fmt in ("ndjson", "jsonl"):
+            return FORMAT_NDJSON
+        if fmt == "csv":
+            return FORMAT_CSV
+        raise IngestError(f"Unknown format '{requested}' (use ndjson or csv)")
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in _CONTENT_TYPES:
+        return _CONTENT_TYPES[media_type]
+    raise IngestError(f"Unsupported Content-Type '{content_type}' (send application/x-ndjson or text/csv)")
+
+
+@dataclass
+class IngestStats:
+    lines: int = 0
+    accepted: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+    # Set once the whole body has been read (or reading stopped for good)
+    finished: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def reject(self, line_no: int, reason: str) -> None:
+        self.invalid += 1
+        if len(self.errors) < settings.INGEST_MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_no, "error": reason})
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "received_lines": self.lines,
+            "accepted": self.accepted,
+            "duplicates_removed": self.duplicates,
+            "invalid": self.invalid,
+            "errors": self.errors,
+        }
+
+
+async def _lines(chunks: AsyncIterable[bytes], stats: IngestStats) -> AsyncIterator[Tuple[int, bytes]]:
+    """Split a byte stream into numbered lines; over-long lines are rejected and skipped."""
+    buffer = b""
+    skipping = False
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *complete, buffer = buffer.split(b"\n")
+        for raw in complete:
+            line_no += 1
+            if skipping:
+                # Tail of a line that was already rejected for its length
+                skipping = False
+                stats.reject(line_no, "line too long")
+                continue
+            if len(raw) > settings.INGEST_MAX_LINE_BYTES:
+                # Arrived complete within one chunk
+                stats.reject(line_no, "line too long")
+                continue
+            yield line_no, raw
+        if len(buffer) > settings.INGEST_MAX_LINE_BYTES:
+            buffer = b""
+            skipping = True
+    if skipping or len(buffer) > settings.INGEST_MAX_LINE_BYTES:
+        stats.reject(line_no + 1, "line too long")
+    elif buffer:
+        yield line_no + 1, buffer
+
+
+def _pair_from_json(text: str) -> Tuple[str, str]:
+    record = json.loads(text)
+    if not isinstance(record, dict):
+        raise ValueError("expected a JSON object")
+    return record.get("project_id"), record.get("workbook_id")
+
+
+async def parse_items(
+    chunks: AsyncIterable[bytes],
+    fmt: str,
+    stats: IngestStats,
+) -> AsyncIterator[Tuple[int, str, str]]:
+    """
+    Yield (index, project_id, workbook_id) for every valid, first-seen pair.
+    Invalid lines are counted in `stats` and skipped; repeated pairs are
+    collapsed like /invoke-batch does, within a window of the last
+    INGEST_DEDUPE_WINDOW distinct pairs so memory stays bounded.
+    """
+    window = settings.INGEST_DEDUPE_WINDOW
+    seen: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+    columns: Optional[Tuple[int, int]] = None
+    index = 0
+    async for line_no, raw in _lines(chunks, stats):
+        try:
+            text = raw.decode("utf-8-sig" if line_no == 1 else "utf-8").strip()
+        except UnicodeDecodeError:
+            stats.reject(line_no, "not valid UTF-8")
+            continue
+        if not text:
+            continue
+
+        if fmt == FORMAT_CSV and columns is None:
+            header = [name.strip().lower() for name in next(csv.reader([text]))]
+            if "project_id" not in header or "workbook_id" not in header:
+                raise IngestError("CSV header must name the project_id and workbook_id columns")
+            columns = (header.index("project_id"), header.index("workbook_id"))
+            continue
+
+        stats.lines += 1
+        try:
+            if fmt == FORMAT_CSV:
+                row = next(csv.reader([text]))
+                pid, wid = row[columns[0]].strip(), row[columns[1]].strip()
+            else:
+                pid, wid = _pair_from_json(text)
+        except (ValueError, IndexError, csv.Error) as e:
+            stats.reject(line_no, str(e) or "unreadable line")
+            continue
+        if not isinstance(pid, str) or not isinstance(wid, str) or not pid or not wid:
+            stats.reject(line_no, "project_id and workbook_id must be non-empty strings")
+            continue
+
+        if window > 0:
+            if (pid, wid) in seen:
+                seen.move_to_end((pid, wid))
+                stats.duplicates += 1
+                continue
+            seen[(pid, wid)] = None
+            if len(seen) > window:
+                seen.popitem(last=False)
+        stats.accepted += 1
+        yield index, pid, wid
+        index += 1
+    # Not on errors: the caller then learns about the failure from the consumer
+    stats.finished.set()
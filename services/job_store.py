@@ -0,0 +1,385 @@
+# services/job_store.py
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import settings
+from services.fair_scheduler import PRIORITY_NORMAL, PRIORITY_RANKS
+
+# Job lifecycle: QUEUED -> RUNNING -> COMPLETED / FAILED
+# A RUNNING job whose heartbeat is older than the lease is considered orphaned
+# (process crashed / pod restarted) and can be claimed again by any worker.
+JOB_QUEUED = "QUEUED"
+JOB_RUNNING = "RUNNING"
+JOB_COMPLETED = "COMPLETED"
+JOB_FAILED = "FAILED"
+
+ITEM_PENDING = "PENDING"
+ITEM_DONE = "DONE"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    run_id       TEXT PRIMARY KEY,
+    email        TEXT,
+    token        TEXT,
+    status       TEXT NOT NULL,
+    item_count   INTEGER NOT NULL,
+    worker_id    TEXT,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    error        TEXT,
+    priority     TEXT NOT NULL DEFAULT 'normal',
+    item_deadline_seconds REAL,
+    run_deadline_seconds  REAL,
+    force        INTEGER NOT NULL DEFAULT 0,
+    created_at   REAL NOT NULL,
+    updated_at   REAL NOT NULL,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+
+CREATE TABLE IF NOT EXISTS job_items (
+    run_id      TEXT NOT NULL,
+    idx         INTEGER NOT NULL,
+    project_id  TEXT NOT NULL,
+    workbook_id TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    result      TEXT,
+    completed_stages TEXT,
+    updated_at  REAL NOT NULL,
+    PRIMARY KEY (run_id, idx)
+);
+"""
+
+# Columns added after the first release: (name, definition) for ALTER TABLE
+_MIGRATIONS = [
+    ("priority", "TEXT NOT NULL DEFAULT 'normal'"),
+    ("item_deadline_seconds", "REAL"),
+    ("run_deadline_seconds", "REAL"),
+    ("force", "INTEGER NOT NULL DEFAULT 0"),
+]
+_ITEM_MIGRATIONS = [
+    ("completed_stages", "TEXT"),
+]
+
+# Higher priority first; unknown values sort with normal
+_PRIORITY_ORDER = (
+    "CASE priority "
+    + " ".join(f"WHEN '{name}' THEN {rank}" for name, rank in PRIORITY_RANKS.items())
+    + f" ELSE {PRIORITY_RANKS[PRIORITY_NORMAL]} END DESC"
+)
+
+
+@dataclass
+class Job:
+    run_id: str
+    email: str
+    token: Optional[str]
+    status: str
+    item_count: int
+    attempts: int
+    error: Optional[str]
+    created_at: float
+    updated_at: float
+    priority: str = PRIORITY_NORMAL
+    # None: settings defaults at run time
+    item_deadline_seconds: Optional[float] = None
+    run_deadline_seconds: Optional[float] = None
+    # Skip stage cache reads
+    force: bool = False
+
+
+@dataclass
+class JobItem:
+    idx: int
+    project_id: str
+    workbook_id: str
+    status: str
+    result: Optional[Dict[str, Any]]
+    # Stages an earlier run already completed (retries); run_batch skips them
+    completed_stages: List[str] = field(default_factory=list)
+
+
+class SQLiteJobStore:
+    """
+    Persistent batch job queue backed by a local SQLite file.
+    Needs no external service; all blocking sqlite calls run in a worker thread.
+
+    NOTE: the caller's Bearer token is persisted with the job only while it is
+    queued or running, so a resumed batch can still authenticate downstream.
+    finish() clears it and opening the store clears it from finished jobs
+    (older releases kept it). Keep the database file private.
+    """
+
+    def __init__(self, path: str):
+        db_path = Path(path)
+        if not db_path.is_absolute():
+            db_path = Path(__file__).parent.parent / db_path
+        self.path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    # -----------------------------
+    # Setup
+    # -----------------------------
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, definition in _MIGRATIONS:
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+            item_columns = {row["name"] for row in conn.execute("PRAGMA table_info(job_items)")}
+            for name, definition in _ITEM_MIGRATIONS:
+                if name not in item_columns:
+                    conn.execute(f"ALTER TABLE job_items ADD COLUMN {name} {definition}")
+            # Finished jobs never need their token again
+            conn.execute(
+                "UPDATE jobs SET token = NULL WHERE token IS NOT NULL AND status IN (?, ?)",
+                (JOB_COMPLETED, JOB_FAILED),
+            )
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, fn, *args):
+        def _locked():
+            with self._lock:
+                return fn(self._connect(), *args)
+
+        return await asyncio.to_thread(_locked)
+
+    async def init(self) -> None:
+        await self._run(lambda conn: None)
+
+    async def close(self) -> None:
+        def _close():
+            with self._lock:
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+
+        await asyncio.to_thread(_close)
+
+    # -----------------------------
+    # Producer side
+    # -----------------------------
+    async def enqueue(
+        self,
+        run_id: str,
+        email: str,
+        pairs: List[Tuple[str, str]],
+        token: Optional[str] = None,
+        priority: str = PRIORITY_NORMAL,
+        item_deadline_seconds: Optional[float] = None,
+        run_deadline_seconds: Optional[float] = None,
+        force: bool = False,
+        completed_stages: Optional[List[List[str]]] = None,
+    ) -> None:
+        """`completed_stages`, if given, lists per pair the stages not to call again."""
+        stages = completed_stages or [[] for _ in pairs]
+
+        def _insert(conn: sqlite3.Connection):
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO jobs (run_id, email, token, status, item_count, priority, "
+                    "item_deadline_seconds, run_deadline_seconds, force, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        run_id, email, token, JOB_QUEUED, len(pairs), priority,
+                        item_deadline_seconds, run_deadline_seconds, int(force), now, now,
+                    ),
+                )
+                conn.executemany(
+                    "INSERT INTO job_items (run_id, idx, project_id, workbook_id, status, completed_stages, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (run_id, i, pid, wid, ITEM_PENDING, json.dumps(done) if done else None, now)
+                        for i, ((pid, wid), done) in enumerate(zip(pairs, stages))
+                    ],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        await self._run(_insert)
+
+    # -----------------------------
+    # Worker side
+    # -----------------------------
+    async def claim_next(self, worker_id: str, lease_seconds: float) -> Optional[Job]:
+        """
+        Atomically claim the next queued (or orphaned running) job: highest
+        priority first, then the requester with the fewest running jobs (so
+        one user's backlog doesn't take every worker), then the oldest.
+        """
+
+        def _claim(conn: sqlite3.Connection) -> Optional[Job]:
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT run_id FROM jobs "
+                    "WHERE status = ? OR (status = ? AND heartbeat_at < ?) "
+                    f"ORDER BY {_PRIORITY_ORDER}, "
+                    "(SELECT COUNT(*) FROM jobs AS r WHERE r.email IS jobs.email "
+                    "AND r.status = ? AND r.heartbeat_at >= ?), created_at LIMIT 1",
+                    (JOB_QUEUED, JOB_RUNNING, now - lease_seconds, JOB_RUNNING, now - lease_seconds),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = ?, worker_id = ?, attempts = attempts + 1, "
+                    "heartbeat_at = ?, updated_at = ? WHERE run_id = ?",
+                    (JOB_RUNNING, worker_id, now, now, row["run_id"]),
+                )
+                job_row = conn.execute("SELECT * FROM jobs WHERE run_id = ?", (row["run_id"],)).fetchone()
+                conn.execute("COMMIT")
+                return _row_to_job(job_row)
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        return await self._run(_claim)
+
+    async def heartbeat(self, run_id: str, worker_id: str) -> None:
+        def _beat(conn: sqlite3.Connection):
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET heartbeat_at = ?, updated_at = ? WHERE run_id = ? AND worker_id = ?",
+                (now, now, run_id, worker_id),
+            )
+
+        await self._run(_beat)
+
+    async def checkpoint_item(self, run_id: str, idx: int, result: Dict[str, Any]) -> None:
+        """Persist one finished item so a resumed job skips it."""
+
+        def _save(conn: sqlite3.Connection):
+            now = time.time()
+            conn.execute(
+                "UPDATE job_items SET status = ?, result = ?, updated_at = ? WHERE run_id = ? AND idx = ?",
+                (ITEM_DONE, json.dumps(result), now, run_id, idx),
+            )
+            conn.execute("UPDATE jobs SET heartbeat_at = ?, updated_at = ? WHERE run_id = ?", (now, now, run_id))
+
+        await self._run(_save)
+
+    async def release(self, run_id: str, worker_id: str) -> None:
+        """
+        Hand a running job back to the queue (graceful shutdown); it resumes from
+        its checkpoints. The claim doesn't count as an attempt.
+        """
+
+        def _release(conn: sqlite3.Connection):
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker_id = NULL, heartbeat_at = NULL, "
+                "attempts = MAX(attempts - 1, 0), updated_at = ? "
+                "WHERE run_id = ? AND worker_id = ? AND status = ?",
+                (JOB_QUEUED, time.time(), run_id, worker_id, JOB_RUNNING),
+            )
+
+        await self._run(_release)
+
+    async def finish(self, run_id: str, status: str, error: Optional[str] = None) -> None:
+        def _finish(conn: sqlite3.Connection):
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, token = NULL, updated_at = ? WHERE run_id = ?",
+                (status, error, time.time(), run_id),
+            )
+
+        await self._run(_finish)
+
+    async def purge_finished(self, older_than: float) -> int:
+        """Delete jobs (and their items) that finished before `older_than` (epoch seconds)."""
+
+        def _purge(conn: sqlite3.Connection) -> int:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                finished = "SELECT run_id FROM jobs WHERE status IN (?, ?) AND updated_at < ?"
+                args = (JOB_COMPLETED, JOB_FAILED, older_than)
+                conn.execute(f"DELETE FROM job_items WHERE run_id IN ({finished})", args)
+                deleted = conn.execute(f"DELETE FROM jobs WHERE run_id IN ({finished})", args).rowcount
+                conn.execute("COMMIT")
+                return deleted
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        return await self._run(_purge)
+
+    # -----------------------------
+    # Reads
+    # -----------------------------
+    async def get_job(self, run_id: str) -> Optional[Job]:
+        def _get(conn: sqlite3.Connection):
+            row = conn.execute("SELECT * FROM jobs WHERE run_id = ?", (run_id,)).fetchone()
+            return _row_to_job(row) if row else None
+
+        return await self._run(_get)
+
+    async def pending_item_count(self) -> int:
+        """Items not yet processed across all queued and running jobs."""
+
+        def _count(conn: sqlite3.Connection) -> int:
+            return conn.execute(
+                "SELECT COUNT(*) FROM job_items WHERE status = ? AND run_id IN "
+                "(SELECT run_id FROM jobs WHERE status IN (?, ?))",
+                (ITEM_PENDING, JOB_QUEUED, JOB_RUNNING),
+            ).fetchone()[0]
+
+        return await self._run(_count)
+
+    async def get_items(self, run_id: str) -> List[JobItem]:
+        def _items(conn: sqlite3.Connection):
+            rows = conn.execute(
+                "SELECT idx, project_id, workbook_id, status, result, completed_stages "
+                "FROM job_items WHERE run_id = ? ORDER BY idx",
+                (run_id,),
+            ).fetchall()
+            return [
+                JobItem(
+                    idx=r["idx"],
+                    project_id=r["project_id"],
+                    workbook_id=r["workbook_id"],
+                    status=r["status"],
+                    result=json.loads(r["result"]) if r["result"] else None,
+                    completed_stages=json.loads(r["completed_stages"]) if r["completed_stages"] else [],
+                )
+                for r in rows
+            ]
+
+        return await self._run(_items)
+
+
+def _row_to_job(row: sqlite3.Row) -> Job:
+    return Job(
+        run_id=row["run_id"],
+        email=row["email"],
+        token=row["token"],
+        status=row["status"],
+        item_count=row["item_count"],
+        attempts=row["attempts"],
+        error=row["error"],
+        created_at=row["created_at"],
+        updated_at=row["updated_at"],
+        priority=row["priority"],
+        item_deadline_seconds=row["item_deadline_seconds"],
+        run_deadline_seconds=row["run_deadline_seconds"],
+        force=bool(row["force"]),
+    )
+
+
+job_store = SQLiteJobStore(settings.JOB_STORE_PATH)
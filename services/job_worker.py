@@ -0,0 +1,172 @@
+# services/job_worker.py
+import asyncio
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from config.settings import settings
+from services.batch_runner import RunInterrupted
+from services.job_store import JOB_COMPLETED, JOB_FAILED, ITEM_DONE, Job, SQLiteJobStore
+from services.log import get_logger
+from services.run_tracker import RUN_FAILED, run_tracker
+
+log = get_logger("job_worker")
+
+
+class JobWorkerPool:
+    """
+    Fixed pool of workers that claim batch jobs from the job store.
+    Work survives restarts: items are checkpointed as they finish and an
+    orphaned job is picked up again (only its unfinished items re-run).
+    """
+
+    def __init__(self, store: SQLiteJobStore, queue_plugin, workers: int = None):
+        self.store = store
+        self.queue_plugin = queue_plugin
+        self.workers = workers or settings.JOB_WORKERS
+        self.worker_prefix = uuid.uuid4().hex[:8]
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        # Set on shutdown: running jobs stop starting new items
+        self._drain = asyncio.Event()
+        self._stopping = False
+        self._purger: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._stopping = False
+        self._drain.clear()
+        self._tasks = [
+            asyncio.create_task(self._worker_loop(f"{self.worker_prefix}-{n}"))
+            for n in range(self.workers)
+        ]
+        self._purger = asyncio.create_task(self._purge_loop())
+
+    def notify(self) -> None:
+        """Wake idle workers right away instead of waiting for the next poll."""
+        self._wakeup.set()
+
+    async def stop(self, drain_timeout: float = 0) -> None:
+        """
+        Graceful stop: no new jobs are claimed and running jobs stop starting
+        new items. Items already in flight get up to `drain_timeout` seconds to
+        finish (and be checkpointed); the jobs are then handed back to the queue
+        so the next process resumes them right away.
+        """
+        self._stopping = True
+        self._drain.set()
+        self._wakeup.set()
+        if self._purger is not None:
+            self._purger.cancel()
+            await asyncio.gather(self._purger, return_exceptions=True)
+            self._purger = None
+        if drain_timeout > 0 and self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=drain_timeout)
+            if pending:
+                log.warning("Drain timeout, cancelling workers with items still in flight", workers=len(pending))
+        for task in self._tasks:
+            task.cancel()
+        # Jobs whose release failed stay RUNNING in the store; their lease
+        # expires and the next process resumes them from the last checkpoint.
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker_loop(self, worker_id: str) -> None:
+        while not self._stopping:
+            try:
+                job = await self.store.claim_next(worker_id, settings.JOB_LEASE_SECONDS)
+            except Exception as e:
+                log.error("Job store claim failed", worker_id=worker_id, error=str(e))
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            if settings.JOB_MAX_ATTEMPTS and job.attempts > settings.JOB_MAX_ATTEMPTS:
+                await self._give_up(job)
+                continue
+
+            await self._process_job(worker_id, job)
+
+    async def _give_up(self, job: Job) -> None:
+        """The job's workers kept dying mid-run: stop leasing it again."""
+        error = f"Gave up after {job.attempts - 1} attempts without finishing"
+        log.error("Job failed", run_id=job.run_id, error=error)
+        try:
+            await self.store.finish(job.run_id, JOB_FAILED, error=error)
+        except Exception as e:
+            log.error("Job store finish failed", run_id=job.run_id, error=str(e))
+        run_tracker.finish_run(job.run_id, status=RUN_FAILED)
+
+    async def _purge_loop(self) -> None:
+        """Delete finished jobs older than JOB_RETENTION_SECONDS, periodically."""
+        while settings.JOB_RETENTION_SECONDS > 0:
+            try:
+                purged = await self.store.purge_finished(time.time() - settings.JOB_RETENTION_SECONDS)
+                if purged:
+                    log.info("Purged finished jobs", jobs=purged)
+            except Exception as e:
+                log.error("Job purge failed", error=str(e))
+            await asyncio.sleep(settings.JOB_PURGE_INTERVAL_SECONDS)
+
+    async def _heartbeat(self, worker_id: str, run_id: str) -> None:
+        interval = max(settings.JOB_LEASE_SECONDS / 3, 1.0)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.store.heartbeat(run_id, worker_id)
+            except Exception as e:
+                log.warning("Job heartbeat failed", run_id=run_id, error=str(e))
+
+    async def _process_job(self, worker_id: str, job: Job) -> None:
+        log.info("Job claimed", worker_id=worker_id, run_id=job.run_id, attempt=job.attempts)
+        heartbeat = asyncio.create_task(self._heartbeat(worker_id, job.run_id))
+        try:
+            items = await self.store.get_items(job.run_id)
+            previous: Dict[int, Dict[str, Any]] = {
+                it.idx: it.result for it in items if it.status == ITEM_DONE and it.result
+            }
+            pending = [(it.idx, it.project_id, it.workbook_id) for it in items if it.idx not in previous]
+
+            if previous:
+                log.info("Resuming run", run_id=job.run_id, done=len(previous), pending=len(pending))
+
+            async def checkpoint(idx: int, result: Dict[str, Any]) -> None:
+                await self.store.checkpoint_item(job.run_id, idx, result)
+
+            await self.queue_plugin.run_batch(
+                pending,
+                run_id=job.run_id,
+                email=job.email,
+                token=job.token,
+                on_item_done=checkpoint,
+                previous_results=previous,
+                collect_results=False,
+                stop=self._drain,
+                priority=job.priority,
+                item_deadline_seconds=job.item_deadline_seconds,
+                run_deadline_seconds=job.run_deadline_seconds,
+                force=job.force,
+                completed_stages={it.idx: it.completed_stages for it in items if it.completed_stages},
+            )
+            await self.store.finish(job.run_id, JOB_COMPLETED)
+        except RunInterrupted as e:
+            log.info("Run drained, remaining items left for the next worker", run_id=job.run_id, remaining=e.remaining)
+            await self.store.release(job.run_id, worker_id)
+        except asyncio.CancelledError:
+            # Drain timed out mid-item: hand the job back anyway (unfinished items re-run)
+            try:
+                await self.store.release(job.run_id, worker_id)
+            except Exception as e:
+                log.error("Job release failed", run_id=job.run_id, error=str(e))
+            raise
+        except Exception as e:
+            log.exception("Job failed", run_id=job.run_id)
+            await self.store.finish(job.run_id, JOB_FAILED, error=str(e))
+            run_tracker.finish_run(job.run_id, status=RUN_FAILED)
+        finally:
+            heartbeat.cancel()
@@ -0,0 +1,117 @@
+# services/log.py
+"""
+Structured, non-blocking logging.
+
+Callers only append the record to an in-memory queue (QueueHandler); a
+listener thread formats it (one JSON object per line, or key=value text) and
+writes it to stderr, so a slow terminal or log collector never stalls the
+event loop the way print() does.
+
+    log = get_logger("resilience")
+    log.warning("Retrying downstream call", url=url, attempt=2, wait_seconds=0.4)
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from config.settings import settings
+
+ROOT_LOGGER = "semantic_agent"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        ts = datetime.fromtimestamp(record.created, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
+        fields = " ".join(f"{k}={v}" for k, v in getattr(record, "fields", {}).items())
+        line = f"{ts} {record.levelname:<7} {record.name} | {record.getMessage()}"
+        if fields:
+            line += f" | {fields}"
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The default merges the traceback into the message; keep them apart
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _setup() -> None:
+    global _listener
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(settings.LOG_LEVEL.upper())
+    root.propagate = False
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if settings.LOG_FORMAT.lower() == "json" else TextFormatter())
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    root.addHandler(_QueueHandler(records))
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+    # Flush whatever is still queued when the process exits
+    atexit.register(_listener.stop)
+
+
+class StructuredLogger:
+    """Logger taking an event message plus keyword fields."""
+
+    __slots__ = ("_logger",)
+
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+    def _log(self, level: int, event: str, fields: Dict[str, Any], exc_info: bool = False) -> None:
+        # Level check first: disabled levels cost one comparison
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, event, extra={"fields": fields}, exc_info=exc_info)
+
+    def debug(self, event: str, **fields: Any) -> None:
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields: Any) -> None:
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields: Any) -> None:
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, **fields: Any) -> None:
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event: str, **fields: Any) -> None:
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    if _listener is None:
+        _setup()
+    return StructuredLogger(name)
@@ -0,0 +1,254 @@
+# services/metrics.py
+"""
+In-process metrics, served in the Prometheus text format at GET /metrics.
+
+Dependency-free and cheap enough to stay on in production: every update is a
+dict lookup plus a few additions on the event loop thread (no locks, no I/O).
+Values that already live elsewhere (adaptive limits, breaker state, queue
+depths) are read only when /metrics is scraped.
+
+    DOWNSTREAM_LATENCY.observe(0.12, "assessment:8000", "/api/assessment", "200")
+    STAGE_IN_FLIGHT.inc("mapping")
+"""
+import bisect
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+RUN_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0, 7200.0, 21600.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+
+PREFIX = "semantic_agent_"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = PREFIX + name
+        self.help = help
+        self.label_names = tuple(labels)
+        registry.append(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) - amount
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class GaugeCallback(_Metric):
+    """Gauge computed at scrape time from state owned by another component."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str],
+        collect: Callable[[], Iterable[Tuple[LabelValues, float]]],
+    ):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in self.collect():
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+registry: List[_Metric] = []
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in registry:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            # One broken scrape-time callback must not hide every other metric
+            lines.append(f"# {metric.name} unavailable: {e}")
+    return "\n".join(lines) + "\n"
+
+
+# -----------------------------
+# Downstream HTTP (services/resilience.py)
+# -----------------------------
+DOWNSTREAM_LATENCY = Histogram(
+    "downstream_request_duration_seconds",
+    "Duration of single downstream HTTP attempts",
+    ["host", "endpoint", "status"],
+)
+DOWNSTREAM_RETRIES = Counter(
+    "downstream_retries_total",
+    "Downstream attempts that failed and were retried, by status code",
+    ["host", "status"],
+)
+DOWNSTREAM_FAILURES = Counter(
+    "downstream_failures_total",
+    "Downstream calls that failed for good (non_retryable, attempts_exhausted, budget_exhausted, circuit_open, deadline)",
+    ["host", "status", "reason"],
+)
+DOWNSTREAM_HEDGES = Counter(
+    "downstream_hedges_total",
+    "Hedged calls per endpoint (outcome: sent, won, budget_exhausted, saturated)",
+    ["endpoint", "outcome"],
+)
+LIMITER_WAIT = Histogram(
+    "concurrency_wait_seconds",
+    "Time a request waited for a slot of its endpoint's concurrency limit",
+    ["endpoint", "priority"],
+)
+
+# -----------------------------
+# Queue ingestion (services/azure_queue.py)
+# -----------------------------
+QUEUE_MESSAGES = Counter(
+    "queue_messages_total",
+    "Queue messages handled (outcome: completed, retried, dead_lettered)",
+    ["outcome"],
+)
+
+# -----------------------------
+# Pipeline (services/pipeline.py, services/batch_runner.py)
+# -----------------------------
+STAGE_LATENCY = Histogram(
+    "stage_duration_seconds",
+    "Time an item spent in a pipeline stage (outcome: completed, failed, cached, reused, shared, timed_out)",
+    ["stage", "outcome"],
+)
+STAGE_QUEUE_WAIT = Histogram(
+    "stage_queue_wait_seconds",
+    "Time an item waited in the bounded queue in front of a stage",
+    ["stage"],
+)
+STAGE_IN_FLIGHT = Gauge("stage_in_flight", "Items currently being handled by a stage", ["stage"])
+BATCH_SIZE = Histogram("batch_size_items", "Items per pipeline run", buckets=SIZE_BUCKETS)
+RUN_DURATION = Histogram(
+    "run_duration_seconds",
+    "Wall time of pipeline runs (outcome: completed, interrupted, failed)",
+    ["outcome"],
+    buckets=RUN_BUCKETS,
+)
+RUNS_IN_FLIGHT = Gauge("runs_in_flight", "Pipeline runs currently executing")
+ITEMS_FINISHED = Counter("items_finished_total", "Items that left the pipeline, by final status", ["status"])
+
+# -----------------------------
+# Chat / LLM (main.py, services/chat_events.py, kernel/routing_chat.py)
+# -----------------------------
+CHAT_REQUESTS = Counter("chat_requests_total", "Chat requests by route (fast_path, llm)", ["endpoint", "route"])
+LLM_LATENCY = Histogram(
+    "llm_completion_duration_seconds",
+    "Chat completion calls, including the automatic tool calls made during them",
+    ["endpoint", "outcome"],
+    buckets=LLM_BUCKETS,
+)
+LLM_BACKEND_REQUESTS = Counter(
+    "llm_backend_requests_total",
+    "Model calls per Azure OpenAI deployment (outcome: success, rate_limited, server_error, connection_error, error)",
+    ["backend", "outcome"],
+)
+LLM_BACKEND_LATENCY = Histogram(
+    "llm_backend_response_seconds",
+    "Time to the response headers of successful model calls, per deployment",
+    ["backend"],
+    buckets=LLM_BUCKETS,
+)
+LLM_FAILOVERS = Counter(
+    "llm_failovers_total",
+    "Model calls moved off a deployment to the next one (reason: rate_limited, server_error, connection_error)",
+    ["backend", "reason"],
+)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by the model (type: prompt, completion)", ["type"])
+TOOL_LATENCY = Histogram(
+    "chat_tool_duration_seconds",
+    "Kernel function calls made by the model",
+    ["tool", "outcome"],
+    buckets=LLM_BUCKETS,
+)
+
+
+def record_llm_usage(usage) -> None:
+    """Add a CompletionUsage (prompt_tokens / completion_tokens) to the token counters."""
+    if usage is None:
+        return
+    LLM_TOKENS.inc("prompt", amount=getattr(usage, "prompt_tokens", 0) or 0)
+    LLM_TOKENS.inc("completion", amount=getattr(usage, "completion_tokens", 0) or 0)
@@ -0,0 +1,212 @@
+# services/monitor_reporter.py
+import asyncio
+import json
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import settings
+from services.batcher import bulk_results
+from services.http_client import auth_headers, get_client
+from services.log import get_logger
+from services.metrics import GaugeCallback
+from services.resilience import hedging_enabled, post_with_retry
+from services.spill import JsonlSpill
+
+log = get_logger("monitor_reporter")
+
+Event = Tuple[Dict[str, Any], Optional[Dict[str, str]]]
+
+
+class MonitorReporter:
+    """
+    Fire-and-forget monitoring reports, sent off the workbook critical path.
+
+    `report()` never waits: the event goes into a bounded in-memory map keyed
+    by (run_id, project_id, workbook_id), so a newer status for the same
+    workbook replaces the older one that hasn't been sent yet. A background
+    task sends pending events in batches. When the map is full, new events are
+    spilled to a JSONL file (read back once the backlog drains) or, without a
+    spill file or past its size cap, dropped and counted.
+
+    Spilled events are stored without their Authorization header; they are
+    re-sent with SERVICE_AUTH_TOKEN.
+    """
+
+    def __init__(self):
+        self._pending: "OrderedDict[Tuple[str, str, str], Event]" = OrderedDict()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._spill_file = JsonlSpill(settings.MONITOR_SPILL_PATH, settings.MONITOR_SPILL_MAX_BYTES, "monitor")
+        # Overflow waiting for the sender task to write it to the spill file
+        self._overflow: List[Event] = []
+
+        self.stats: Dict[str, int] = {
+            "queued": 0,
+            "coalesced": 0,
+            "sent": 0,
+            "failed": 0,
+            "spilled": 0,
+            "dropped": 0,
+        }
+
+    # -----------------------------
+    # Producer side
+    # -----------------------------
+    def report(self, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> bool:
+        """Queue a status event. Returns False only if it had to be dropped."""
+        self._ensure_started()
+        key = (payload.get("run_id"), payload.get("project_id"), payload.get("workbook_id"))
+
+        if key in self._pending:
+            # Only the latest status per workbook matters
+            self._pending[key] = (payload, headers)
+            self.stats["coalesced"] += 1
+            return True
+
+        if len(self._pending) >= settings.MONITOR_QUEUE_MAX_EVENTS:
+            # File I/O happens in the sender task, not here on the caller's path
+            if not self._spill_file.enabled or len(self._overflow) >= settings.MONITOR_QUEUE_MAX_EVENTS:
+                self.stats["dropped"] += 1
+                return False
+            self._overflow.append((payload, headers))
+            self._wakeup.set()
+            return True
+
+        self._pending[key] = (payload, headers)
+        self.stats["queued"] += 1
+        if len(self._pending) >= settings.MONITOR_BATCH_SIZE:
+            self._wakeup.set()
+        return True
+
+    async def _spill(self, events: List[Event]) -> None:
+        records = []
+        for payload, headers in events:
+            # Never write the caller's token to disk
+            kept = {k: v for k, v in (headers or {}).items() if k.lower() != "authorization"}
+            records.append({"payload": payload, "headers": kept})
+        written = await self._spill_file.append(records)
+        self.stats["spilled"] += written
+        self.stats["dropped"] += len(records) - written
+
+    async def _flush_overflow(self) -> None:
+        if self._overflow:
+            events, self._overflow = self._overflow, []
+            await self._spill(events)
+
+    async def _unspill(self) -> None:
+        """Move spilled events back into memory once there is room."""
+        if not self._spill_file.exists():
+            return
+        room = settings.MONITOR_QUEUE_MAX_EVENTS - len(self._pending)
+        for event in await self._spill_file.take(room):
+            payload = event.get("payload")
+            if not isinstance(payload, dict):
+                continue
+            headers = {**(event.get("headers") or {}), **auth_headers(settings.SERVICE_AUTH_TOKEN)}
+            key = (payload.get("run_id"), payload.get("project_id"), payload.get("workbook_id"))
+            self._pending[key] = (payload, headers or None)
+
+    # -----------------------------
+    # Sender
+    # -----------------------------
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def start(self) -> None:
+        self._ensure_started()
+
+    async def _run(self) -> None:
+        while True:
+            await self._flush_overflow()
+            if not self._pending:
+                await self._unspill()
+            if not self._pending:
+                if self._stopping:
+                    return
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.MONITOR_FLUSH_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            batch: List[Event] = []
+            while self._pending and len(batch) < settings.MONITOR_BATCH_SIZE:
+                _, event = self._pending.popitem(last=False)
+                batch.append(event)
+            try:
+                await self._send(batch)
+            except Exception:
+                log.exception("Monitor reporter send loop error")
+
+    async def _send(self, batch: List[Event]) -> None:
+        client = get_client()
+        url = settings.MONITORING_AGENT_URL + "/monitor/report"
+
+        if settings.MONITORING_BULK_ENABLED:
+            # One bulk call per distinct caller token
+            groups: Dict[str, List[Event]] = {}
+            for event in batch:
+                groups.setdefault(json.dumps(event[1], sort_keys=True), []).append(event)
+            for events in groups.values():
+                payloads = [payload for payload, _ in events]
+                try:
+                    response = await post_with_retry(
+                        client,
+                        url + settings.BULK_PATH_SUFFIX,
+                        {"items": payloads},
+                        headers=events[0][1],
+                        hedge=hedging_enabled("monitoring"),
+                    )
+                    for result in bulk_results(response, len(payloads)):
+                        self.stats["failed" if isinstance(result, Exception) else "sent"] += 1
+                except Exception as e:
+                    self.stats["failed"] += len(payloads)
+                    log.warning("Monitoring Agent bulk notification failed", events=len(payloads), error=str(e))
+            return
+
+        async def send_one(event: Event) -> None:
+            payload, headers = event
+            try:
+                await post_with_retry(
+                    client, url, payload, headers=headers, timeout=10.0, hedge=hedging_enabled("monitoring")
+                )
+                self.stats["sent"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                log.warning("Monitoring Agent notification failed after retries", project_id=payload.get("project_id"), error=str(e))
+
+        await asyncio.gather(*(send_one(event) for event in batch))
+
+    async def stop(self, timeout: float = None) -> None:
+        """Drain what's queued (bounded by `timeout`), leaving the rest in the spill file."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout or settings.MONITOR_DRAIN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            events = self._overflow + list(self._pending.values())
+            self._overflow = []
+            self._pending.clear()
+            await self._spill(events)
+        self._task = None
+
+    def snapshot(self) -> Dict[str, int]:
+        return {**self.stats, "pending": len(self._pending)}
+
+
+monitor_reporter = MonitorReporter()
+
+GaugeCallback(
+    "monitor_pending_events",
+    "Monitoring events waiting to be sent",
+    [],
+    lambda: [((), monitor_reporter.snapshot()["pending"])],
+)
@@ -0,0 +1,121 @@
+# services/pipeline.py
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, Awaitable, Callable, Iterable, List, Optional, Union
+
+from services.log import get_logger
+from services.metrics import STAGE_IN_FLIGHT, STAGE_QUEUE_WAIT
+
+log = get_logger("pipeline")
+
+
+@dataclass
+class PipelineItem:
+    index: int
+    data: Any
+    # Set by a stage handler to skip the remaining (non-"always") stages
+    failed: bool = False
+    # Unhandled exception raised by a stage handler
+    error: Optional[str] = None
+
+
+@dataclass
+class Stage:
+    name: str
+    handler: Callable[[PipelineItem], Awaitable[None]]
+    concurrency: int = 1
+    # Run even when an earlier stage failed (e.g. monitoring / reporting)
+    always: bool = False
+
+
+class StagedPipeline:
+    """
+    Pipeline engine: every stage has its own bounded queue and worker pool.
+    An item moves to the next stage as soon as its current stage finishes, so
+    a slow stage only limits itself; upstream stages keep working until the
+    bounded queue in front of the slow stage fills up (backpressure).
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 100, start_jitter: float = 0.0):
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = queue_size
+        self.start_jitter = start_jitter
+
+    def _next_stage(self, item: PipelineItem, after: int) -> Optional[int]:
+        for k in range(after + 1, len(self.stages)):
+            if not item.failed or self.stages[k].always:
+                return k
+        return None
+
+    async def run(
+        self,
+        items: Union[Iterable[PipelineItem], AsyncIterable[PipelineItem]],
+        on_item_done: Optional[Callable[[PipelineItem], Awaitable[None]]] = None,
+    ) -> int:
+        """Push all items through the stages; returns the number of items processed."""
+        queues = [asyncio.Queue(maxsize=max(self.queue_size, 1)) for _ in self.stages]
+        all_done = asyncio.Event()
+        counters = {"fed": 0, "done": 0, "feeding": True}
+
+        async def finish(item: PipelineItem) -> None:
+            if on_item_done is not None:
+                try:
+                    await on_item_done(item)
+                except Exception as e:
+                    log.error("Pipeline on_item_done failed", index=item.index, error=str(e))
+            counters["done"] += 1
+            if not counters["feeding"] and counters["done"] == counters["fed"]:
+                all_done.set()
+
+        async def route(item: PipelineItem, after: int) -> None:
+            k = self._next_stage(item, after)
+            if k is None:
+                await finish(item)
+            else:
+                await queues[k].put((item, time.monotonic()))
+
+        async def worker(k: int) -> None:
+            stage = self.stages[k]
+            # Stagger worker start so the first wave doesn't hit a service at the same instant
+            if self.start_jitter > 0:
+                await asyncio.sleep(random.uniform(0, self.start_jitter))
+            while True:
+                item, enqueued_at = await queues[k].get()
+                STAGE_QUEUE_WAIT.observe(time.monotonic() - enqueued_at, stage.name)
+                STAGE_IN_FLIGHT.inc(stage.name)
+                try:
+                    await stage.handler(item)
+                except Exception as e:
+                    item.failed = True
+                    item.error = f"{stage.name}: {e}"
+                finally:
+                    STAGE_IN_FLIGHT.dec(stage.name)
+                await route(item, k)
+
+        workers = [
+            asyncio.create_task(worker(k))
+            for k, stage in enumerate(self.stages)
+            for _ in range(max(stage.concurrency, 1))
+        ]
+        try:
+            if hasattr(items, "__aiter__"):
+                async for item in items:
+                    counters["fed"] += 1
+                    await route(item, -1)
+            else:
+                for item in items:
+                    counters["fed"] += 1
+                    await route(item, -1)
+            counters["feeding"] = False
+            if counters["done"] == counters["fed"]:
+                all_done.set()
+            await all_done.wait()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return counters["fed"]
@@ -0,0 +1,432 @@
+# services/resilience.py
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import httpx
+from config.settings import settings
+from services.adaptive_limiter import AdaptiveLimiter, get_limiter, service_key
+from services.log import get_logger
+from services.metrics import (
+    DOWNSTREAM_FAILURES,
+    DOWNSTREAM_HEDGES,
+    DOWNSTREAM_LATENCY,
+    DOWNSTREAM_RETRIES,
+    GaugeCallback,
+)
+
+log = get_logger("resilience")
+
+# Worth retrying: timeouts, throttling and transient server errors.
+# Any other 4xx (400/401/403/404/422...) can never succeed on retry.
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the service while its endpoint's circuit is open."""
+
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f"Circuit open for {endpoint}, retry in {retry_in:.1f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class DeadlineExceeded(Exception):
+    """The caller's deadline (item or run) left no time for another attempt."""
+
+    def __init__(self, url: str):
+        super().__init__(f"Deadline exceeded for {url}")
+        self.url = url
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS_CODES
+    # Connection errors, timeouts, protocol errors
+    return isinstance(exc, httpx.RequestError)
+
+
+def is_throttled(exc: Exception) -> bool:
+    """429, or any response carrying Retry-After: the service is up but asks us to slow down."""
+    if not isinstance(exc, httpx.HTTPStatusError):
+        return False
+    return exc.response.status_code == 429 or "Retry-After" in exc.response.headers
+
+
+def retry_after_seconds(response: Optional[httpx.Response]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP-date)."""
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def decorrelated_jitter(previous: float, base: float, cap: float) -> float:
+    """'Decorrelated jitter' backoff: concurrent callers spread out instead of retrying in lockstep."""
+    return min(cap, random.uniform(base, max(previous * 3, base)))
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of first attempts within one run, so a failing
+    service sees at most ~(1 + ratio)x the normal load instead of 4x.
+    `min_retries` keeps small runs from being starved of retries entirely.
+    """
+
+    def __init__(self, ratio: float = None, min_retries: int = None):
+        self.ratio = settings.RETRY_BUDGET_RATIO if ratio is None else ratio
+        self.min_retries = settings.RETRY_BUDGET_MIN if min_retries is None else min_retries
+        self.requests = 0
+        self.retries = 0
+
+    def record_request(self) -> None:
+        self.requests += 1
+
+    def try_spend(self) -> bool:
+        if self.retries < self.min_retries + self.ratio * self.requests:
+            self.retries += 1
+            return True
+        return False
+
+
+class HedgeBudget:
+    """
+    Token bucket per endpoint: every call earns `ratio` of a hedge (banked up
+    to `burst`) and every hedge spends one, so hedging adds at most about
+    `ratio` extra load on the service however slow it gets.
+    """
+
+    def __init__(self, ratio: float = None, burst: float = None):
+        self.ratio = settings.HEDGE_BUDGET_RATIO if ratio is None else ratio
+        self.burst = settings.HEDGE_BUDGET_BURST if burst is None else burst
+        self.tokens = self.burst
+
+    def record_request(self) -> None:
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+_hedge_budgets: Dict[str, HedgeBudget] = {}
+
+
+def hedging_enabled(stage: str) -> bool:
+    """Per-stage opt-in (<STAGE>_HEDGE_ENABLED); only for calls that are safe to send twice."""
+    return bool(getattr(settings, f"{stage.upper()}_HEDGE_ENABLED", False))
+
+
+def _hedge_budget(url: str) -> HedgeBudget:
+    key = service_key(url)
+    budget = _hedge_budgets.get(key)
+    if budget is None:
+        budget = _hedge_budgets[key] = HedgeBudget()
+    return budget
+
+
+def _hedge_delay(limiter: AdaptiveLimiter) -> Optional[float]:
+    """Observed HEDGE_PERCENTILE latency of the endpoint; None until enough calls were seen."""
+    if limiter.samples() < settings.HEDGE_MIN_SAMPLES:
+        return None
+    return max(limiter.latency_percentile(settings.HEDGE_PERCENTILE), settings.HEDGE_MIN_DELAY_SECONDS)
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint breaker: CLOSED -> OPEN after `failure_threshold` consecutive
+    retryable failures; OPEN fails fast for `reset_timeout` seconds; then
+    HALF_OPEN lets a single probe through to decide between CLOSED and OPEN.
+    Throttling (429 / Retry-After) is not a failure: Retry-After and the
+    adaptive limiter deal with it, and other endpoints of the same host are
+    never affected.
+    """
+
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+    def __init__(self, endpoint: str, failure_threshold: int, reset_timeout: float):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self) -> None:
+        if self.state == self.CLOSED:
+            return
+        if self.state == self.OPEN:
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.reset_timeout:
+                raise CircuitOpenError(self.endpoint, self.reset_timeout - elapsed)
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        # HALF_OPEN: one probe at a time
+        if self._probe_in_flight:
+            raise CircuitOpenError(self.endpoint, 0.0)
+        self._probe_in_flight = True
+
+    def on_success(self) -> None:
+        if self.state != self.CLOSED:
+            log.info("Circuit closed", endpoint=self.endpoint)
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def on_failure(self) -> None:
+        self._probe_in_flight = False
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                log.warning("Circuit opened", endpoint=self.endpoint, failures=self.failures)
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def on_cancel(self) -> None:
+        # Caller gave up (cancelled / deadline); don't leave a half-open probe stuck
+        self._probe_in_flight = False
+
+    def on_fatal(self) -> None:
+        # A non-retryable 4xx still proves the endpoint is up
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN:
+            self.on_success()
+
+    def on_throttled(self) -> None:
+        # Up but busy: leaves the failure count alone
+        self.on_fatal()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(url: str) -> CircuitBreaker:
+    # Same key as the limiter: one failing endpoint doesn't cut off its neighbours
+    key = service_key(url)
+    breaker = _breakers.get(key)
+    if breaker is None:
+        breaker = CircuitBreaker(key, settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_RESET_SECONDS)
+        _breakers[key] = breaker
+    return breaker
+
+
+def breaker_snapshot() -> Dict[str, Dict[str, Any]]:
+    return {key: {"state": b.state, "failures": b.failures} for key, b in _breakers.items()}
+
+
+_BREAKER_STATE_VALUES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+GaugeCallback(
+    "circuit_state",
+    "Circuit breaker state per downstream endpoint (0 closed, 1 half-open, 2 open)",
+    ["endpoint"],
+    lambda: [((key,), _BREAKER_STATE_VALUES[b.state]) for key, b in _breakers.items()],
+)
+
+
+def _status_label(exc: Exception) -> str:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return str(exc.response.status_code)
+    return "timeout" if isinstance(exc, httpx.TimeoutException) else "error"
+
+
+async def _attempt(client: httpx.AsyncClient, url: str, kwargs: Dict[str, Any], host: str, endpoint: str) -> httpx.Response:
+    started = time.monotonic()
+    status = "cancelled"
+    try:
+        response = await client.post(url, **kwargs)
+        status = str(response.status_code)
+        response.raise_for_status()
+        return response
+    except httpx.RequestError as e:
+        status = _status_label(e)
+        raise
+    finally:
+        DOWNSTREAM_LATENCY.observe(time.monotonic() - started, host, endpoint, status)
+
+
+async def _send(
+    client: httpx.AsyncClient,
+    url: str,
+    json_data: Dict[str, Any],
+    headers: Optional[Dict[str, str]],
+    timeout: Optional[float],
+    host: str,
+    endpoint: str,
+    hedge: bool = False,
+) -> httpx.Response:
+    """
+    One logical attempt. With `hedge`, a second copy is sent if the first has
+    not answered within the endpoint's observed HEDGE_PERCENTILE latency (and
+    the hedge budget and free capacity allow it); the first success wins and
+    the other copy is cancelled.
+    """
+    kwargs: Dict[str, Any] = {"json": json_data, "headers": headers}
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    limiter = get_limiter(url)
+
+    async def once() -> httpx.Response:
+        # Each copy holds a slot of the endpoint's process-wide limit (fair-queued)
+        async with limiter.slot():
+            return await _attempt(client, url, kwargs, host, endpoint)
+
+    delay = _hedge_delay(limiter) if hedge else None
+    if delay is None:
+        return await once()
+
+    budget = _hedge_budget(url)
+    budget.record_request()
+    primary = asyncio.create_task(once())
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return primary.result()
+        # Hedging into a saturated endpoint would only queue behind other work
+        if not limiter.has_capacity():
+            DOWNSTREAM_HEDGES.inc(endpoint, "saturated")
+            return await primary
+        if not budget.try_spend():
+            DOWNSTREAM_HEDGES.inc(endpoint, "budget_exhausted")
+            return await primary
+
+        DOWNSTREAM_HEDGES.inc(endpoint, "sent")
+        tasks.append(asyncio.create_task(once()))
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        DOWNSTREAM_HEDGES.inc(endpoint, "won")
+                    return task.result()
+                # A failed copy only counts once the other one has failed too
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def post_with_retry(
+    client: httpx.AsyncClient,
+    url: str,
+    json_data: Dict[str, Any],
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+    max_retries: Optional[int] = None,
+    budget: Optional[RetryBudget] = None,
+    hedge: bool = False,
+    deadline: Optional[float] = None,
+) -> httpx.Response:
+    """
+    Shared downstream POST used by every plugin:
+    circuit breaker -> adaptive limiter -> request, then retry only retryable
+    failures with decorrelated jitter (or the server's Retry-After), as long
+    as the run's retry budget allows it. `hedge` enables hedged attempts
+    (see _send); pass it only for calls that are safe to duplicate.
+    `deadline` (time.monotonic()) bounds the whole call: an attempt never
+    outlives it and no retry is started whose backoff would run past it;
+    DeadlineExceeded is raised instead.
+    """
+    max_retries = settings.RETRY_MAX_ATTEMPTS if max_retries is None else max_retries
+    breaker = get_breaker(url)
+    parsed = httpx.URL(url)
+    host, endpoint = parsed.netloc.decode(), parsed.path
+    delay = settings.RETRY_BASE_DELAY
+
+    if budget is not None:
+        budget.record_request()
+
+    for attempt in range(max_retries + 1):
+        remaining = None
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                DOWNSTREAM_FAILURES.inc(host, "none", "deadline")
+                raise DeadlineExceeded(url)
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            DOWNSTREAM_FAILURES.inc(host, "none", "circuit_open")
+            raise
+        try:
+            send = _send(client, url, json_data, headers, timeout, host, endpoint, hedge=hedge)
+            if remaining is not None and remaining < (settings.REQUEST_TIMEOUT if timeout is None else timeout):
+                # Cut off by our own deadline, not by the service: the attempt is
+                # cancelled, so neither the breaker nor the limiter count it as a failure
+                response = await asyncio.wait_for(send, remaining)
+            else:
+                response = await send
+        except asyncio.CancelledError:
+            breaker.on_cancel()
+            raise
+        except asyncio.TimeoutError:
+            breaker.on_cancel()
+            DOWNSTREAM_FAILURES.inc(host, "timeout", "deadline")
+            raise DeadlineExceeded(url) from None
+        except (httpx.HTTPStatusError, httpx.RequestError) as e:
+            status = _status_label(e)
+            if not is_retryable(e):
+                breaker.on_fatal()
+                DOWNSTREAM_FAILURES.inc(host, status, "non_retryable")
+                log.warning("Non-retryable downstream failure", url=url, status=status, error=str(e))
+                raise
+            if is_throttled(e):
+                breaker.on_throttled()
+            else:
+                breaker.on_failure()
+
+            if attempt == max_retries:
+                DOWNSTREAM_FAILURES.inc(host, status, "attempts_exhausted")
+                log.warning("Final downstream attempt failed", url=url, attempt=attempt + 1, status=status, error=str(e))
+                raise
+
+            delay = decorrelated_jitter(delay, settings.RETRY_BASE_DELAY, settings.RETRY_MAX_DELAY)
+            server_hint = retry_after_seconds(getattr(e, "response", None))
+            wait_time = min(max(delay, server_hint or 0.0), settings.RETRY_MAX_DELAY)
+            if deadline is not None and time.monotonic() + wait_time >= deadline:
+                # The retry could not even start before the deadline
+                DOWNSTREAM_FAILURES.inc(host, status, "deadline")
+                log.warning("No time left for a retry", url=url, status=status, error=str(e))
+                raise DeadlineExceeded(url) from e
+            if budget is not None and not budget.try_spend():
+                DOWNSTREAM_FAILURES.inc(host, status, "budget_exhausted")
+                log.warning("Retry budget exhausted", url=url, status=status, error=str(e))
+                raise
+            DOWNSTREAM_RETRIES.inc(host, status)
+            log.info(
+                "Retrying downstream call",
+                url=url,
+                attempt=attempt + 1,
+                status=status,
+                wait_seconds=round(wait_time, 2),
+                error=str(e),
+            )
+            await asyncio.sleep(wait_time)
+        else:
+            breaker.on_success()
+            return response
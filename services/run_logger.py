@@ -0,0 +1,283 @@
+# services/run_logger.py
+import asyncio
+import json
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+import httpx
+from config.settings import settings
+from services.http_client import auth_headers
+from services.log import get_logger
+from services.resilience import CircuitOpenError, RetryBudget, post_with_retry
+from services.spill import JsonlSpill
+
+log = get_logger("run_logger")
+
+PROJECT_NAME = "Semantic-Kernel-Agent"
+
+# Records no run could deliver; re-sent in the background after a later run's
+# own writes went through
+_spill = JsonlSpill(settings.LOG_SPILL_PATH, settings.LOG_SPILL_MAX_BYTES, "run_log")
+_resend_task: Optional[asyncio.Task] = None
+
+
+def schedule_resend(client: httpx.AsyncClient) -> None:
+    """
+    Start re-sending spilled records in one background task (no-op while one
+    runs). Without SERVICE_AUTH_TOKEN the spill is kept: the records were
+    stored without the caller's token and must not go out unauthenticated.
+    """
+    global _resend_task
+    if _resend_task is not None and not _resend_task.done():
+        return
+    if not settings.SERVICE_AUTH_TOKEN or not _spill.exists():
+        return
+    _resend_task = asyncio.create_task(resend_spilled(client))
+    _resend_task.add_done_callback(_resend_done)
+
+
+def _resend_done(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        log.error("Re-sending spilled run log records crashed", error=str(task.exception()))
+
+
+async def stop_resend() -> None:
+    """Shutdown: stop the background re-send; records not yet sent stay spilled."""
+    if _resend_task is not None and not _resend_task.done():
+        _resend_task.cancel()
+        await asyncio.gather(_resend_task, return_exceptions=True)
+
+
+async def resend_spilled(client: httpx.AsyncClient) -> None:
+    """Send spilled records again (with SERVICE_AUTH_TOKEN); stops at the first failure."""
+    url = f"{settings.COSMOSDB_API_URL}/api/records/semantic-kernel"
+    headers = auth_headers(settings.SERVICE_AUTH_TOKEN)
+    while True:
+        records = await _spill.take(settings.LOG_MAX_HELD_CHUNKS)
+        if not records:
+            return
+        sent = 0
+        try:
+            for record in records:
+                await post_with_retry(client, url, record, headers=headers)
+                sent += 1
+        except Exception as e:
+            log.warning("Re-sending spilled run log records failed", remaining=len(records) - sent, error=str(e))
+            return
+        finally:
+            # Failed or cancelled (shutdown): the rest goes back to the spill
+            if sent < len(records):
+                await asyncio.shield(_spill.append(records[sent:]))
+        log.info("Re-sent spilled run log records", records=len(records))
+
+
+class RunLogWriter:
+    """
+    Streams a run's results to the CosmosDB records API in chunks instead of
+    one huge document at the end.
+
+    A chunk is sealed when it reaches LOG_CHUNK_MAX_RECORDS items or
+    LOG_CHUNK_MAX_BYTES of serialized data, and in any case every
+    LOG_FLUSH_INTERVAL_SECONDS. Sealed chunks are sent by a background task; at most
+    LOG_MAX_PENDING_CHUNKS wait in memory, after which `add` blocks
+    (backpressure), so memory stays flat whatever the batch size.
+    `close` flushes the rest and writes a final summary record.
+
+    A record whose write fails (service down, circuit open) is held, in order,
+    and sent again once the circuit lets calls through; records still unsent
+    when the run ends (or beyond LOG_MAX_HELD_CHUNKS) go to the spill file
+    instead of being dropped. Retries come from the writer's own budget, so a
+    run with many failing items can't starve its log.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        run_id: str,
+        email: str,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        self.client = client
+        self.run_id = run_id
+        self.email = email
+        self.headers = headers
+        self.budget = RetryBudget()
+        self.url = f"{settings.COSMOSDB_API_URL}/api/records/semantic-kernel"
+
+        self._items: List[Dict[str, Any]] = []
+        self._lines: List[str] = []
+        self._bytes = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(settings.LOG_MAX_PENDING_CHUNKS, 1))
+        self._sender: Optional[asyncio.Task] = None
+        self._ticker: Optional[asyncio.Task] = None
+        # Failed records, oldest first, and when to try them again (time.monotonic())
+        self._held: Deque[Dict[str, Any]] = deque()
+        self._retry_at = 0.0
+        self._abort_spill: Optional[asyncio.Task] = None
+
+        self.counts: Dict[str, int] = {}
+        self.total = 0
+        self.chunks_written = 0
+        self.chunks_spilled = 0
+        self.chunks_lost = 0
+        self._chunk_index = 0
+
+    def start(self) -> None:
+        self._sender = asyncio.create_task(self._send_loop())
+        self._ticker = asyncio.create_task(self._tick_loop())
+
+    # -----------------------------
+    # Producer side
+    # -----------------------------
+    def count(self, project_status: Dict[str, Any]) -> None:
+        status = project_status.get("final_status", "UNKNOWN")
+        self.counts[status] = self.counts.get(status, 0) + 1
+        self.total += 1
+
+    async def add(self, project_status: Dict[str, Any], log_line: str) -> None:
+        self.count(project_status)
+        self._items.append(project_status)
+        self._lines.append(log_line)
+        self._bytes += len(json.dumps(project_status)) + len(log_line) + 1
+
+        if len(self._items) >= settings.LOG_CHUNK_MAX_RECORDS or self._bytes >= settings.LOG_CHUNK_MAX_BYTES:
+            await self._seal()
+
+    async def _seal(self) -> None:
+        if not self._items:
+            return
+        chunk = {
+            "project_name": PROJECT_NAME,
+            "run_id": self.run_id,
+            "status": "in_progress",
+            "payload": {
+                "user_email": self.email,
+                "chunk_index": self._chunk_index,
+                "full_console_output": "\n".join(self._lines),
+                "processed_items": self._items,
+                "timestamp": datetime.utcnow().isoformat(),
+            },
+        }
+        self._chunk_index += 1
+        self._items, self._lines, self._bytes = [], [], 0
+        await self._queue.put(chunk)
+
+    # -----------------------------
+    # Background tasks
+    # -----------------------------
+    async def _tick_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.LOG_FLUSH_INTERVAL_SECONDS)
+            await self._seal()
+
+    async def _send_loop(self) -> None:
+        while True:
+            chunk = await self._queue.get()
+            try:
+                if chunk is None:
+                    return
+                await self._deliver(chunk)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, record: Dict[str, Any]) -> None:
+        await self._retry_held()
+        # Behind held records (keeps the order) or failed now: hold it
+        if self._held or not await self._write(record):
+            self._held.append(record)
+            overflow = []
+            while len(self._held) > max(settings.LOG_MAX_HELD_CHUNKS, 0):
+                overflow.append(self._held.popleft())
+            await self._spill(overflow)
+
+    async def _retry_held(self) -> None:
+        while self._held and time.monotonic() >= self._retry_at:
+            if not await self._write(self._held[0]):
+                return
+            self._held.popleft()
+
+    async def _write(self, record: Dict[str, Any]) -> bool:
+        try:
+            await post_with_retry(self.client, self.url, record, headers=self.headers, budget=self.budget)
+            self.chunks_written += 1
+            return True
+        except CircuitOpenError as e:
+            # Try again once the breaker lets a probe through
+            self._retry_at = time.monotonic() + e.retry_in
+            log.warning("Run log write deferred, circuit open", run_id=self.run_id, retry_in=round(e.retry_in, 1))
+            return False
+        except Exception as e:
+            # Next try goes through the breaker again (CircuitOpenError above if it opened)
+            self._retry_at = time.monotonic() + settings.RETRY_BASE_DELAY
+            log.error("Run log write failed after retries, holding it", run_id=self.run_id, error=str(e))
+            return False
+
+    async def _spill(self, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        written = await _spill.append(records)
+        self.chunks_spilled += written
+        self.chunks_lost += len(records) - written
+        if written < len(records):
+            log.error("Run log records lost, spill file unavailable or full", run_id=self.run_id, records=len(records) - written)
+        else:
+            log.warning("Run log records spilled", run_id=self.run_id, records=written)
+
+    def abort(self) -> None:
+        """Stop background tasks without flushing (run was cancelled); held records are spilled."""
+        for task in (self._ticker, self._sender):
+            if task is not None:
+                task.cancel()
+        if self._held:
+            held, self._held = list(self._held), deque()
+            self._abort_spill = asyncio.create_task(self._spill(held))
+
+    async def close(self, extra: Optional[Dict[str, Any]] = None, summary: bool = True) -> None:
+        """
+        Flush buffered items, wait for the sender, then write the summary record
+        (skipped with summary=False when the run will be resumed elsewhere).
+        """
+        if self._ticker is not None:
+            self._ticker.cancel()
+        await self._seal()
+        if self._sender is not None:
+            await self._queue.put(None)
+            await self._sender
+
+        try:
+            if summary:
+                await self._deliver(self._summary(extra))
+            # Give held records until the drain deadline to get through
+            deadline = time.monotonic() + settings.LOG_RETRY_DRAIN_SECONDS
+            while self._held and time.monotonic() < deadline:
+                await asyncio.sleep(max(min(self._retry_at, deadline) - time.monotonic(), 0.0))
+                await self._retry_held()
+        finally:
+            # Also when shutdown cancels the drain
+            held, self._held = list(self._held), deque()
+            await self._spill(held)
+        if not held:
+            # Our writes go through: a good moment to send what earlier runs spilled
+            schedule_resend(self.client)
+
+    def _summary(self, extra: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "project_name": PROJECT_NAME,
+            "run_id": self.run_id,
+            "status": "completed",
+            "payload": {
+                "user_email": self.email,
+                "summary": {
+                    "total_items": self.total,
+                    "status_counts": self.counts,
+                    "chunks_written": self.chunks_written,
+                    "chunks_unsent": len(self._held),
+                    "chunks_spilled": self.chunks_spilled,
+                    "chunks_lost": self.chunks_lost,
+                    **(extra or {}),
+                },
+                "timestamp": datetime.utcnow().isoformat(),
+            },
+        }
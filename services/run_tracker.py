@@ -0,0 +1,257 @@
+# services/run_tracker.py
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+
+from config.settings import settings
+
+RUN_QUEUED = "QUEUED"
+RUN_RUNNING = "RUNNING"
+RUN_COMPLETED = "COMPLETED"
+RUN_FAILED = "FAILED"
+
+
+class RunState:
+    def __init__(self, run_id: str, email: Optional[str]):
+        self.run_id = run_id
+        self.email = email
+        self.status = RUN_RUNNING
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        # Every item, or for streamed runs only the ones in progress
+        self.items: Dict[int, Dict[str, Any]] = {}
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.dropped_events = 0
+
+        # Streamed runs (unbounded input) keep counts plus bounded windows of
+        # the most recent and the failed finished items instead of every item
+        self.streamed = False
+        self.finished_counts: Dict[str, int] = {}
+        self.recent: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self.failed: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+
+    def item_count(self) -> int:
+        return len(self.items) + sum(self.finished_counts.values())
+
+    def counts(self) -> Dict[str, int]:
+        counts = _count_statuses(self.items)
+        for status, n in self.finished_counts.items():
+            counts[status] = counts.get(status, 0) + n
+        return counts
+
+    def visible_items(self) -> Dict[int, Dict[str, Any]]:
+        return {**self.failed, **self.recent, **self.items}
+
+    def finish_item(self, index: int, status: Dict[str, Any]) -> None:
+        """Streamed runs: move a finished item from `items` into the counts and windows."""
+        self.items.pop(index, None)
+        final = status.get("final_status", "PENDING")
+        self.finished_counts[final] = self.finished_counts.get(final, 0) + 1
+        window, limit = (
+            (self.recent, settings.RUN_TRACKER_STREAMED_RECENT_ITEMS)
+            if final == "SUCCESS"
+            else (self.failed, settings.RUN_TRACKER_STREAMED_FAILED_ITEMS)
+        )
+        window[index] = status
+        while len(window) > max(limit, 0):
+            window.popitem(last=False)
+
+
+class RunTracker:
+    """
+    Live, in-memory view of batch runs: per-item / per-stage state plus a
+    pub/sub fan-out of stage transitions for the SSE endpoint.
+    Only the most recent RUN_TRACKER_MAX_RUNS runs are kept; older ones are
+    still visible through the job store. Streamed runs (/ingest) keep only
+    their in-progress items plus bounded windows of finished ones, so their
+    memory doesn't grow with the upload.
+    """
+
+    def __init__(self, max_runs: int = None):
+        self.max_runs = max_runs or settings.RUN_TRACKER_MAX_RUNS
+        self._runs: "OrderedDict[str, RunState]" = OrderedDict()
+
+    # -----------------------------
+    # Producer side (queue pipeline)
+    # -----------------------------
+    def register(self, run_id: str, email: Optional[str]) -> None:
+        """Track a run from the moment it is queued so clients can subscribe right away."""
+        if run_id not in self._runs:
+            state = RunState(run_id, email)
+            state.status = RUN_QUEUED
+            self._runs[run_id] = state
+            self._evict()
+
+    def start_run(
+        self, run_id: str, email: Optional[str], items: Dict[int, Dict[str, Any]], streamed: bool = False
+    ) -> None:
+        state = self._runs.get(run_id)
+        if state is None:
+            state = RunState(run_id, email)
+            self._runs[run_id] = state
+            self._evict()
+        state.status = RUN_RUNNING
+        state.started_at = time.time()
+        state.finished_at = None
+        state.streamed = streamed
+        state.items.update({i: _copy_status(ps) for i, ps in items.items()})
+        self._publish(state, {"event": "run_started", "item_count": state.item_count()})
+
+    def stage_changed(self, run_id: str, index: int, project_status: Dict[str, Any], stage: str) -> None:
+        state = self._runs.get(run_id)
+        if state is None:
+            return
+        state.items[index] = _copy_status(project_status)
+        self._publish(
+            state,
+            {
+                "event": "stage",
+                "index": index,
+                "project_id": project_status["project_id"],
+                "workbook_id": project_status["workbook_id"],
+                "stage": stage,
+                "status": project_status["steps"].get(stage),
+            },
+        )
+
+    def item_finished(self, run_id: str, index: int, project_status: Dict[str, Any]) -> None:
+        state = self._runs.get(run_id)
+        if state is None:
+            return
+        if state.streamed:
+            state.finish_item(index, _copy_status(project_status))
+        else:
+            state.items[index] = _copy_status(project_status)
+        self._publish(
+            state,
+            {
+                "event": "item_finished",
+                "index": index,
+                "project_id": project_status["project_id"],
+                "workbook_id": project_status["workbook_id"],
+                "final_status": project_status["final_status"],
+            },
+        )
+
+    def finish_run(self, run_id: str, status: str = RUN_COMPLETED) -> None:
+        state = self._runs.get(run_id)
+        if state is None:
+            return
+        state.status = status
+        state.finished_at = time.time()
+        self._publish(state, {"event": "run_finished", "status": status, "counts": state.counts()})
+        # Subscribers see None as end-of-stream
+        for queue in list(state.subscribers):
+            _offer(state, queue, None)
+
+    # -----------------------------
+    # Consumer side (API)
+    # -----------------------------
+    def snapshot(self, run_id: str, include_items: bool = True) -> Optional[Dict[str, Any]]:
+        state = self._runs.get(run_id)
+        if state is None:
+            return None
+        snap = {
+            "run_id": state.run_id,
+            "status": state.status,
+            "email": state.email,
+            "started_at": state.started_at,
+            "finished_at": state.finished_at,
+            "item_count": state.item_count(),
+            "counts": state.counts(),
+        }
+        if include_items:
+            items = state.visible_items()
+            snap["items"] = [{"index": i, **items[i]} for i in sorted(items)]
+            if state.streamed:
+                # Only in-progress, recent and failed items of a streamed run are kept
+                snap["items_truncated"] = len(items) < snap["item_count"]
+        return snap
+
+    def subscribe(self, run_id: str) -> Optional[asyncio.Queue]:
+        state = self._runs.get(run_id)
+        if state is None:
+            return None
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.RUN_EVENTS_QUEUE_SIZE)
+        if state.finished_at is not None:
+            queue.put_nowait(None)
+        state.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, run_id: str, queue: asyncio.Queue) -> None:
+        state = self._runs.get(run_id)
+        if state is not None:
+            state.subscribers.discard(queue)
+
+    # -----------------------------
+    # Internals
+    # -----------------------------
+    def _publish(self, state: RunState, event: Dict[str, Any]) -> None:
+        if not state.subscribers:
+            return
+        event = {"run_id": state.run_id, "ts": time.time(), **event}
+        for queue in list(state.subscribers):
+            _offer(state, queue, event)
+
+    def _evict(self) -> None:
+        # Drop the oldest finished runs first; never evict a run still in progress
+        while len(self._runs) > self.max_runs:
+            for run_id, state in self._runs.items():
+                if state.finished_at is not None:
+                    del self._runs[run_id]
+                    break
+            else:
+                break
+
+
+def _offer(state: RunState, queue: asyncio.Queue, event: Optional[Dict[str, Any]]) -> None:
+    # A slow SSE client must never block the pipeline: drop its events instead
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        state.dropped_events += 1
+
+
+def _copy_status(project_status: Dict[str, Any]) -> Dict[str, Any]:
+    # Shallow copy is enough: only the nested "steps" dict is mutated in place
+    return {**project_status, "steps": dict(project_status.get("steps", {}))}
+
+
+def _count_statuses(items: Dict[int, Dict[str, Any]]) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for status in items.values():
+        key = status.get("final_status", "PENDING")
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def job_snapshot(job, items: List, include_items: bool = True) -> Dict[str, Any]:
+    """Run view rebuilt from the durable job store (queued or evicted runs)."""
+    statuses: Dict[int, Dict[str, Any]] = {}
+    for it in items:
+        if it.result and "project_status" in it.result:
+            statuses[it.idx] = it.result["project_status"]
+        else:
+            statuses[it.idx] = {
+                "project_id": it.project_id,
+                "workbook_id": it.workbook_id,
+                "steps": {},
+                "final_status": "PENDING",
+            }
+    snap = {
+        "run_id": job.run_id,
+        "status": job.status,
+        "email": job.email,
+        "started_at": job.created_at,
+        "finished_at": job.updated_at if job.status in ("COMPLETED", "FAILED") else None,
+        "item_count": job.item_count,
+        "counts": _count_statuses(statuses),
+        "error": job.error,
+    }
+    if include_items:
+        snap["items"] = [{"index": i, **statuses[i]} for i in sorted(statuses)]
+    return snap
+
+
+run_tracker = RunTracker()
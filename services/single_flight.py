@@ -0,0 +1,81 @@
+# services/single_flight.py
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+def dedupe_pairs(pairs: List[Tuple[str, str]]) -> Tuple[List[Tuple[str, str]], int]:
+    """Drop repeated (project_id, workbook_id) pairs, keeping first-seen order. Returns (unique, duplicates)."""
+    seen = set()
+    unique: List[Tuple[str, str]] = []
+    for pair in pairs:
+        if pair in seen:
+            continue
+        seen.add(pair)
+        unique.append(pair)
+    return unique, len(pairs) - len(unique)
+
+
+def caller_key(email: Optional[str], token: Optional[str]) -> str:
+    """
+    Identity of the caller for in-flight sharing (single-flight): the email
+    plus a hash of the bearer token, never the token itself. Outcomes are
+    only shared between calls made with the same credentials.
+    """
+    token_hash = hashlib.sha256(token.encode()).hexdigest()[:16] if token else ""
+    return f"{email or ''}:{token_hash}"
+
+
+class SingleFlight:
+    """
+    In-process call coalescing: while a call for a key is in flight, further
+    callers with the same key wait for that call's outcome (result or
+    exception) instead of starting their own.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run `fn` once per in-flight key. Returns (result, shared) where shared means another caller ran it."""
+        while key in self._inflight:
+            future = self._inflight[key]
+            try:
+                result = await asyncio.shield(future)
+                self.shared += 1
+                return result, True
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    # We were cancelled ourselves
+                    raise
+                # The leader was cancelled: try again (possibly as the new leader)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.leaders += 1
+        try:
+            result = await fn()
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved: nobody may be waiting
+            future.exception()
+            raise
+        except BaseException:
+            # Cancelled: waiting callers retry on their own
+            future.cancel()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"in_flight": len(self._inflight), "leaders": self.leaders, "shared": self.shared}
+
+
+# Downstream stage calls keyed by (project_id, workbook_id, stage, caller_key), shared by the caller's runs
+stage_flights = SingleFlight()
@@ -0,0 +1,131 @@
+# services/spill.py
+"""
+Append-only JSONL overflow file for records that could not be sent yet
+(monitor events, run log chunks). All file I/O runs in a worker thread.
+
+Records are stored as given, so callers strip credentials first. A line that
+can't be parsed (partial write, manual edit) is skipped and logged instead
+of blocking everything behind it.
+
+take() reads from a persisted offset (`<file>.offset`) instead of rewriting
+the file, so draining is linear in the file size; the consumed prefix is
+cut off only once it is at least half the file (and COMPACT_MIN_BYTES).
+"""
+import asyncio
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from services.log import get_logger
+
+log = get_logger("spill")
+
+
+class JsonlSpill:
+    # Consumed bytes before the file is compacted
+    COMPACT_MIN_BYTES = 1_000_000
+
+    def __init__(self, path: Optional[str], max_bytes: int, name: str):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.path: Optional[Path] = None
+        self.offset_path: Optional[Path] = None
+        if path:
+            p = Path(path)
+            self.path = p if p.is_absolute() else Path(__file__).parent.parent / p
+            self.offset_path = self.path.with_name(self.path.name + ".offset")
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def exists(self) -> bool:
+        return self.path is not None and self.path.exists()
+
+    async def append(self, records: List[Dict[str, Any]]) -> int:
+        """Write records until the size cap; returns how many were written."""
+        if self.path is None or not records:
+            return 0
+        return await asyncio.to_thread(self._append, records)
+
+    def _append(self, records: List[Dict[str, Any]]) -> int:
+        written = 0
+        with self._lock:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                size = self.path.stat().st_size if self.path.exists() else 0
+                # Only unread bytes count against the cap
+                pending = size - self._read_offset(size)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    for record in records:
+                        if pending >= self.max_bytes:
+                            break
+                        line = json.dumps(record) + "\n"
+                        f.write(line)
+                        pending += len(line)
+                        written += 1
+            except OSError as e:
+                log.error("Spill write failed", spill=self.name, error=str(e))
+        return written
+
+    async def take(self, limit: int) -> List[Dict[str, Any]]:
+        """Remove and return up to `limit` records from the front of the file."""
+        if self.path is None or limit <= 0:
+            return []
+        return await asyncio.to_thread(self._take, limit)
+
+    def _take(self, limit: int) -> List[Dict[str, Any]]:
+        records: List[Dict[str, Any]] = []
+        with self._lock:
+            if not self.path.exists():
+                return records
+            try:
+                size = self.path.stat().st_size
+                with open(self.path, "rb") as f:
+                    f.seek(self._read_offset(size))
+                    while len(records) < limit:
+                        line = f.readline()
+                        if not line:
+                            break
+                        try:
+                            records.append(json.loads(line))
+                        except (json.JSONDecodeError, UnicodeDecodeError):
+                            snippet = line[:200].decode("utf-8", "replace")
+                            log.warning("Skipping corrupt spill line", spill=self.name, line=snippet)
+                    offset = f.tell()
+                if offset >= size:
+                    self.path.unlink()
+                    self.offset_path.unlink(missing_ok=True)
+                elif offset >= self.COMPACT_MIN_BYTES and offset * 2 >= size:
+                    self._compact(offset)
+                else:
+                    self._write_offset(offset)
+            except OSError as e:
+                log.error("Spill read failed", spill=self.name, error=str(e))
+        return records
+
+    def _read_offset(self, size: int) -> int:
+        try:
+            offset = int(self.offset_path.read_text())
+        except (OSError, ValueError):
+            return 0
+        # File replaced or truncated behind our back: start over
+        return offset if 0 <= offset <= size else 0
+
+    def _write_offset(self, offset: int) -> None:
+        tmp = self.offset_path.with_suffix(".tmp")
+        tmp.write_text(str(offset))
+        os.replace(tmp, self.offset_path)
+
+    def _compact(self, offset: int) -> None:
+        """Drop the consumed prefix (one copy of the unread rest)."""
+        tmp = self.path.with_suffix(".tmp")
+        with open(self.path, "rb") as src, open(tmp, "wb") as dst:
+            src.seek(offset)
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp, self.path)
+        self.offset_path.unlink(missing_ok=True)
@@ -0,0 +1,186 @@
+# services/stage_cache.py
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from config.settings import settings
+from services.log import get_logger
+
+log = get_logger("stage_cache")
+
+
+def stage_key(project_id: str, workbook_id: str, stage: str, *parts: Any) -> str:
+    """
+    Cache key of a workbook stage. `parts` narrow it further (cache version,
+    stage URL, ...): an entry only matches when every part is the same.
+    """
+    return json.dumps([project_id, workbook_id, stage, *parts], separators=(",", ":"))
+
+
+class StageCache:
+    """
+    Remembers which workbook stages already completed, so a resubmitted or
+    retried item skips the expensive stages it got through last time. Keys
+    come from stage_key(); entries expire after STAGE_CACHE_TTL_SECONDS.
+    This base class caches nothing (STAGE_CACHE_BACKEND=none, the default).
+    """
+
+    async def get(self, key: str) -> Optional[str]:
+        """run_id that completed the stage, or None if it has to run."""
+        return None
+
+    async def put(self, key: str, run_id: str) -> None:
+        return None
+
+    async def close(self) -> None:
+        return None
+
+    def snapshot(self) -> Dict[str, int]:
+        return {}
+
+
+class MemoryStageCache(StageCache):
+    """In-process LRU; lost on restart."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    async def put(self, key: str, run_id: str) -> None:
+        self._entries[key] = (time.time() + self.ttl, run_id)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class SQLiteStageCache(StageCache):
+    """Persistent cache in a local SQLite file; survives restarts."""
+
+    # Entries of the old (project_id, workbook_id, stage) table carry no
+    # version and are not read; the table is dropped
+    _SCHEMA = """
+    DROP TABLE IF EXISTS stage_cache;
+    CREATE TABLE IF NOT EXISTS stage_cache_entries (
+        key        TEXT PRIMARY KEY,
+        run_id     TEXT,
+        expires_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_stage_cache_entries_expiry ON stage_cache_entries (expires_at);
+    """
+
+    # Expired rows are purged every this many writes
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str, ttl: float):
+        db_path = Path(path)
+        if not db_path.is_absolute():
+            db_path = Path(__file__).parent.parent / db_path
+        self.path = db_path
+        self.ttl = ttl
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self._SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, fn, *args):
+        def _locked():
+            with self._lock:
+                return fn(self._connect(), *args)
+
+        return await asyncio.to_thread(_locked)
+
+    async def get(self, key: str) -> Optional[str]:
+        def _get(conn: sqlite3.Connection):
+            return conn.execute(
+                "SELECT run_id FROM stage_cache_entries WHERE key = ? AND expires_at >= ?",
+                (key, time.time()),
+            ).fetchone()
+
+        try:
+            row = await self._run(_get)
+        except sqlite3.Error as e:
+            # A cache problem must never fail the item: treat it as a miss
+            log.warning("Stage cache read failed", error=str(e))
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0] or ""
+
+    async def put(self, key: str, run_id: str) -> None:
+        self._writes += 1
+        purge = self._writes % self.PURGE_EVERY == 0
+
+        def _put(conn: sqlite3.Connection):
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO stage_cache_entries (key, run_id, expires_at) VALUES (?, ?, ?)",
+                (key, run_id, now + self.ttl),
+            )
+            if purge:
+                conn.execute("DELETE FROM stage_cache_entries WHERE expires_at < ?", (now,))
+
+        try:
+            await self._run(_put)
+        except sqlite3.Error as e:
+            log.warning("Stage cache write failed", error=str(e))
+
+    async def close(self) -> None:
+        def _close():
+            with self._lock:
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+
+        await asyncio.to_thread(_close)
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def create_stage_cache() -> StageCache:
+    backend = (settings.STAGE_CACHE_BACKEND or "none").lower()
+    if backend == "memory":
+        return MemoryStageCache(settings.STAGE_CACHE_MAX_ENTRIES, settings.STAGE_CACHE_TTL_SECONDS)
+    if backend == "sqlite":
+        return SQLiteStageCache(settings.STAGE_CACHE_PATH, settings.STAGE_CACHE_TTL_SECONDS)
+    if backend != "none":
+        raise ValueError(f"Unknown STAGE_CACHE_BACKEND: {settings.STAGE_CACHE_BACKEND}")
+    return StageCache()
+
+
+stage_cache = create_stage_cache()
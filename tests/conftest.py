@@ -0,0 +1,22 @@
+# tests/conftest.py
+"""
+Dummy values for the Settings fields without defaults, set before any test
+module imports config.settings. Values already in the environment win.
+Nothing here is ever called: tests patch the URLs or mock the transport.
+"""
+import os
+
+_TEST_ENV = {
+    "ASSESSMENT_API_URL": "http://assessment.test",
+    "PARSING_API_URL": "http://parsing.test",
+    "MAPPING_API_URL": "http://mapping.test",
+    "COSMOSDB_API_URL": "http://records.test",
+    "MONITORING_AGENT_URL": "http://monitor.test",
+    "REQUEST_TIMEOUT": "5",
+    "AZURE_OPENAI_API_KEY": "test-key",
+    "AZURE_OPENAI_ENDPOINT": "https://openai.test",
+    "AZURE_OPENAI_DEPLOYMENT_NAME": "test-deployment",
+}
+
+for _name, _value in _TEST_ENV.items():
+    os.environ.setdefault(_name, _value)
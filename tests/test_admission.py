@@ -0,0 +1,37 @@
+# tests/test_admission.py
+import asyncio
+
+import pytest
+
+from config.settings import settings
+from services.admission import AdmissionController, AdmissionRejected
+
+
+class FakeStore:
+    def __init__(self, pending: int):
+        self.pending = pending
+
+    async def pending_item_count(self) -> int:
+        return self.pending
+
+
+def test_streamed_items_are_checked_against_the_cap(monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_MAX_PENDING_ITEMS", 3)
+
+    async def scenario():
+        controller = AdmissionController(FakeStore(pending=1))
+        ticket = await controller.open_stream()
+        await ticket.started()
+        await ticket.started()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await ticket.started()
+        # A finished item frees its slot again
+        ticket.finished()
+        await ticket.started()
+        ticket.close()
+        return rejected.value, controller
+
+    rejected, controller = asyncio.run(scenario())
+    assert rejected.status_code == 429 and rejected.retry_after is not None
+    assert controller.direct_inflight == 0
+    assert controller.rejected == 1
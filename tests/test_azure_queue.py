@@ -0,0 +1,62 @@
+# tests/test_azure_queue.py
+import asyncio
+import json
+
+from config.settings import settings
+from models.schemas import QueueRequest
+from services.azure_queue import MemoryQueue, QueueConsumer
+
+
+def _message(items: int) -> str:
+    return json.dumps({"email": "a@b.c", "items": [{"project_id": f"p{i}", "workbook_id": "w"} for i in range(items)]})
+
+
+async def _consume_once(runner, content: str):
+    queue, dead_letter = MemoryQueue("work"), MemoryQueue("dead")
+    await queue.send(content)
+    consumer = QueueConsumer(queue, dead_letter, runner)
+    await consumer._process_batch(await consumer._receive())
+    return queue, dead_letter, consumer
+
+
+class NeverCalledRunner:
+    async def run_batch(self, items, **kwargs):
+        raise AssertionError("run_batch must not be called")
+
+
+def test_batch_over_admission_cap_is_dead_lettered_at_once(monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_MAX_PENDING_ITEMS", 1)
+    queue, dead_letter, consumer = asyncio.run(_consume_once(NeverCalledRunner(), _message(2)))
+    assert len(queue) == 0
+    assert len(dead_letter) == 1
+    assert consumer.stats["retried"] == 0
+
+
+def test_validation_error_during_run_is_dead_lettered(monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_MAX_PENDING_ITEMS", 100)
+
+    class InvalidRunner:
+        async def run_batch(self, items, **kwargs):
+            QueueRequest.model_validate({"items": "not a list"})
+
+    queue, dead_letter, consumer = asyncio.run(_consume_once(InvalidRunner(), _message(1)))
+    assert len(queue) == 0
+    assert len(dead_letter) == 1
+    assert consumer.stats["retried"] == 0
+
+
+def test_messages_are_released_at_once_while_shutting_down(monkeypatch):
+    from services.azure_queue import admission
+
+    monkeypatch.setattr(settings, "ADMISSION_MAX_PENDING_ITEMS", 100)
+    monkeypatch.setattr(admission, "accepting", False)
+
+    async def scenario():
+        queue, dead_letter, consumer = await _consume_once(NeverCalledRunner(), _message(1))
+        # Visible again without waiting for AZURE_QUEUE_RETRY_DELAY_SECONDS
+        return queue, dead_letter, consumer, await queue.receive(10, 30)
+
+    queue, dead_letter, consumer, redelivered = asyncio.run(scenario())
+    assert len(redelivered) == 1
+    assert len(dead_letter) == 0
+    assert consumer.stats["retried"] == 0
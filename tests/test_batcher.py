@@ -0,0 +1,26 @@
+# tests/test_batcher.py
+import asyncio
+
+from services.batcher import MicroBatcher
+
+
+def test_concurrent_batches_are_capped():
+    async def scenario():
+        state = {"in_flight": 0, "peak": 0}
+
+        async def send_batch(payloads):
+            state["in_flight"] += 1
+            state["peak"] = max(state["peak"], state["in_flight"])
+            await asyncio.sleep(0.02)
+            state["in_flight"] -= 1
+            return [p["n"] for p in payloads]
+
+        batcher = MicroBatcher("test", send_batch, max_batch_size=2, max_wait=0.01, max_concurrent=2)
+        results = await asyncio.gather(*(batcher.submit({"n": i}) for i in range(20)))
+        await batcher.close()
+        return results, state["peak"], batcher.batches_sent
+
+    results, peak, batches = asyncio.run(scenario())
+    assert results == list(range(20))
+    assert peak == 2
+    assert batches == 10
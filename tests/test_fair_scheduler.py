@@ -0,0 +1,42 @@
+# tests/test_fair_scheduler.py
+import asyncio
+
+from services.fair_scheduler import FairQueue, Flow
+
+
+def test_idle_runs_and_requesters_are_dropped():
+    async def scenario():
+        queue = FairQueue()
+        loop = asyncio.get_running_loop()
+        for i in range(5000):
+            queue.push(Flow(email=f"user{i % 50}", run_id=f"run{i}"), loop.create_future())
+            assert queue.pop() is not None
+        # Cancelled waiters don't leave their run behind either
+        cancelled = loop.create_future()
+        queue.push(Flow(email="gone", run_id="gone"), cancelled)
+        cancelled.cancel()
+        assert queue.pop() is None
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert queue._tenants == {}
+    assert queue.snapshot() == {"waiting": 0, "requesters": 0, "runs": 0}
+
+
+def test_small_run_is_served_between_backfill_requests():
+    async def scenario():
+        queue = FairQueue()
+        loop = asyncio.get_running_loop()
+        order = {}
+        for i in range(20):
+            future = loop.create_future()
+            order[future] = "backfill"
+            queue.push(Flow(email="a", run_id="backfill"), future)
+        queue.pop()
+        for i in range(3):
+            future = loop.create_future()
+            order[future] = "small"
+            queue.push(Flow(email="b", run_id="small"), future)
+        return [order[queue.pop()] for _ in range(6)]
+
+    assert asyncio.run(scenario()).count("small") == 3
@@ -0,0 +1,44 @@
+# tests/test_ingest.py
+import asyncio
+
+from config.settings import settings
+from services.ingest import FORMAT_NDJSON, IngestStats, parse_items
+
+
+def _parse(body: bytes):
+    async def chunks():
+        yield body
+
+    async def collect():
+        stats = IngestStats()
+        items = [item async for item in parse_items(chunks(), FORMAT_NDJSON, stats)]
+        return items, stats
+
+    return asyncio.run(collect())
+
+
+def _line(pid: str) -> bytes:
+    return b'{"project_id": "%s", "workbook_id": "w"}\n' % pid.encode()
+
+
+def test_duplicates_collapsed_within_window(monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_DEDUPE_WINDOW", 2)
+    items, stats = _parse(_line("a") + _line("a") + _line("b") + _line("c") + _line("a"))
+    # "a" left the 2-pair window once "b" and "c" were seen
+    assert [pid for _, pid, _ in items] == ["a", "b", "c", "a"]
+    assert stats.duplicates == 1
+
+
+def test_dedupe_can_be_turned_off(monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_DEDUPE_WINDOW", 0)
+    items, stats = _parse(_line("a") + _line("a"))
+    assert len(items) == 2 and stats.duplicates == 0
+
+
+def test_over_long_line_within_one_chunk_is_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_MAX_LINE_BYTES", 60)
+    long_line = b'{"project_id": "%s", "workbook_id": "w"}\n' % (b"x" * 40)
+    items, stats = _parse(_line("a") + long_line + _line("b") + long_line.rstrip(b"\n"))
+    assert [pid for _, pid, _ in items] == ["a", "b"]
+    assert [e["line"] for e in stats.errors] == [2, 4]
+    assert {e["error"] for e in stats.errors} == {"line too long"}
@@ -0,0 +1,97 @@
+# tests/test_job_store.py
+import asyncio
+import sqlite3
+import time
+
+from services.job_store import JOB_COMPLETED, JOB_FAILED, SQLiteJobStore
+
+
+def test_token_is_kept_only_until_the_job_finishes(tmp_path):
+    async def scenario():
+        store = SQLiteJobStore(str(tmp_path / "jobs.db"))
+        await store.enqueue("run-1", "a@b.c", [("p", "w")], token="secret")
+        await store.enqueue("run-2", "a@b.c", [("p", "w")], token="secret")
+        claimed = await store.claim_next("worker", 60)
+        await store.release(claimed.run_id, "worker")
+        released = await store.get_job(claimed.run_id)
+
+        await store.finish("run-1", JOB_COMPLETED)
+        await store.finish("run-2", JOB_FAILED, error="boom")
+        finished = [await store.get_job("run-1"), await store.get_job("run-2")]
+        await store.close()
+        return released, finished
+
+    released, finished = asyncio.run(scenario())
+    # A released job resumes later and still needs its credentials
+    assert released.token == "secret"
+    assert [job.token for job in finished] == [None, None]
+
+
+def test_opening_the_store_clears_tokens_of_finished_jobs(tmp_path):
+    path = tmp_path / "jobs.db"
+
+    async def setup():
+        store = SQLiteJobStore(str(path))
+        await store.enqueue("done", "a@b.c", [("p", "w")], token="secret")
+        await store.enqueue("queued", "a@b.c", [("p", "w")], token="secret")
+        await store.close()
+
+    asyncio.run(setup())
+    # Finished by a release that did not clear tokens
+    conn = sqlite3.connect(str(path))
+    conn.execute("UPDATE jobs SET status = ? WHERE run_id = 'done'", (JOB_COMPLETED,))
+    conn.commit()
+    conn.close()
+
+    async def reopen():
+        store = SQLiteJobStore(str(path))
+        jobs = [await store.get_job("done"), await store.get_job("queued")]
+        await store.close()
+        return jobs
+
+    done, queued = asyncio.run(reopen())
+    assert done.token is None
+    assert queued.token == "secret"
+
+
+def test_completed_stages_are_stored_per_item(tmp_path):
+    async def scenario():
+        store = SQLiteJobStore(str(tmp_path / "jobs.db"))
+        await store.enqueue("run", "a@b.c", [("p1", "w"), ("p2", "w")], completed_stages=[["assessment"], []])
+        items = await store.get_items("run")
+        await store.close()
+        return [item.completed_stages for item in items]
+
+    assert asyncio.run(scenario()) == [["assessment"], []]
+
+
+def test_finished_jobs_are_purged_after_retention(tmp_path):
+    async def scenario():
+        store = SQLiteJobStore(str(tmp_path / "jobs.db"))
+        await store.enqueue("old", "a@b.c", [("p", "w")])
+        await store.enqueue("live", "a@b.c", [("p", "w")])
+        await store.finish("old", JOB_COMPLETED)
+        purged = await store.purge_finished(time.time() + 1)
+        jobs = [await store.get_job("old"), await store.get_job("live")]
+        items = await store.get_items("old")
+        await store.close()
+        return purged, jobs, items
+
+    purged, (old, live), items = asyncio.run(scenario())
+    assert purged == 1
+    assert old is None and items == []
+    assert live is not None
+
+
+def test_graceful_release_does_not_use_up_an_attempt(tmp_path):
+    async def scenario():
+        store = SQLiteJobStore(str(tmp_path / "jobs.db"))
+        await store.enqueue("run", "a@b.c", [("p", "w")])
+        for _ in range(3):
+            job = await store.claim_next("worker", 60)
+            await store.release(job.run_id, "worker")
+        job = await store.claim_next("worker", 60)
+        await store.close()
+        return job.attempts
+
+    assert asyncio.run(scenario()) == 1
@@ -0,0 +1,37 @@
+# tests/test_job_worker.py
+import asyncio
+
+from config.settings import settings
+from services.job_store import JOB_FAILED, SQLiteJobStore
+from services.job_worker import JobWorkerPool
+
+
+class NeverCalledRunner:
+    async def run_batch(self, items, **kwargs):
+        raise AssertionError("run_batch must not be called")
+
+
+def test_job_over_max_attempts_is_failed_not_leased_again(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(settings, "JOB_LEASE_SECONDS", 0)
+    monkeypatch.setattr(settings, "JOB_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(settings, "JOB_RETENTION_SECONDS", 0)
+
+    async def scenario():
+        store = SQLiteJobStore(str(tmp_path / "jobs.db"))
+        await store.enqueue("run", "a@b.c", [("p", "w")], token="secret")
+        # Two workers that died mid-run (lease expires at once)
+        for _ in range(2):
+            await store.claim_next("crashed", 0)
+        pool = JobWorkerPool(store, NeverCalledRunner(), workers=1)
+        pool.start()
+        await asyncio.sleep(0.2)
+        await pool.stop()
+        job = await store.get_job("run")
+        await store.close()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.status == JOB_FAILED
+    assert "Gave up after 2 attempts" in job.error
+    assert job.token is None
@@ -0,0 +1,45 @@
+# tests/test_monitor_reporter.py
+import asyncio
+
+from config.settings import settings
+from services.monitor_reporter import MonitorReporter
+from services.spill import JsonlSpill
+
+
+def _reporter(tmp_path) -> MonitorReporter:
+    reporter = MonitorReporter()
+    reporter._spill_file = JsonlSpill(str(tmp_path / "monitor.jsonl"), 10_000_000, "test")
+    return reporter
+
+
+def _event(i: int):
+    return {"run_id": "r", "project_id": f"p{i}", "workbook_id": "w", "status": "SUCCESS"}
+
+
+def test_spill_strips_token_and_resend_uses_service_token(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SERVICE_AUTH_TOKEN", "service")
+    reporter = _reporter(tmp_path)
+
+    async def scenario():
+        await reporter._spill([(_event(1), {"Authorization": "Bearer caller", "X-Trace": "t"})])
+        assert b"caller" not in (tmp_path / "monitor.jsonl").read_bytes()
+        await reporter._unspill()
+
+    asyncio.run(scenario())
+    (_, headers), = reporter._pending.values()
+    assert headers == {"X-Trace": "t", "Authorization": "Bearer service"}
+
+
+def test_corrupt_spill_line_is_skipped(tmp_path):
+    reporter = _reporter(tmp_path)
+
+    async def scenario():
+        await reporter._spill([(_event(1), None)])
+        with open(tmp_path / "monitor.jsonl", "a", encoding="utf-8") as f:
+            f.write('{"payload": {"run_id": "r", "proj\n')
+        await reporter._spill([(_event(2), None)])
+        await reporter._unspill()
+
+    asyncio.run(scenario())
+    assert sorted(key[1] for key in reporter._pending) == ["p1", "p2"]
+    assert not (tmp_path / "monitor.jsonl").exists()
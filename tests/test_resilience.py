@@ -0,0 +1,64 @@
+# tests/test_resilience.py
+import asyncio
+
+import httpx
+import pytest
+
+from config.settings import settings
+from services import resilience
+from services.resilience import CircuitBreaker, CircuitOpenError, get_breaker, post_with_retry
+
+BASE = "http://downstream.test"
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(settings, "RETRY_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(settings, "RETRY_BASE_DELAY", 0.001)
+    monkeypatch.setattr(settings, "RETRY_MAX_DELAY", 0.001)
+    monkeypatch.setattr(settings, "CIRCUIT_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(resilience, "_breakers", {})
+
+
+def _client(failing_path: str, status: int, headers=None) -> httpx.AsyncClient:
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == failing_path:
+            return httpx.Response(status, headers=headers)
+        return httpx.Response(200, json={"success": True})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def _burst(client: httpx.AsyncClient, url: str, calls: int) -> None:
+    for _ in range(calls):
+        try:
+            await post_with_retry(client, url, {})
+        except (httpx.HTTPStatusError, CircuitOpenError):
+            pass
+
+
+def test_throttling_does_not_open_circuit_for_other_endpoints():
+    async def scenario():
+        async with _client("/api/assessment", 429, {"Retry-After": "0"}) as client:
+            await _burst(client, f"{BASE}/api/assessment", 20)
+
+            assert get_breaker(f"{BASE}/api/assessment").state == CircuitBreaker.CLOSED
+            for path in ("/api/records/semantic-kernel", "/monitor/report"):
+                response = await post_with_retry(client, f"{BASE}{path}", {})
+                assert response.status_code == 200
+
+    asyncio.run(scenario())
+
+
+def test_failing_endpoint_opens_only_its_own_circuit():
+    async def scenario():
+        async with _client("/api/assessment", 500) as client:
+            await _burst(client, f"{BASE}/api/assessment", 5)
+
+            assert get_breaker(f"{BASE}/api/assessment").state == CircuitBreaker.OPEN
+            with pytest.raises(CircuitOpenError):
+                await post_with_retry(client, f"{BASE}/api/assessment", {})
+            response = await post_with_retry(client, f"{BASE}/mapping", {})
+            assert response.status_code == 200
+
+    asyncio.run(scenario())
@@ -0,0 +1,102 @@
+# tests/test_run_logger.py
+import asyncio
+
+import httpx
+import pytest
+
+from config.settings import settings
+from services import resilience, run_logger
+from services.run_logger import RunLogWriter
+from services.spill import JsonlSpill
+
+
+@pytest.fixture(autouse=True)
+def fast_settings(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "COSMOSDB_API_URL", "http://records.test")
+    monkeypatch.setattr(settings, "SERVICE_AUTH_TOKEN", "service-token")
+    monkeypatch.setattr(run_logger, "_resend_task", None)
+    monkeypatch.setattr(settings, "RETRY_MAX_ATTEMPTS", 0)
+    monkeypatch.setattr(settings, "RETRY_BASE_DELAY", 0.01)
+    monkeypatch.setattr(settings, "CIRCUIT_FAILURE_THRESHOLD", 1)
+    monkeypatch.setattr(settings, "CIRCUIT_RESET_SECONDS", 0.2)
+    monkeypatch.setattr(settings, "LOG_CHUNK_MAX_RECORDS", 1)
+    monkeypatch.setattr(settings, "LOG_RETRY_DRAIN_SECONDS", 0.3)
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(run_logger, "_spill", JsonlSpill(str(tmp_path / "spill.jsonl"), 10_000_000, "test"))
+
+
+def _client(state):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if state["down"]:
+            return httpx.Response(503)
+        state["received"].append(request.content)
+        return httpx.Response(200, json={"success": True})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def _run(writer: RunLogWriter, items: int) -> None:
+    writer.start()
+    for i in range(items):
+        await writer.add({"final_status": "COMPLETED", "idx": i}, f"item {i}")
+
+
+def test_chunks_held_while_circuit_open_are_sent_after_recovery():
+    async def scenario():
+        state = {"down": True, "received": []}
+        async with _client(state) as client:
+            writer = RunLogWriter(client, "run-1", "a@b.c")
+            await _run(writer, 3)
+            await asyncio.sleep(0.05)
+            state["down"] = False
+            await writer.close()
+        # 3 chunks + summary, nothing lost or spilled
+        assert len(state["received"]) == 4
+        assert writer.chunks_spilled == 0 and writer.chunks_lost == 0
+
+    asyncio.run(scenario())
+
+
+def test_unsent_chunks_are_spilled_and_resent_by_a_later_run():
+    async def scenario():
+        state = {"down": True, "received": []}
+        async with _client(state) as client:
+            writer = RunLogWriter(client, "run-1", "a@b.c", headers={"Authorization": "Bearer secret"})
+            await _run(writer, 2)
+            await writer.close()
+            assert writer.chunks_spilled == 3 and not state["received"]
+            assert b"secret" not in run_logger._spill.path.read_bytes()
+
+            state["down"] = False
+            await asyncio.sleep(settings.CIRCUIT_RESET_SECONDS)
+            later = RunLogWriter(client, "run-2", "a@b.c")
+            await _run(later, 1)
+            await later.close()
+            # close() only schedules the re-send; run-2's chunk + summary are in
+            assert len(state["received"]) == 2
+            await run_logger._resend_task
+        # then run-1's 2 chunks + summary from the spill
+        assert len(state["received"]) == 5
+        assert not run_logger._spill.exists()
+
+    asyncio.run(scenario())
+
+
+def test_spill_is_kept_without_a_service_token(monkeypatch):
+    monkeypatch.setattr(settings, "SERVICE_AUTH_TOKEN", None)
+
+    async def scenario():
+        state = {"down": True, "received": []}
+        async with _client(state) as client:
+            writer = RunLogWriter(client, "run-1", "a@b.c")
+            await _run(writer, 1)
+            await writer.close()
+            state["down"] = False
+            await asyncio.sleep(settings.CIRCUIT_RESET_SECONDS)
+            later = RunLogWriter(client, "run-2", "a@b.c")
+            await later.close()
+            assert run_logger._resend_task is None
+        assert len(state["received"]) == 1
+        assert run_logger._spill.exists()
+
+    asyncio.run(scenario())
@@ -0,0 +1,37 @@
+# tests/test_run_tracker.py
+from config.settings import settings
+from services.run_tracker import RunTracker
+
+
+def _status(i: int, final: str = "PENDING"):
+    return {"project_id": f"p{i}", "workbook_id": "w", "steps": {"assessment": "RUNNING"}, "final_status": final}
+
+
+def test_streamed_run_keeps_counts_and_bounded_windows(monkeypatch):
+    monkeypatch.setattr(settings, "RUN_TRACKER_STREAMED_RECENT_ITEMS", 5)
+    monkeypatch.setattr(settings, "RUN_TRACKER_STREAMED_FAILED_ITEMS", 3)
+    tracker = RunTracker()
+    tracker.start_run("run", "a@b.c", {}, streamed=True)
+
+    for i in range(1000):
+        tracker.stage_changed("run", i, _status(i), "assessment")
+        tracker.item_finished("run", i, _status(i, "FAILED" if i % 10 == 0 else "SUCCESS"))
+    tracker.stage_changed("run", 1000, _status(1000), "assessment")
+
+    snap = tracker.snapshot("run")
+    assert snap["item_count"] == 1001
+    assert snap["counts"] == {"SUCCESS": 900, "FAILED": 100, "PENDING": 1}
+    # 5 recent successes + 3 recent failures + 1 in progress
+    assert len(snap["items"]) == 9
+    assert snap["items_truncated"] is True
+
+
+def test_regular_run_keeps_every_item():
+    tracker = RunTracker()
+    tracker.start_run("run", "a@b.c", {i: _status(i) for i in range(50)})
+    for i in range(50):
+        tracker.item_finished("run", i, _status(i, "SUCCESS"))
+
+    snap = tracker.snapshot("run")
+    assert len(snap["items"]) == 50
+    assert "items_truncated" not in snap
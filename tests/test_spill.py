@@ -0,0 +1,51 @@
+# tests/test_spill.py
+import asyncio
+
+from services.spill import JsonlSpill
+
+
+def test_take_drains_in_order_and_removes_the_files(tmp_path):
+    spill = JsonlSpill(str(tmp_path / "spill.jsonl"), 10_000_000, "test")
+
+    async def scenario():
+        await spill.append([{"n": i} for i in range(100)])
+        taken = []
+        while True:
+            records = await spill.take(16)
+            if not records:
+                return taken
+            taken.extend(records)
+            # Appends while draining land behind the unread records
+            if len(taken) == 16:
+                await spill.append([{"n": 100}])
+
+    assert [r["n"] for r in asyncio.run(scenario())] == list(range(101))
+    assert not spill.exists()
+    assert not spill.offset_path.exists()
+
+
+def test_take_reads_from_the_offset_and_compacts_rarely(tmp_path, monkeypatch):
+    monkeypatch.setattr(JsonlSpill, "COMPACT_MIN_BYTES", 200)
+    spill = JsonlSpill(str(tmp_path / "spill.jsonl"), 10_000_000, "test")
+
+    async def scenario():
+        await spill.append([{"n": i} for i in range(40)])
+        size = spill.path.stat().st_size
+        await spill.take(5)
+        # Consumed prefix is small: file untouched, only the offset moves
+        assert spill.path.stat().st_size == size
+        assert int(spill.offset_path.read_text()) > 0
+        await spill.take(20)
+        # More than half consumed: compacted, offset reset
+        assert spill.path.stat().st_size < size / 2
+        assert not spill.offset_path.exists()
+        return await spill.take(100)
+
+    assert [r["n"] for r in asyncio.run(scenario())] == list(range(25, 40))
+
+
+def test_corrupt_lines_are_skipped(tmp_path):
+    path = tmp_path / "spill.jsonl"
+    path.write_text('{"n": 1}\nnot json\n{"n": 2}\n')
+    spill = JsonlSpill(str(path), 10_000_000, "test")
+    assert asyncio.run(spill.take(10)) == [{"n": 1}, {"n": 2}]
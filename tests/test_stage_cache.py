@@ -0,0 +1,129 @@
+# tests/test_stage_cache.py
+import asyncio
+
+import httpx
+import pytest
+
+from config.settings import settings
+from services import batch_runner, http_client, resilience, run_logger
+from services.batch_runner import BatchRunner
+from services.spill import JsonlSpill
+from services.stage_cache import MemoryStageCache, SQLiteStageCache, StageCache, stage_key
+
+
+class RecordingRunner(BatchRunner):
+    """Downstream calls are recorded and answered with 200; nothing leaves the process."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def _post_with_retry(self, client, url, json_data, headers=None, budget=None, hedge=False, deadline=None):
+        self.calls.append((url, json_data.get("workbook_id"), (headers or {}).get("Authorization")))
+        return httpx.Response(200, json={"success": True}, request=httpx.Request("POST", url))
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    cache = MemoryStageCache(100, 3600)
+    monkeypatch.setattr(batch_runner, "stage_cache", cache)
+    monkeypatch.setattr(settings, "START_JITTER_SECONDS", 0, raising=False)
+    # Run log and monitoring traffic goes through the shared client: answer it locally
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json={})))
+    monkeypatch.setattr(http_client, "_client", client)
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(run_logger, "_spill", JsonlSpill(str(tmp_path / "spill.jsonl"), 10_000_000, "test"))
+    return cache
+
+
+STAGE_PATHS = ("/api/assessment", "/parse-xml", "/mapping")
+
+
+def _stage_calls(runner):
+    return [call for call in runner.calls if call[0].endswith(STAGE_PATHS)]
+
+
+def _run(runner, run_id, **kwargs):
+    return asyncio.run(runner.run_batch([(0, "p1", "w1")], run_id=run_id, email="a@b.c", **kwargs))
+
+
+def test_resubmission_skips_cached_stages_unless_forced(cache):
+    runner = RecordingRunner()
+    first = _run(runner, "run-1")
+    assert first[0]["final_status"] == "SUCCESS"
+    assert len(_stage_calls(runner)) == 3
+
+    runner.calls.clear()
+    second = _run(runner, "run-2")
+    assert second[0]["final_status"] == "SUCCESS"
+    assert _stage_calls(runner) == []
+
+    forced = _run(runner, "run-3", force=True)
+    assert forced[0]["final_status"] == "SUCCESS"
+    assert len(_stage_calls(runner)) == 3
+
+
+def test_new_cache_version_does_not_reuse_completions(cache, monkeypatch):
+    runner = RecordingRunner()
+    _run(runner, "run-1")
+    runner.calls.clear()
+
+    monkeypatch.setattr(settings, "STAGE_CACHE_VERSION", "2")
+    _run(runner, "run-2")
+    assert len(_stage_calls(runner)) == 3
+
+
+def test_sqlite_cache_matches_on_every_key_part(tmp_path):
+    async def scenario():
+        cache = SQLiteStageCache(str(tmp_path / "cache.db"), 3600)
+        await cache.put(stage_key("p", "w", "parsing", "1", "http://a"), "run-1")
+        hit = await cache.get(stage_key("p", "w", "parsing", "1", "http://a"))
+        other_url = await cache.get(stage_key("p", "w", "parsing", "1", "http://b"))
+        other_version = await cache.get(stage_key("p", "w", "parsing", "2", "http://a"))
+        await cache.close()
+        return hit, other_url, other_version
+
+    assert asyncio.run(scenario()) == ("run-1", None, None)
+
+
+def test_cached_completions_are_per_requester_not_per_token(cache):
+    runner = RecordingRunner()
+    _run(runner, "run-1", token="token-a")
+    runner.calls.clear()
+
+    # Same requester with a refreshed token: still cached
+    _run(runner, "run-2", token="token-b")
+    assert _stage_calls(runner) == []
+
+    asyncio.run(runner.run_batch([(0, "p1", "w1")], run_id="run-3", email="c@d.e", token="token-c"))
+    assert [call[2] for call in _stage_calls(runner)] == ["Bearer token-c"] * 3
+
+
+def test_single_flight_is_not_shared_across_callers(monkeypatch, cache):
+    monkeypatch.setattr(batch_runner, "stage_cache", MemoryStageCache(100, 0))
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_ENABLED", True)
+
+    class SlowRunner(RecordingRunner):
+        async def _post_with_retry(self, client, url, json_data, **kwargs):
+            response = await super()._post_with_retry(client, url, json_data, **kwargs)
+            await asyncio.sleep(0.05)
+            return response
+
+    async def scenario(runner):
+        return await asyncio.gather(
+            runner.run_batch([(0, "p1", "w1")], run_id="run-a", email="a@b.c", token="token-a"),
+            runner.run_batch([(0, "p1", "w1")], run_id="run-b", email="c@d.e", token="token-b"),
+        )
+
+    runner = SlowRunner()
+    results = asyncio.run(scenario(runner))
+    assert [r[0]["final_status"] for r in results] == ["SUCCESS", "SUCCESS"]
+    tokens = sorted(call[2] for call in _stage_calls(runner))
+    assert tokens == ["Bearer token-a"] * 3 + ["Bearer token-b"] * 3
+
+
+def test_retry_skips_stages_completed_earlier_without_the_cache(monkeypatch, cache):
+    monkeypatch.setattr(batch_runner, "stage_cache", StageCache())
+    runner = RecordingRunner()
+    results = _run(runner, "retry", completed_stages={0: ["assessment", "parsing"]})
+    assert results[0]["final_status"] == "SUCCESS"
+    assert [call[0].rsplit("/", 1)[-1] for call in _stage_calls(runner)] == ["mapping"]